@@ -2,15 +2,18 @@ import logging
 from typing import Any
 
 import dash_bootstrap_components as bootstrap
-from dash import callback, Dash, dcc, html, Input, Output
+from dash import callback, ctx, Dash, dcc, html, Input, Output
 
 from components import page_callback
 from components.page_callback import Pages
-from controls import utils
+from controls import metrics, tracing, utils
+from controls.data_provider import DataProvider
 from controls.types import user_message_to_callback_output, UserMessage
 from pages import customer_list, customer_profile, subscription_profile, training_list, training_profile
 
 app = Dash(__name__, external_stylesheets=[bootstrap.themes.FLATLY], suppress_callback_exceptions=True)
+tracing.install(app.server)
+metrics.install(app.server)
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +30,10 @@ class Ids:
 class Controller:
     id_body_container = Ids.element('BodyContainer')
     id_user_message = Ids.element('ToastUserMessage')
+    id_search_input = Ids.element('SearchInput')
+    id_search_results = Ids.element('SearchResults')
+
+    search_results_limit = 8
 
     @staticmethod
     @callback(
@@ -44,6 +51,34 @@ class Controller:
     def show_user_message(user_message: UserMessage) -> dict:
         return user_message_to_callback_output(user_message)
 
+    @staticmethod
+    @callback(
+        Output(id_search_results, 'children'),
+        Output(id_search_input, 'value'),
+        inputs=dict(
+            search_text=Input(id_search_input, 'value'),
+            url_pathname=Input(page_callback.id_location, 'pathname'),
+        ),
+        prevent_initial_call=True)
+    def search_customers(search_text: str, url_pathname: str) -> tuple[list, str]:
+        if ctx.triggered_id == page_callback.id_location or not search_text:
+            # Navigated away (possibly through a search result): close the results
+            return [], ''
+        with DataProvider() as data_provider:
+            results = data_provider.search(search_text, limit=Controller.search_results_limit).to_dict('records')
+        if not results:
+            return [bootstrap.ListGroupItem('No customers found', disabled=True)], search_text
+        return [
+            bootstrap.ListGroupItem(
+                [
+                    html.Div(f'{result["dog_names"]} ({result["person_names"]})', className='fw-bold'),
+                    html.Small(result['address']),
+                ],
+                href=f'/{Pages.customer_profile_path_param.value}/{result["dog_id"]}',
+                action=True)
+            for result in results
+        ], search_text
+
     @staticmethod
     @callback(
         Output(id_body_container, 'children'),
@@ -51,6 +86,7 @@ class Controller:
             url_pathname=Input(page_callback.id_location, 'pathname'),
         ),
         prevent_initial_call=True)
+    @tracing.traced()
     def main_callback(url_pathname: str) -> Any:
         logger.debug(f'Loading page: {url_pathname}')
         # TODO confirm with user before leaving modified form.
@@ -90,6 +126,19 @@ app.layout = bootstrap.Container(
                 bootstrap.NavItem(bootstrap.NavLink('Trainings', href=Pages.training_list_path)),
                 bootstrap.NavItem(bootstrap.NavLink('Customers', href=Pages.customers_list_path)),
                 bootstrap.NavItem(bootstrap.NavLink('New customer', href=Pages.new_customer_path)),
+                bootstrap.NavItem(
+                    html.Div(
+                        [
+                            bootstrap.Input(
+                                id=Controller.id_search_input, type='search', debounce=True,
+                                placeholder='Search customers...'),
+                            bootstrap.ListGroup(
+                                id=Controller.id_search_results,
+                                className='position-absolute end-0 mt-1 shadow search-results'),
+                        ],
+                        className='position-relative ms-3',
+                    )
+                ),
             ],
             brand='Lekker Woof',
             color='primary',
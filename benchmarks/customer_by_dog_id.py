@@ -0,0 +1,93 @@
+"""
+Compares loading a customer with the former customer x dogs x persons join against the narrow per-table queries of
+DataProvider.get_customer_by_dog_id, for growing household sizes. Runs on an in-memory database:
+
+    python -m benchmarks.customer_by_dog_id
+"""
+import time
+
+import pandas as pd
+
+import config
+
+config.database_file = ':memory:'
+
+from controls import sqlite_config  # noqa: E402
+from controls.data_provider import DataProvider  # noqa: E402
+
+HOUSEHOLD_SIZES = [(1, 1), (2, 2), (4, 2), (8, 4), (16, 8), (32, 16)]  # (dogs, persons)
+REPETITIONS = 200
+
+sql_legacy_customer_by_dog_id = '''
+SELECT
+    c.customer_id,
+    c.address,
+    c.balance_in_eur,
+    c.notes AS customer_notes,
+    c.created_timestamp AS customer_created_timestamp,
+    d.dog_id,
+    d.name dog_name,
+    d.birth_date,
+    d.breed,
+    d.is_male,
+    d.notes AS dog_notes,
+    d.created_timestamp AS dog_created_timestamp,
+    p.person_id,
+    p.name person_name,
+    p.phone1,
+    p.phone2,
+    p.email_address,
+    p.created_timestamp AS person_created_timestamp
+FROM customer c
+INNER JOIN dog d USING(customer_id)
+iNNER JOIN person p USING(customer_id)
+WHERE c.customer_id = (SELECT customer_id FROM dog WHERE dog_id = :dog_id)
+'''
+
+
+def make_household(data_provider: DataProvider, dogs: int, persons: int) -> int:
+    customer_id = data_provider.insert_customer({'address': 'Benchmarkstraat 1', 'balance_in_eur': 0.0,
+                                                 'customer_notes': None})
+    dog_ids = [
+        data_provider.insert_dog({'dog_name': f'Dog {i}', 'birth_date': '2020-01-01', 'breed': 'Mixed',
+                                  'is_male': i % 2, 'dog_notes': 'Good dog'}, customer_id=customer_id)
+        for i in range(dogs)
+    ]
+    for i in range(persons):
+        data_provider.insert_person({'person_name': f'Person {i}', 'phone1': '06 12345678', 'phone2': None,
+                                     'email_address': f'person{i}@example.com'}, customer_id=customer_id)
+    data_provider.commit()
+    return dog_ids[0]
+
+
+def load_legacy(connection, dog_id: int) -> int:
+    customer_df = pd.read_sql(sql_legacy_customer_by_dog_id, connection, params={'dog_id': dog_id})
+    customer_df.loc[:, ['customer_id', 'address']].drop_duplicates(subset=['customer_id'])
+    customer_df.loc[:, ['dog_id', 'dog_name']].drop_duplicates(subset=['dog_id'])
+    customer_df.loc[:, ['person_id', 'person_name']].drop_duplicates(subset=['person_id'])
+    return len(customer_df)
+
+
+def measure(function, *args) -> float:
+    start = time.perf_counter()
+    for _ in range(REPETITIONS):
+        function(*args)
+    return (time.perf_counter() - start) / REPETITIONS * 1000
+
+
+def main() -> None:
+    print(f'{"dogs":>5} {"persons":>8} | {"join rows":>10} {"join ms":>8} | {"narrow rows":>12} {"narrow ms":>10}')
+    with DataProvider() as data_provider:
+        connection = sqlite_config.connect(config.database_file, config.database_profile)
+        for dogs, persons in HOUSEHOLD_SIZES:
+            dog_id = make_household(data_provider, dogs, persons)
+            join_rows = load_legacy(connection, dog_id)
+            join_ms = measure(load_legacy, connection, dog_id)
+            customer = data_provider.get_customer_by_dog_id(dog_id)
+            narrow_rows = 1 + len(customer.dogs) + len(customer.persons)
+            narrow_ms = measure(data_provider.get_customer_by_dog_id, dog_id)
+            print(f'{dogs:>5} {persons:>8} | {join_rows:>10} {join_ms:>8.3f} | {narrow_rows:>12} {narrow_ms:>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Measures DataProvider.search latency on a large in-memory database:
+
+    python -m benchmarks.search [--customers N]
+"""
+import argparse
+import random
+import time
+
+import config
+
+config.database_file = ':memory:'
+
+from controls import sqlite_config  # noqa: E402
+from controls.data_provider import DataProvider  # noqa: E402
+
+DOG_NAMES = ['Elton', 'Tonico', 'Tinoco', 'Anitta', 'Bolinha', 'Rex', 'Luna', 'Max', 'Bella', 'Charlie']
+BREEDS = ['Australian Shepherd', 'Labradoodle', 'German Shepherd', 'Poodle', 'Beagle', 'Border Collie']
+PERSON_NAMES = ['Joaquim', 'Joao', 'Maria', 'Toninho', 'Anna', 'Sven', 'Fleur', 'Daan', 'Emma', 'Lucas']
+STREETS = ['Nowherestraat', 'Kerkstraat', 'Dorpsstraat', 'Molenweg', 'Lagoa Santa', 'Star street']
+QUERIES = ['jo', 'maria', 'labra', 'kerkstraat 12', 'luna poodle', '0612', 'sven@exa', 'zzz']
+REPETITIONS = 100
+
+
+def populate(customers: int) -> None:
+    connection = sqlite_config.connect(config.database_file, config.database_profile)
+    random.seed(42)
+    with connection:
+        for customer_id in range(1, customers + 1):
+            connection.execute('INSERT INTO customer (customer_id, address) VALUES (?, ?)',
+                               (customer_id, f'{random.choice(STREETS)} {random.randint(1, 300)}, Amsterdam'))
+            for _ in range(random.randint(1, 3)):
+                connection.execute('INSERT INTO dog (customer_id, name, birth_date, breed, is_male) '
+                                   'VALUES (?, ?, ?, ?, ?)',
+                                   (customer_id, random.choice(DOG_NAMES), '2020-01-01', random.choice(BREEDS),
+                                    random.randint(0, 1)))
+            for _ in range(random.randint(1, 2)):
+                name = random.choice(PERSON_NAMES)
+                connection.execute('INSERT INTO person (customer_id, name, phone1, email_address) '
+                                   'VALUES (?, ?, ?, ?)',
+                                   (customer_id, name, f'06 {random.randint(10000000, 99999999)}',
+                                    f'{name.lower()}{customer_id}@example.com'))
+    connection.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--customers', type=int, default=100_000)
+    args = parser.parse_args()
+
+    with DataProvider() as data_provider:  # creates the in-memory schema
+        start = time.perf_counter()
+        populate(args.customers)
+        print(f'Indexed {args.customers} customers in {time.perf_counter() - start:.1f}s')
+
+        print(f'{"query":>15} | {"results":>7} {"ms":>8}')
+        for query in QUERIES:
+            results = data_provider.search(query, limit=10)
+            start = time.perf_counter()
+            for _ in range(REPETITIONS):
+                data_provider.search(query, limit=10)
+            elapsed_ms = (time.perf_counter() - start) / REPETITIONS * 1000
+            print(f'{query:>15} | {len(results):>7} {elapsed_ms:>8.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,20 @@
-import json
 import logging
+import re
+import threading
 import uuid
+from collections import OrderedDict
 from enum import Enum
 from typing import Any, Optional, TypedDict
 
 import dash_bootstrap_components as bootstrap
 from bidict import bidict
-from dash import ctx, dcc, callback, Input, State, Output, MATCH, html, ALL
+from dash import ctx, dcc, callback, clientside_callback, Input, Output, State, MATCH, html, ALL, Patch
 from dash.development.base_component import Component
 from dash.exceptions import PreventUpdate
 from dash_bootstrap_components import InputGroupText
 
-from controls.utils import flatten, BidictEncoder, BidictDecoder
+from controls import tracing
+from controls.utils import flatten
 
 logger = logging.getLogger(__name__)
 
@@ -27,12 +30,29 @@ class FieldType(str, Enum):
     SELECT = 'SELECT'
 
 
+class CallbackMode(str, Enum):
+    # One callback per form, fed with the value of every field whenever any of them changes. Fine for small forms.
+    ALL_FIELDS = 'ALL_FIELDS'
+    # One callback invocation per edited field, posting only that field; the results are merged into the form data
+    # store in the browser. Meant for large forms.
+    PER_FIELD = 'PER_FIELD'
+    # Like ALL_FIELDS, but the data store is recomputed in the browser: editing the form sends no request at all.
+    CLIENTSIDE = 'CLIENTSIDE'
+
+
 class FieldConfig(TypedDict, total=False):  # total=False means all keys are optional
     readonly: bool
     type: FieldType
     label: str
     display_value_converter_bidict: bidict
     options: dict[str, Any]
+    input_label_left: str
+    # Validation rules, checked in the browser while typing and again on the server by DataStore.validate
+    required: bool
+    pattern: str  # regular expression the whole value must match
+    min: float
+    max: float
+    error_message: str  # replaces the default message of any broken rule
 
 
 class FieldElementId(TypedDict):
@@ -44,6 +64,12 @@ class FieldElementId(TypedDict):
 
 
 class Ids:
+    __component_by_callback_mode = {
+        CallbackMode.ALL_FIELDS: 'DictFormAIO',
+        CallbackMode.PER_FIELD: 'DictFormAIO-PerField',
+        CallbackMode.CLIENTSIDE: 'DictFormAIO-Clientside',
+    }
+
     @staticmethod
     def form_data_store(form_id: Any, form_index: Any = '') -> FieldElementId:
         return Ids.field_element(
@@ -52,23 +78,56 @@ class Ids:
             form_id=form_id, form_index=form_index)
 
     @staticmethod
-    def field_feedback(field_name: Any, form_id: Any, form_index: Any = '') -> FieldElementId:
-        return Ids.field_element(
-            field_type='field_feedback',
+    def field_feedback(field_type: Any, field_name: Any, form_id: Any, form_index: Any = '',
+                       callback_mode: CallbackMode = CallbackMode.ALL_FIELDS) -> FieldElementId:
+        return FieldElementId(
+            component=f'{Ids.__component_by_callback_mode[callback_mode]}-Feedback',
+            field_type=field_type,
             field_name=field_name,
-            form_id=form_id, form_index=form_index)
+            form_id=form_id,
+            form_index=form_index,
+        )
 
     @staticmethod
-    def field_element(field_type: Any, field_name: Any, form_id: Any, form_index: Any = '') -> FieldElementId:
+    def field_client_config(field_name: Any, form_id: Any, form_index: Any = '') -> FieldElementId:
+        """
+        Store with the part of a field's config needed by clientside callbacks (validation rules, display values).
+        """
+        return FieldElementId(
+            component='DictFormAIO-ClientConfig',
+            field_type=FieldType.STORE,
+            field_name=field_name,
+            form_id=form_id,
+            form_index=form_index,
+        )
+
+    @staticmethod
+    def field_state(field_type: Any, field_name: Any, form_id: Any, form_index: Any = '') -> FieldElementId:
+        """
+        Store holding the value of a single field of a form in CallbackMode.PER_FIELD.
+        """
+        return FieldElementId(
+            component='DictFormAIO-FieldState',
+            field_type=field_type,
+            field_name=field_name,
+            form_id=form_id,
+            form_index=form_index,
+        )
+
+    @staticmethod
+    def field_element(field_type: Any, field_name: Any, form_id: Any, form_index: Any = '',
+                      callback_mode: CallbackMode = CallbackMode.ALL_FIELDS) -> FieldElementId:
         """
         :param field_type: param of type @FieldType or str
         :param field_name: name of the field
         :param form_id: id of the form
         :param form_index: additional index to the form_id, if needed.
+        :param callback_mode: callback mode of the form. Field ids differ per mode, so that each field is only wired
+          to the callbacks of its mode.
         :return: dict id
         """
         return FieldElementId(
-            component='DictFormAIO',
+            component=Ids.__component_by_callback_mode[callback_mode],
             field_type=field_type,
             field_name=field_name,
             form_id=form_id,
@@ -76,40 +135,189 @@ class Ids:
         )
 
 
+_fields_config_by_form_id: dict[str, dict[str, FieldConfig]] = {}
+# Forms without a form_id get a new one at every render: only the most recent ones are kept
+_fields_config_by_generated_form_id: OrderedDict[str, dict[str, FieldConfig]] = OrderedDict()
+_max_generated_form_ids = 256
+_fields_config_lock = threading.Lock()
+
+
+def register_fields_config(form_id: str, fields_config: dict[str, FieldConfig]) -> None:
+    """
+    Keeps the (static) fields config of a form on the server, so that it does not travel with every edit. DictFormAIO
+    registers its config when constructed; pages should also register theirs at import time, so that every worker
+    process knows the config of forms rendered by another one.
+    """
+    with _fields_config_lock:
+        _fields_config_by_form_id[form_id] = fields_config
+
+
+def _register_generated_fields_config(form_id: str, fields_config: dict[str, FieldConfig]) -> None:
+    with _fields_config_lock:
+        _fields_config_by_generated_form_id[form_id] = fields_config
+        while len(_fields_config_by_generated_form_id) > _max_generated_form_ids:
+            _fields_config_by_generated_form_id.popitem(last=False)
+
+
+def get_fields_config(form_id: str) -> dict[str, FieldConfig]:
+    with _fields_config_lock:
+        if form_id in _fields_config_by_form_id:
+            return _fields_config_by_form_id[form_id]
+        if form_id in _fields_config_by_generated_form_id:
+            return _fields_config_by_generated_form_id[form_id]
+        raise KeyError(f'No fields config registered for form {form_id}')
+
+
+_email_pattern = r'[^@\s]+@[^@\s]+\.[^@\s]+'
+# Decimal numbers only: Python float() and JS Number() disagree on the rest (blanks, hexadecimal, 'inf', '1_000'...)
+_number_pattern = r'[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?'
+_validation_rule_keys = ('required', 'pattern', 'min', 'max', 'error_message')
+
+
+def make_validation_rules(field_config: FieldConfig) -> dict:
+    """
+    :return: validation rules of a field, as evaluated by validate_field_value (and its clientside counterpart).
+    """
+    rules = {key: field_config[key] for key in _validation_rule_keys if key in field_config}
+    if field_config.get('type') == FieldType.EMAIL:
+        rules['email'] = True
+    return rules
+
+
+def validate_field_value(value: Any, rules: dict) -> Optional[str]:
+    """
+    Server-side twin of _validate_field_value_js: both must accept the same values.
+    :return: error message, or None if the value is valid.
+    """
+    error_message = rules.get('error_message')
+    if value is None or value == '':
+        return (error_message or 'Field is required') if rules.get('required') else None
+    if rules.get('email') and not re.fullmatch(_email_pattern, str(value)):
+        return error_message or 'Must be a valid email address'
+    if rules.get('pattern') and not re.fullmatch(rules['pattern'], str(value)):
+        return error_message or 'Invalid format'
+    if rules.get('min') is not None or rules.get('max') is not None:
+        if not re.fullmatch(_number_pattern, str(value)):
+            return error_message or 'Must be a number'
+        number = float(value)
+        if rules.get('min') is not None and number < rules['min']:
+            return error_message or f'Must be at least {rules["min"]}'
+        if rules.get('max') is not None and number > rules['max']:
+            return error_message or f'Must be at most {rules["max"]}'
+    return None
+
+
+_validate_field_value_js = f"""
+function(value, rules) {{
+    const errorMessage = rules.error_message;
+    if (value === null || value === undefined || value === '') {{
+        return rules.required ? (errorMessage || 'Field is required') : null;
+    }}
+    if (rules.email && !/^(?:{_email_pattern})$/.test(String(value))) {{
+        return errorMessage || 'Must be a valid email address';
+    }}
+    if (rules.pattern && !new RegExp('^(?:' + rules.pattern + ')$').test(String(value))) {{
+        return errorMessage || 'Invalid format';
+    }}
+    const hasMin = rules.min !== undefined && rules.min !== null;
+    const hasMax = rules.max !== undefined && rules.max !== null;
+    if (hasMin || hasMax) {{
+        if (!/^(?:{_number_pattern})$/.test(String(value))) {{
+            return errorMessage || 'Must be a number';
+        }}
+        const number = Number(value);
+        if (hasMin && number < rules.min) {{
+            return errorMessage || `Must be at least ${{rules.min}}`;
+        }}
+        if (hasMax && number > rules.max) {{
+            return errorMessage || `Must be at most ${{rules.max}}`;
+        }}
+    }}
+    return null;
+}}
+"""
+
+
 class DataStore:
-    def __init__(self, data: dict, fields_config: dict[str, FieldConfig], is_insertion: bool,
-                 is_modified: bool = False, validation_state_by_field: dict[str, bool] = {}) -> None:
+    """
+    State of a form. Only the mutable part (see to_store) is kept in the dcc.Store of the form; the fields config is
+    looked up in the server-side registry by form_id.
+    """
+
+    def __init__(self, form_id: str, data: dict, is_insertion: bool, is_modified: bool = False,
+                 modified_fields: Optional[dict[str, bool]] = None,
+                 validation_state_by_field: Optional[dict[str, bool]] = None) -> None:
+        self.form_id = form_id
+        self.fields_config = get_fields_config(form_id)
         self.data = data
-        self.fields_config = fields_config
         self.is_insertion = is_insertion
         self.is_modified = is_modified
-        self.validation_state_by_field = validation_state_by_field
+        self.modified_fields = modified_fields if modified_fields is not None else {}
+        self.validation_state_by_field = validation_state_by_field if validation_state_by_field is not None else {}
 
     @classmethod
-    def from_json(cls, json_str: str):
-        data_store_dict = json.loads(json_str, cls=BidictDecoder)
-        return cls(**data_store_dict)
-
-    def to_json(self) -> str:
-        return json.dumps(vars(self), cls=BidictEncoder)
+    def from_store(cls, store_data: dict):
+        return cls(**store_data)
+
+    def to_store(self) -> dict:
+        return dict(
+            form_id=self.form_id,
+            data=self.data,
+            is_insertion=self.is_insertion,
+            is_modified=self.is_modified,
+            modified_fields=self.modified_fields,
+            validation_state_by_field=self.validation_state_by_field,
+        )
 
     def validate(self) -> None:
+        """
+        Checks every field against the validation rules of its config: what the browser validated is not trusted.
+        """
         for field_name in self.fields_config.keys():
-            if not self.is_field_valid(field_name):
-                raise RuntimeError(f'Error on field {field_name}')
+            field_error = self.get_field_error(field_name)
+            if field_error is not None:
+                raise RuntimeError(f'Error on field {field_name}: {field_error}')
+
+    def get_modified_data(self, *key_fields: str) -> dict:
+        """
+        :param key_fields: fields always included, like the key and row_version.
+        :return: the key fields and the fields modified since the form was rendered (or last saved).
+        """
+        modified_data = {field_name: self.data.get(field_name)
+                         for field_name, is_modified in self.modified_fields.items() if is_modified}
+        for key_field in key_fields:
+            modified_data[key_field] = self.data[key_field]
+        return modified_data
+
+    @staticmethod
+    def make_saved_patch(saved_data: dict) -> Patch:
+        """
+        :param saved_data: fields changed by saving, like the id of an insertion and the new row_version.
+        :return: delta for the form store after the data was saved: it is no longer an insertion nor modified.
+        """
+        store_patch = Patch()
+        for field_name, value in saved_data.items():
+            store_patch['data'][field_name] = value
+        store_patch['is_insertion'] = False
+        store_patch['is_modified'] = False
+        store_patch['modified_fields'] = {}
+        return store_patch
 
     def get_field_value(self, field_name: str) -> Any:
         return self.data[field_name] if field_name in self.data else None
 
     def is_field_valid(self, field_name: str) -> bool:
+        return self.get_field_error(field_name) is None
+
+    def get_field_error(self, field_name: str) -> Optional[str]:
         # External validation
         if field_name in self.validation_state_by_field and self.validation_state_by_field[field_name] is False:
-            return False
-        is_required = self.get_field_config(field_name, 'required', default_value=False)
-        field_value = self.get_field_value(field_name)
-        if is_required and field_value is None:
-            return False
-        return True
+            return 'Invalid value'
+        # Like in the browser (see DictFormAIO.__make_field_client_config): users cannot fix what they cannot edit
+        if self.is_field_readonly(field_name):
+            return None
+        return validate_field_value(self.get_field_value(field_name),
+                                    make_validation_rules(self.fields_config.get(field_name, {})))
 
     def get_field_config(self, field_name: str, config: str, default_value: Any) -> Any:
         return self.fields_config[field_name][config] \
@@ -142,7 +350,7 @@ class DictFormAIO(html.Div):
     each field must be provided when creating this component. See more on :method:`~dict_form.DictFormAIO.__init__`.
 
     This component maintains a data store (accessible with :method:`~dict_form.Ids.form_data_store`). See DataStore for
-    more details.
+    more details. The store is updated with deltas (Patch) of the fields edited only.
     """
 
     __storage_by_field_type = {
@@ -156,6 +364,17 @@ class DictFormAIO(html.Div):
         FieldType.SELECT: 'value',
     }
 
+    # Field types whose component has an 'invalid' property, set by validation callbacks
+    __validated_field_types = (FieldType.TEXT, FieldType.NUMBER, FieldType.EMAIL, FieldType.TEXTAREA)
+
+    # Whether inputs only send their value on enter or when losing focus, instead of on every keystroke
+    default_debounce_by_field_type = {
+        FieldType.TEXT: True,
+        FieldType.NUMBER: True,
+        FieldType.EMAIL: True,
+        FieldType.TEXTAREA: True,
+    }
+
     # constants
     __default_value_type = FieldType.TEXT
 
@@ -166,11 +385,12 @@ class DictFormAIO(html.Div):
 
     __all_fields_invalid_filter = tuple(
         Input(Ids.field_element(field_type=field_type, field_name=ALL, form_id=MATCH, form_index=MATCH), 'invalid')
-        for field_type, storage in __storage_by_field_type.items()
-        if field_type not in [FieldType.STORE, FieldType.DATE, FieldType.RADIO, FieldType.SELECT])
+        for field_type in __validated_field_types)
 
     def __init__(self, data: dict, fields_config: dict[str, FieldConfig] = {},
                  is_insertion: bool = False, form_id: Optional[str] = None, form_index: Optional[Any] = '',
+                 callback_mode: CallbackMode = CallbackMode.ALL_FIELDS,
+                 debounce_by_field_type: Optional[dict[FieldType, bool]] = None,
                  *args, **kwargs):
         """
         After the initialization of the component, the property `field_elements_ids` will be available with the ids of
@@ -183,19 +403,32 @@ class DictFormAIO(html.Div):
           * display_value_converter_bidict: bidict where the primary key is the DB value and the inverse key is the
             display value.
           * options: options for multi-choice fields, like radio and select. Ignored for all the rest.
+          * input_label_left: text shown on the left of the input.
+          * required, pattern, min, max, error_message: validation rules, see FieldConfig. EMAIL fields must also hold
+            a valid email address. Ignored for readonly fields.
         :param is_insertion: Indicate if this form represents a new entity.
-        :param form_id: id of the component. If None, it'll be auto-generated.
+        :param form_id: id of the component. If None, it'll be auto-generated: the form can then only be edited in
+          this worker process, until the configs of newer auto-generated forms push its own out.
         :param form_index: optional additional index to the form_id, if needed.
+        :param callback_mode: how field edits reach the data store. See CallbackMode.
+        :param debounce_by_field_type: overrides of default_debounce_by_field_type.
         :return: Div element with the form inside.
         """
         self.form_id = form_id if form_id is not None else str(uuid.uuid4())
         self.form_index = form_index
+        self.callback_mode = callback_mode
+        self.__debounce_by_field_type = {**DictFormAIO.default_debounce_by_field_type, **(debounce_by_field_type or {})}
         self.field_elements_ids: list[FieldElementId] = []
-        self.__data_store = DataStore(data=data, fields_config=fields_config, is_insertion=is_insertion)
+        if form_id is not None:
+            register_fields_config(self.form_id, fields_config)
+        else:
+            _register_generated_fields_config(self.form_id, fields_config)
+        # Copied: the data may be shared (cached), and missing fields are added to it
+        self.__data_store = DataStore(form_id=self.form_id, data=dict(data), is_insertion=is_insertion)
         self.__initialize_data_from_fields_config()
 
         logger.info(f'Initializing new DictForm with form_id={self.form_id} form_index={self.form_index} '
-                    f'data_store={self.__data_store.to_json()}')
+                    f'data_store={self.__data_store.to_store()}')
         form = self.__make_form()
 
         super().__init__(*args, **kwargs, className='dict-form', children=form)
@@ -209,53 +442,190 @@ class DictFormAIO(html.Div):
                 continue
             self.__data_store.data[field_name] = None
 
-    # inject inputs and states
+    # inject inputs
     @staticmethod
     @callback(Output(Ids.form_data_store(form_id=MATCH, form_index=MATCH), 'data'),
               inputs=dict(
                   input_fields=__all_fields_input_filter,
-                  input_fields_invalid_state=__all_fields_invalid_filter,
-                  form_data_store_json=State(Ids.form_data_store(form_id=MATCH, form_index=MATCH), 'data')),
+                  input_fields_invalid_state=__all_fields_invalid_filter),
               prevent_initial_callback=True)
-    def __recompute_data_store(input_fields: tuple, input_fields_invalid_state: tuple,
-                               form_data_store_json: str) -> str:
-        form_data_store = DataStore.from_json(form_data_store_json)
-
+    @tracing.traced()
+    def __recompute_data_store(input_fields: tuple, input_fields_invalid_state: tuple) -> Patch:
         modified_fields = DictFormAIO.__get_triggered_fields('input_fields')
         if modified_fields:
-            return DictFormAIO.__on_field_modified(modified_fields, form_data_store).to_json()
+            return DictFormAIO.__on_field_modified(modified_fields, Patch())
 
         validated_fields = DictFormAIO.__get_triggered_fields('input_fields_invalid_state')
         if validated_fields:
-            return DictFormAIO.__on_field_validated(validated_fields, form_data_store).to_json()
+            return DictFormAIO.__on_field_validated(validated_fields, Patch())
 
         raise PreventUpdate
 
     @staticmethod
-    def __on_field_modified(fields: list[dict], form_data_store: DataStore) -> DataStore:
-        form_data_store.is_modified = True
+    def __on_field_modified(fields: list[dict], form_data_store_patch: Patch) -> Patch:
+        form_data_store_patch['is_modified'] = True
 
         # Update data store with new value(s)
         for field in fields:
             field_name = field['id']['field_name']
-            field_value = field['value']
-            display_value_converter = form_data_store.get_field_display_value_converter(field_name)
-            if display_value_converter is not None:
-                assert isinstance(display_value_converter, bidict)
-                field_value = display_value_converter.inverse[field_value]
-            form_data_store.data[field_name] = field_value
+            field_value = DictFormAIO.__to_data_value(field['id']['form_id'], field_name, field['value'])
+            form_data_store_patch['data'][field_name] = field_value
+            form_data_store_patch['modified_fields'][field_name] = True
 
-        return form_data_store
+        return form_data_store_patch
 
     @staticmethod
-    def __on_field_validated(fields: list[dict], form_data_store: DataStore) -> DataStore:
+    def __to_data_value(form_id: str, field_name: str, display_value: Any) -> Any:
+        fields_config = get_fields_config(form_id)
+        display_value_converter = fields_config.get(field_name, {}).get('display_value_converter_bidict')
+        if display_value_converter is None:
+            return display_value
+        assert isinstance(display_value_converter, bidict)
+        return display_value_converter.inverse[display_value]
+
+    @staticmethod
+    def __on_field_validated(fields: list[dict], form_data_store_patch: Patch) -> Patch:
         for field in fields:
             field_name = field['id']['field_name']
             assert field['property'] == 'invalid'
             field_is_invalid = field['value']
             field_is_valid = True if field_is_invalid is None else not field_is_invalid
-            form_data_store.validation_state_by_field[field_name] = field_is_valid
-        return form_data_store
+            form_data_store_patch['validation_state_by_field'][field_name] = field_is_valid
+        return form_data_store_patch
+
+    # CallbackMode.PER_FIELD: each field updates its own state store...
+    def __on_single_field_changed(field_value: Any, field_is_invalid: Optional[bool] = None) -> Patch:
+        field_id = ctx.triggered_id
+        triggered_properties = {triggered['prop_id'].rsplit('.', 1)[-1] for triggered in ctx.triggered}
+        field_state_patch = Patch()
+        if 'invalid' in triggered_properties:
+            field_state_patch['is_valid'] = True if field_is_invalid is None else not field_is_invalid
+        if triggered_properties - {'invalid'}:
+            field_state_patch['value'] = DictFormAIO.__to_data_value(field_id['form_id'], field_id['field_name'],
+                                                                     field_value)
+            field_state_patch['is_modified'] = True
+        return field_state_patch
+
+    for __field_type, __storage in __storage_by_field_type.items():
+        if __field_type == FieldType.STORE:
+            continue
+        __field_filter = dict(field_type=__field_type, field_name=MATCH, form_id=MATCH, form_index=MATCH)
+        __inputs = [Input(Ids.field_element(**__field_filter, callback_mode=CallbackMode.PER_FIELD), __storage)]
+        if __field_type in __validated_field_types:
+            __inputs.append(Input(Ids.field_element(**__field_filter, callback_mode=CallbackMode.PER_FIELD), 'invalid'))
+        callback(Output(Ids.field_state(**__field_filter), 'data'), *__inputs,
+                 prevent_initial_call=True)(__on_single_field_changed)
+    del __field_type, __storage, __field_filter, __inputs
+    __on_single_field_changed = staticmethod(__on_single_field_changed)
+
+    # ...and the browser merges the edited fields into the form data store, without another round trip
+    clientside_callback(
+        """
+        function(fieldStates, formDataStore) {
+            const triggered = dash_clientside.callback_context.triggered;
+            if (!formDataStore || !triggered || !triggered.length) {
+                return dash_clientside.no_update;
+            }
+            const store = Object.assign({}, formDataStore, {
+                data: Object.assign({}, formDataStore.data),
+                modified_fields: Object.assign({}, formDataStore.modified_fields),
+                validation_state_by_field: Object.assign({}, formDataStore.validation_state_by_field),
+            });
+            for (const field of triggered) {
+                const fieldName = JSON.parse(field.prop_id.slice(0, field.prop_id.lastIndexOf('.'))).field_name;
+                const fieldState = field.value || {};
+                if (fieldState.is_modified) {
+                    store.data[fieldName] = fieldState.value;
+                    store.modified_fields[fieldName] = true;
+                    store.is_modified = true;
+                }
+                if ('is_valid' in fieldState) {
+                    store.validation_state_by_field[fieldName] = fieldState.is_valid;
+                }
+            }
+            return store;
+        }
+        """,
+        Output(Ids.form_data_store(form_id=MATCH, form_index=MATCH), 'data', allow_duplicate=True),
+        Input(Ids.field_state(field_type=ALL, field_name=ALL, form_id=MATCH, form_index=MATCH), 'data'),
+        State(Ids.form_data_store(form_id=MATCH, form_index=MATCH), 'data'),
+        prevent_initial_call=True)
+
+    # Validation runs in the browser, for forms of every callback mode
+    for __callback_mode in CallbackMode:
+        for __field_type in __validated_field_types:
+            __field_filter = dict(field_type=__field_type, field_name=MATCH, form_id=MATCH, form_index=MATCH,
+                                  callback_mode=__callback_mode)
+            clientside_callback(
+                f"""
+                function(value, fieldClientConfig, isInvalid) {{
+                    const validate = {_validate_field_value_js};
+                    const error = validate(value, (fieldClientConfig || {{}}).rules || {{}});
+                    if (!error && !isInvalid) {{
+                        return [dash_clientside.no_update, dash_clientside.no_update];
+                    }}
+                    return [Boolean(error), error || ''];
+                }}
+                """,
+                Output(Ids.field_element(**__field_filter), 'invalid'),
+                Output(Ids.field_feedback(**__field_filter), 'children'),
+                Input(Ids.field_element(**__field_filter), 'value'),
+                State(Ids.field_client_config(field_name=MATCH, form_id=MATCH, form_index=MATCH), 'data'),
+                State(Ids.field_element(**__field_filter), 'invalid'))
+    del __callback_mode, __field_type, __field_filter
+
+    # CallbackMode.CLIENTSIDE: same as __recompute_data_store, in the browser
+    clientside_callback(
+        """
+        function() {
+            const context = dash_clientside.callback_context;
+            const formDataStore = arguments[arguments.length - 1];
+            if (!formDataStore || !context.triggered || !context.triggered.length) {
+                return dash_clientside.no_update;
+            }
+            const displayValuesByField = {};
+            for (const fieldClientConfig of context.states_list[0]) {
+                displayValuesByField[fieldClientConfig.id.field_name] = (fieldClientConfig.value || {}).display_values;
+            }
+            const store = Object.assign({}, formDataStore, {
+                data: Object.assign({}, formDataStore.data),
+                modified_fields: Object.assign({}, formDataStore.modified_fields),
+                validation_state_by_field: Object.assign({}, formDataStore.validation_state_by_field),
+            });
+            for (const field of context.triggered) {
+                const separator = field.prop_id.lastIndexOf('.');
+                const fieldName = JSON.parse(field.prop_id.slice(0, separator)).field_name;
+                if (field.prop_id.slice(separator + 1) === 'invalid') {
+                    store.validation_state_by_field[fieldName] = !field.value;
+                    continue;
+                }
+                let value = field.value;
+                const displayValues = displayValuesByField[fieldName];
+                if (displayValues) {
+                    const displayValue = displayValues.find(pair => pair[0] === value);
+                    value = displayValue ? displayValue[1] : value;
+                }
+                store.data[fieldName] = value;
+                store.modified_fields[fieldName] = true;
+                store.is_modified = true;
+            }
+            return store;
+        }
+        """,
+        Output(Ids.form_data_store(form_id=MATCH, form_index=MATCH), 'data', allow_duplicate=True),
+        [
+            Input(Ids.field_element(field_type=field_type, field_name=ALL, form_id=MATCH, form_index=MATCH,
+                                    callback_mode=CallbackMode.CLIENTSIDE), storage)
+            for field_type, storage in __storage_by_field_type.items()
+            if field_type != FieldType.STORE
+        ] + [
+            Input(Ids.field_element(field_type=field_type, field_name=ALL, form_id=MATCH, form_index=MATCH,
+                                    callback_mode=CallbackMode.CLIENTSIDE), 'invalid')
+            for field_type in __validated_field_types
+        ],
+        State(Ids.field_client_config(field_name=ALL, form_id=MATCH, form_index=MATCH), 'data'),
+        State(Ids.form_data_store(form_id=MATCH, form_index=MATCH), 'data'),
+        prevent_initial_call=True)
 
     @staticmethod
     def __get_triggered_fields(args_grouping: str) -> list[dict]:
@@ -263,6 +633,7 @@ class DictFormAIO(html.Div):
         ctx_input_fields = flatten(ctx_input_fields_raw)
         return [input_field for input_field in ctx_input_fields if input_field['triggered']]
 
+    @tracing.traced()
     def __make_form(self) -> bootstrap.Form:
         logger.info('Constructing form fields...')
         form_fields = []
@@ -274,7 +645,7 @@ class DictFormAIO(html.Div):
             form_fields.append(field_components)
         logger.info('All fields constructed')
         return bootstrap.Form([
-            dcc.Store(id=Ids.form_data_store(self.form_id, self.form_index), data=self.__data_store.to_json()),
+            dcc.Store(id=Ids.form_data_store(self.form_id, self.form_index), data=self.__data_store.to_store()),
             html.Div(
                 form_fields,
                 className='d-inline-flex flex-row justify-content-between flex-wrap w-100'
@@ -288,11 +659,18 @@ class DictFormAIO(html.Div):
         if is_hidden:
             return field_data_component
 
+        field_type = self.__data_store.get_field_type(field_name)
         input_group_components = [
             field_data_component,
             bootstrap.FormFeedback('', type='invalid',
-                                   id=Ids.field_feedback(field_name, self.form_id, self.form_index)),
+                                   id=Ids.field_feedback(field_type, field_name, self.form_id, self.form_index,
+                                                         callback_mode=self.callback_mode)),
+            dcc.Store(id=Ids.field_client_config(field_name, self.form_id, self.form_index),
+                      data=self.__make_field_client_config(field_name)),
         ]
+        if self.callback_mode == CallbackMode.PER_FIELD:
+            input_group_components.append(
+                dcc.Store(id=Ids.field_state(field_type, field_name, self.form_id, self.form_index), data={}))
 
         input_label_left = self.__data_store.get_field_input_label_left(field_name)
         if input_label_left:
@@ -306,9 +684,22 @@ class DictFormAIO(html.Div):
             className=f'mb-3 me-3 dict-form-field {field_name}'
         )
 
+    def __make_field_client_config(self, field_name: str) -> dict:
+        field_client_config = {}
+        if not self.__data_store.is_field_readonly(field_name):
+            field_client_config['rules'] = make_validation_rules(self.__data_store.fields_config[field_name])
+        display_value_converter = self.__data_store.get_field_display_value_converter(field_name)
+        if self.callback_mode == CallbackMode.CLIENTSIDE and display_value_converter is not None:
+            field_client_config['display_values'] = [
+                [display_value, value] for value, display_value in display_value_converter.items()
+            ]
+        return field_client_config
+
     def __make_field_data_component(self, field_name: str, field_value: Any) -> Component:
         field_type = self.__data_store.get_field_type(field_name)
-        field_id = Ids.field_element(field_type, field_name, self.form_id, self.form_index)
+        field_id = Ids.field_element(field_type, field_name, self.form_id, self.form_index,
+                                     callback_mode=self.callback_mode)
+        debounce = self.__debounce_by_field_type.get(field_type, False)
         is_readonly = self.__data_store.is_field_readonly(field_name)
         display_value_converter_bidict = self.__data_store.get_field_display_value_converter(field_name)
         display_value = display_value_converter_bidict[field_value] \
@@ -333,7 +724,7 @@ class DictFormAIO(html.Div):
                 className='form-date-picker')
         if field_type == FieldType.TEXTAREA:
             return bootstrap.Textarea(
-                id=field_id, value=DictFormAIO.__value_as_str(display_value), readonly=is_readonly, debounce=True,
+                id=field_id, value=DictFormAIO.__value_as_str(display_value), readonly=is_readonly, debounce=debounce,
                 placeholder=placeholder)
         if field_type == FieldType.RADIO:
             return bootstrap.RadioItems(
@@ -344,14 +735,15 @@ class DictFormAIO(html.Div):
         if field_type == FieldType.TEXT:
             return bootstrap.Input(
                 id=field_id, type='text', value=DictFormAIO.__value_as_str(display_value), readonly=is_readonly,
-                debounce=True, placeholder=placeholder)
+                debounce=debounce, placeholder=placeholder)
         if field_type == FieldType.NUMBER:
             return bootstrap.Input(
-                id=field_id, type='number', value=display_value, readonly=is_readonly, placeholder=placeholder)
+                id=field_id, type='number', value=display_value, readonly=is_readonly, debounce=debounce,
+                placeholder=placeholder)
         if field_type == FieldType.EMAIL:
             return bootstrap.Input(
                 id=field_id, type='email', value=DictFormAIO.__value_as_str(display_value), readonly=is_readonly,
-                debounce=True, placeholder=placeholder)
+                debounce=debounce, placeholder=placeholder)
         raise Exception(f'Invalid field type {field_type}')
 
     @staticmethod
@@ -4,6 +4,7 @@ from typing import Any, Callable, TypedDict
 
 from dash import callback, Output
 
+from controls import tracing
 from controls.types import UserMessage
 
 id_location = 'global_location'
@@ -27,6 +28,8 @@ class MultiPageCallbackData(TypedDict, total=False):
 
 def change_page_callback(new_page: Pages, *args, **kwargs):
     def decorator(callback_function: Callable[[...], MultiPageCallbackData]):
+        traced_callback_function = tracing.traced()(callback_function)
+
         @functools.wraps(callback_function)
         @callback(
             Output(id_location, 'pathname', allow_duplicate=True),
@@ -34,7 +37,7 @@ def change_page_callback(new_page: Pages, *args, **kwargs):
             prevent_initial_call=True, *args, **kwargs)
         def app_callback_wrapper(*func_args, **func_kwargs) -> tuple[str, UserMessage]:
             # Call the original callback function with the Output object
-            result = callback_function(*func_args, **func_kwargs)
+            result = traced_callback_function(*func_args, **func_kwargs)
             new_page_path = new_page.value
             if 'page_param_value' in result:
                 page_param_value = result['page_param_value']
@@ -47,15 +50,22 @@ def change_page_callback(new_page: Pages, *args, **kwargs):
     return decorator
 
 
-def user_message_callback(*args, **kwargs):
-    def decorator(callback_function: Callable[[...], UserMessage]):
+def user_message_callback(*args, extra_outputs: tuple[Output, ...] = (), **kwargs):
+    """
+    :param extra_outputs: outputs after the user message. The callback function then returns a tuple of the user
+      message and one value per extra output.
+    """
+    def decorator(callback_function: Callable[[...], Any]):
+        traced_callback_function = tracing.traced()(callback_function)
+
         @functools.wraps(callback_function)
         @callback(
             Output(id_user_message_store, 'data', allow_duplicate=True),
+            *extra_outputs,
             prevent_initial_call=True, *args, **kwargs)
-        def app_callback_wrapper(*func_args, **func_kwargs) -> UserMessage:
+        def app_callback_wrapper(*func_args, **func_kwargs) -> Any:
             # Call the original callback function with the Output object
-            result = callback_function(*func_args, **func_kwargs)
+            result = traced_callback_function(*func_args, **func_kwargs)
             return result
 
         return app_callback_wrapper
@@ -1 +1,66 @@
+import os
+
 logging_directory = '.'
+
+# Database
+# Path of the SQLite file, or ':memory:' for an in-memory database shared by the whole process (tests and benchmarks)
+database_file = os.environ.get('LEKKER_WOOF_DATABASE_FILE', 'sql/lekker_woof.db')
+# One of controls.sqlite_config.PROFILES
+database_profile = os.environ.get('LEKKER_WOOF_DATABASE_PROFILE', 'performance')
+# How long the connections of the app wait for a lock held by another connection before failing with "database is
+# locked" (overrides the busy timeout of the profile)
+database_busy_timeout_ms = int(os.environ.get('LEKKER_WOOF_DATABASE_BUSY_TIMEOUT_MS', '1000'))
+# Operations failing on a lock are then retried (see controls/retry.py), with jittered exponential backoff, until their
+# deadline
+database_retry_initial_backoff_seconds = 0.01
+database_retry_max_backoff_seconds = 0.5
+database_retry_deadline_seconds = 10
+# DataProvider calls taking longer are logged with the query plans of their statements (see controls/query_stats.py),
+# also to the slow-query file unless it is empty
+slow_query_threshold_seconds = float(os.environ.get('LEKKER_WOOF_SLOW_QUERY_THRESHOLD_SECONDS', '0.1'))
+slow_query_log_file = os.environ.get('LEKKER_WOOF_SLOW_QUERY_LOG_FILE', f'{logging_directory}/slow_queries.log')
+
+# Tracing spans of callbacks, layouts and queries (see controls/tracing.py), written to trace_<pid>.json files in this
+# directory. Disabled if empty
+trace_directory = os.environ.get('LEKKER_WOOF_TRACE_DIRECTORY', '')
+trace_file_max_bytes = 50 * 1024 * 1024
+trace_file_backup_count = 3
+
+# With the shared cache, each worker process publishes its metrics there this often, for /metrics to sum those of all
+# workers (see controls/metrics.py)
+metrics_publish_interval_seconds = 5
+
+# Database connection pool
+database_pool_size = 5
+database_pool_max_age_seconds = 30 * 60
+database_pool_checkout_timeout_seconds = 10
+
+# In-process cache of reference data (trainings)
+reference_data_cache_ttl_seconds = 10 * 60
+
+# Customer profiles, kept until their data is written (or the TTL elapses, for writes made by other processes)
+customer_profile_cache_ttl_seconds = 10 * 60
+customer_profile_cache_max_bytes = 64 * 1024 * 1024
+
+# Writes of each process go through a single writer thread (see controls/write_queue.py), which commits the units of
+# work queued meanwhile together
+write_queue_max_batch_size = 32
+write_queue_max_wait_seconds = 0.002
+# How long a callback waits for its unit of work to start before giving up
+write_queue_unit_timeout_seconds = 30
+
+# Cache shared by all worker processes (see controls/shared_cache.py), instead of one in-process cache per worker.
+# Disabled if empty, unless server.py runs several workers: it then defaults to a file next to the database
+shared_cache_file = os.environ.get('LEKKER_WOOF_SHARED_CACHE_FILE', '')
+shared_cache_max_bytes = 256 * 1024 * 1024
+
+# Production server (server.py)
+server_host = os.environ.get('LEKKER_WOOF_SERVER_HOST', '127.0.0.1')
+server_port = int(os.environ.get('LEKKER_WOOF_SERVER_PORT', '8050'))
+server_workers = int(os.environ.get('LEKKER_WOOF_SERVER_WORKERS', '4'))
+server_threads = int(os.environ.get('LEKKER_WOOF_SERVER_THREADS', '8'))
+server_listen_backlog = 128
+# Connections sending nothing for longer (while idle or sending their request) are closed
+server_request_timeout_seconds = 30
+# How long workers may take to finish their requests on shutdown or restart before they are killed
+server_graceful_timeout_seconds = 30
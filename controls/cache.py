@@ -0,0 +1,320 @@
+import logging
+import threading
+import time
+from collections import defaultdict, OrderedDict
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Hashable, Iterable, Optional, TypeVar
+
+from controls import shared_cache
+
+logger = logging.getLogger(__name__)
+
+_T = TypeVar('_T')
+
+
+class DataVersions:
+    """
+    Version of each table's data, bumped by DataProvider when a transaction that wrote to the table commits. Kept in
+    the shared cache when it is enabled, so that commits of every worker process are seen.
+    """
+
+    def __init__(self) -> None:
+        self.__version_by_table: dict[str, int] = defaultdict(int)
+        self.__lock = threading.Lock()
+
+    def get(self, tables: Iterable[str]) -> tuple[int, ...]:
+        store = shared_cache.get_store()
+        if store is not None:
+            return store.get_data_versions(tables)
+        with self.__lock:
+            return tuple(self.__version_by_table[table] for table in tables)
+
+    def bump(self, tables: Iterable[str]) -> None:
+        store = shared_cache.get_store()
+        if store is not None:
+            store.bump_data_versions(tables)
+            logger.debug(f'Bumped shared data version of {tables}')
+            return
+        with self.__lock:
+            for table in tables:
+                self.__version_by_table[table] += 1
+        logger.debug(f'Bumped data version of {tables}')
+
+
+data_versions = DataVersions()
+
+# Every cache created, by name, for their stats
+_caches_by_name: dict[str, Any] = {}
+
+
+def get_cache_stats() -> dict[str, 'CacheStats']:
+    return {name: cache.stats() for name, cache in list(_caches_by_name.items())}
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    stale: int = 0  # misses because the data version changed
+    expired: int = 0  # misses because the TTL elapsed
+    evicted: int = 0  # entries dropped to stay within max_entries (or max_bytes)
+    invalidated: int = 0  # entries dropped because their data was written
+    entries: int = 0
+    size_bytes: int = 0  # estimated, only tracked by LruCache
+
+
+@dataclass
+class _CacheEntry:
+    value: Any
+    version: tuple[int, ...]
+    expires_at: float
+
+
+class VersionedCache:
+    """
+    Read cache for data that rarely changes. Entries are valid while the data version of the tables they were loaded
+    from is unchanged; the TTL is only a safety net for writes that do not go through DataProvider.
+
+    Entries are kept in process memory, or in the shared cache when it is enabled (see controls.shared_cache).
+    """
+
+    def __init__(self, name: str, tables: tuple[str, ...], ttl_seconds: float,
+                 max_entries: Optional[int] = None) -> None:
+        """
+        :param max_entries: when exceeded, expired entries and then the oldest ones are dropped. Unbounded if None.
+        """
+        self.name = name
+        self.tables = tables
+        self.__ttl_seconds = ttl_seconds
+        self.__max_entries = max_entries
+        self.__entries: dict[Hashable, _CacheEntry] = {}
+        self.__stats = CacheStats()
+        self.__lock = threading.Lock()
+        _caches_by_name[name] = self
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], _T]) -> _T:
+        # Read the version before loading: if a write commits meanwhile, the entry is already stale
+        version = data_versions.get(self.tables)
+        store = shared_cache.get_store()
+        if store is not None:
+            return self.__get_or_load_shared(store, key, version, loader)
+        now = time.monotonic()
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry.version == version and entry.expires_at > now:
+                self.__stats.hits += 1
+                return entry.value
+            self.__stats.misses += 1
+            if entry is not None:
+                if entry.version != version:
+                    self.__stats.stale += 1
+                else:
+                    self.__stats.expired += 1
+
+        logger.debug(f'Cache {self.name} miss for {key}')
+        value = loader()
+        with self.__lock:
+            self.__entries.pop(key, None)
+            self.__entries[key] = _CacheEntry(value=value, version=version, expires_at=now + self.__ttl_seconds)
+            if self.__max_entries is not None and len(self.__entries) > self.__max_entries:
+                self.__evict(now)
+        return value
+
+    def __get_or_load_shared(self, store: shared_cache.SharedCacheStore, key: Hashable, version: tuple[int, ...],
+                             loader: Callable[[], _T]) -> _T:
+        # Entries of older versions are never read again, and age out
+        shared_key = repr((key, version))
+        value = store.get(self.name, shared_key)
+        with self.__lock:
+            if value is not None:
+                self.__stats.hits += 1
+                return value
+            self.__stats.misses += 1
+        logger.debug(f'Shared cache {self.name} miss for {key}')
+        value = loader()
+        store.put(self.name, shared_key, value, self.__ttl_seconds)
+        return value
+
+    def __evict(self, now: float) -> None:
+        expired_keys = [key for key, entry in self.__entries.items() if entry.expires_at <= now]
+        for key in expired_keys:
+            del self.__entries[key]
+        # Entries are kept in insertion order: the first ones are the oldest
+        while len(self.__entries) > self.__max_entries:
+            del self.__entries[next(iter(self.__entries))]
+            self.__stats.evicted += 1
+
+    def clear(self) -> None:
+        store = shared_cache.get_store()
+        if store is not None:
+            store.clear(self.name)
+        with self.__lock:
+            self.__entries.clear()
+
+    def stats(self) -> CacheStats:
+        return _get_stats(self.name, self.__stats, self.__lock, len(self.__entries), size_bytes=0)
+
+
+@dataclass
+class _LruEntry:
+    value: Any
+    size_bytes: int
+    expires_at: float
+    aliases: tuple[Hashable, ...]
+
+
+class LruCache:
+    """
+    Cache bounded by the estimated memory of its values, evicting the least recently used ones. Unlike VersionedCache,
+    entries are invalidated one by one by the writers of their data (see invalidate), so that writes to other keys keep
+    them cached. Entries may also be found by aliases, e.g. ids of the rows they hold.
+
+    Entries are kept in process memory, or in the shared cache when it is enabled (see controls.shared_cache). Then
+    invalidations reach every worker process, and the size is bounded by config.shared_cache_max_bytes instead.
+    """
+
+    def __init__(self, name: str, max_bytes: int, ttl_seconds: float, size_of: Callable[[Any], int]) -> None:
+        """
+        :param size_of: estimate of the memory used by a value, in bytes.
+        """
+        self.name = name
+        self.__max_bytes = max_bytes
+        self.__ttl_seconds = ttl_seconds
+        self.__size_of = size_of
+        # Least recently used first
+        self.__entries: OrderedDict[Hashable, _LruEntry] = OrderedDict()
+        self.__key_by_alias: dict[Hashable, Hashable] = {}
+        self.__size_bytes = 0
+        # Incremented by every invalidation, so that values loaded meanwhile are not stored (see put)
+        self.__generation = 0
+        self.__stats = CacheStats()
+        self.__lock = threading.Lock()
+        _caches_by_name[name] = self
+
+    @property
+    def generation(self) -> int:
+        store = shared_cache.get_store()
+        return store.generation(self.name) if store is not None else self.__generation
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        :return: the cached value, None on a miss.
+        """
+        store = shared_cache.get_store()
+        if store is not None:
+            return self.__count_shared(key, store.get(self.name, repr(key)))
+        with self.__lock:
+            return self.__get_locked(key)
+
+    def get_by_alias(self, alias: Hashable) -> Optional[Any]:
+        store = shared_cache.get_store()
+        if store is not None:
+            return self.__count_shared(alias, store.get_by_alias(self.name, repr(alias)))
+        with self.__lock:
+            return self.__get_locked(self.__key_by_alias.get(alias))
+
+    def __count_shared(self, key: Hashable, value: Optional[Any]) -> Optional[Any]:
+        with self.__lock:
+            if value is not None:
+                self.__stats.hits += 1
+            else:
+                self.__stats.misses += 1
+        if value is None:
+            logger.debug(f'Shared cache {self.name} miss for {key}')
+        return value
+
+    def __get_locked(self, key: Optional[Hashable]) -> Optional[Any]:
+        entry = self.__entries.get(key) if key is not None else None
+        if entry is not None and entry.expires_at > time.monotonic():
+            self.__entries.move_to_end(key)
+            self.__stats.hits += 1
+            return entry.value
+        self.__stats.misses += 1
+        if entry is not None:
+            self.__stats.expired += 1
+            self.__remove(key)
+        logger.debug(f'Cache {self.name} miss for {key}')
+        return None
+
+    def put(self, key: Hashable, value: Any, generation: int, aliases: Iterable[Hashable] = ()) -> bool:
+        """
+        :param generation: the generation read before loading the value. If anything was invalidated since, the value
+          may be stale and is not stored.
+        :param aliases: other keys the value can be found by with get_by_alias.
+        :return: whether the value was stored.
+        """
+        aliases = tuple(aliases)
+        store = shared_cache.get_store()
+        if store is not None:
+            return store.put(self.name, repr(key), value, self.__ttl_seconds, generation,
+                             aliases=[repr(alias) for alias in aliases])
+        size_bytes = self.__size_of(value)
+        with self.__lock:
+            if generation != self.__generation:
+                logger.debug(f'Cache {self.name} skipped {key}: invalidated while it was loaded')
+                return False
+            if size_bytes > self.__max_bytes:
+                logger.warning(f'Cache {self.name} skipped {key}: {size_bytes} bytes exceed the cache size')
+                return False
+            self.__remove(key)
+            self.__entries[key] = _LruEntry(value=value, size_bytes=size_bytes,
+                                            expires_at=time.monotonic() + self.__ttl_seconds, aliases=aliases)
+            for alias in aliases:
+                self.__key_by_alias[alias] = key
+            self.__size_bytes += size_bytes
+            while self.__size_bytes > self.__max_bytes:
+                self.__remove(next(iter(self.__entries)))
+                self.__stats.evicted += 1
+        return True
+
+    def invalidate(self, keys: Iterable[Hashable] = (), aliases: Iterable[Hashable] = ()) -> None:
+        """
+        Drops the entries of the keys, and of the keys the aliases point to.
+        """
+        keys, aliases = list(keys), list(aliases)
+        store = shared_cache.get_store()
+        if store is not None:
+            invalidated_count = store.invalidate(self.name, keys=[repr(key) for key in keys],
+                                                 aliases=[repr(alias) for alias in aliases])
+            with self.__lock:
+                self.__stats.invalidated += invalidated_count
+            return
+        with self.__lock:
+            self.__generation += 1
+            keys += [self.__key_by_alias[alias] for alias in aliases if alias in self.__key_by_alias]
+            for key in keys:
+                if self.__remove(key):
+                    self.__stats.invalidated += 1
+                    logger.debug(f'Cache {self.name} invalidated {key}')
+
+    def __remove(self, key: Hashable) -> bool:
+        entry = self.__entries.pop(key, None)
+        if entry is None:
+            return False
+        self.__size_bytes -= entry.size_bytes
+        for alias in entry.aliases:
+            if self.__key_by_alias.get(alias) == key:
+                del self.__key_by_alias[alias]
+        return True
+
+    def clear(self) -> None:
+        store = shared_cache.get_store()
+        if store is not None:
+            store.clear(self.name)
+        with self.__lock:
+            self.__generation += 1
+            self.__entries.clear()
+            self.__key_by_alias.clear()
+            self.__size_bytes = 0
+
+    def stats(self) -> CacheStats:
+        return _get_stats(self.name, self.__stats, self.__lock, len(self.__entries), self.__size_bytes)
+
+
+def _get_stats(name: str, stats: CacheStats, lock: threading.Lock, entries: int, size_bytes: int) -> CacheStats:
+    # Hits and misses are counted per process; entries and size are those of the shared cache when it is enabled
+    store = shared_cache.get_store()
+    if store is not None:
+        entries, size_bytes = store.namespace_size(name)
+    with lock:
+        return replace(stats, entries=entries, size_bytes=size_bytes)
@@ -0,0 +1,166 @@
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(RuntimeError):
+    pass
+
+
+@dataclass
+class PoolStats:
+    checkouts: int = 0
+    hits: int = 0  # checkouts served by an idle connection
+    misses: int = 0  # checkouts that had to open a new connection
+    waits: int = 0  # checkouts that had to wait for another thread to check a connection in
+    timeouts: int = 0
+    recycled: int = 0  # connections closed because of max age or a failed health check
+    open_connections: int = 0
+    idle_connections: int = 0
+
+
+@dataclass
+class _PooledConnection:
+    connection: sqlite3.Connection
+    created_at: float
+
+
+class ConnectionPool:
+    """
+    Bounded pool of long-lived SQLite connections. Connections are handed out one thread at a time, so the factory
+    must create them with `check_same_thread=False`.
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], max_size: int, max_age_seconds: float,
+                 checkout_timeout_seconds: float) -> None:
+        """
+        :param connect: factory opening a new, fully configured connection.
+        :param max_size: maximum number of open connections (idle + checked out).
+        :param max_age_seconds: connections older than this are closed on checkout/checkin and replaced.
+        :param checkout_timeout_seconds: how long checkout waits for a free connection before failing.
+        """
+        self.__connect = connect
+        self.__max_size = max_size
+        self.__max_age_seconds = max_age_seconds
+        self.__checkout_timeout_seconds = checkout_timeout_seconds
+        self.__idle: list[_PooledConnection] = []  # used as a stack, so the hottest connection is reused first
+        self.__checked_out: dict[int, _PooledConnection] = {}
+        self.__open_count = 0
+        self.__condition = threading.Condition()
+        self.__stats = PoolStats()
+
+    def checkout(self) -> sqlite3.Connection:
+        deadline = time.monotonic() + self.__checkout_timeout_seconds
+        with self.__condition:
+            self.__stats.checkouts += 1
+        has_waited = False
+        while True:
+            pooled = None
+            with self.__condition:
+                while not self.__idle and self.__open_count >= self.__max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.__stats.timeouts += 1
+                        raise PoolTimeoutError(f'No database connection available after '
+                                               f'{self.__checkout_timeout_seconds}s')
+                    if not has_waited:
+                        has_waited = True
+                        self.__stats.waits += 1
+                    self.__condition.wait(remaining)
+                if self.__idle:
+                    pooled = self.__idle.pop()
+                else:
+                    # Reserve the slot now, open the connection outside the lock
+                    self.__open_count += 1
+
+            if pooled is None:
+                pooled = self.__open()
+                with self.__condition:
+                    self.__stats.misses += 1
+                    self.__checked_out[id(pooled.connection)] = pooled
+                return pooled.connection
+
+            if self.__is_expired(pooled) or not self.__is_healthy(pooled):
+                self.__discard(pooled)
+                continue
+
+            with self.__condition:
+                self.__stats.hits += 1
+                self.__checked_out[id(pooled.connection)] = pooled
+            return pooled.connection
+
+    def checkin(self, connection: sqlite3.Connection) -> None:
+        with self.__condition:
+            pooled = self.__checked_out.pop(id(connection), None)
+        if pooled is None:
+            raise ValueError('Connection does not belong to this pool')
+
+        try:
+            if connection.in_transaction:
+                # Uncommitted work is discarded, just like closing the connection used to do
+                connection.rollback()
+        except sqlite3.Error as e:
+            logger.warning(f'Discarding connection that failed to roll back: {e}')
+            self.__discard(pooled)
+            return
+
+        if self.__is_expired(pooled):
+            self.__discard(pooled)
+            return
+
+        with self.__condition:
+            self.__idle.append(pooled)
+            self.__condition.notify()
+
+    def close_all(self) -> None:
+        """
+        Closes idle connections. Checked out connections are closed when checked back in.
+        """
+        with self.__condition:
+            idle, self.__idle = self.__idle, []
+            self.__max_age_seconds = 0
+        for pooled in idle:
+            self.__discard(pooled)
+
+    def stats(self) -> PoolStats:
+        with self.__condition:
+            return replace(self.__stats, open_connections=self.__open_count, idle_connections=len(self.__idle))
+
+    def __open(self) -> _PooledConnection:
+        try:
+            connection = self.__connect()
+        except BaseException:
+            with self.__condition:
+                self.__open_count -= 1
+                self.__condition.notify()
+            raise
+        logger.info(f'Opened pooled database connection ({self.__open_count}/{self.__max_size})')
+        return _PooledConnection(connection=connection, created_at=time.monotonic())
+
+    def __discard(self, pooled: _PooledConnection) -> None:
+        try:
+            pooled.connection.close()
+        except sqlite3.Error as e:
+            logger.warning(f'Error closing pooled connection: {e}')
+        with self.__condition:
+            self.__open_count -= 1
+            self.__stats.recycled += 1
+            self.__condition.notify()
+        logger.info('Closed pooled database connection')
+
+    def __is_expired(self, pooled: _PooledConnection) -> bool:
+        return time.monotonic() - pooled.created_at > self.__max_age_seconds
+
+    @staticmethod
+    def __is_healthy(pooled: _PooledConnection) -> bool:
+        try:
+            pooled.connection.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f'Pooled connection failed health check: {e}')
+            return False
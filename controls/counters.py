@@ -0,0 +1,63 @@
+"""
+Verifies (and optionally backfills) the class counters that triggers maintain on subscription. Usage (from the
+repository root):
+
+    python -m controls.counters [--database FILE] [--backfill]
+"""
+import argparse
+import logging
+import sqlite3
+
+import config
+from controls import queries, sqlite_config
+
+logger = logging.getLogger(__name__)
+
+
+def verify_taken_classes(connection: sqlite3.Connection) -> list[dict]:
+    """
+    :return: one entry per subscription whose counters do not match its classes.
+    """
+    cursor = connection.execute(queries.sql_verify_taken_classes)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def backfill_taken_classes(connection: sqlite3.Connection) -> int:
+    """
+    Recomputes the counters of every subscription from the class table and commits.
+    :return: number of subscriptions updated.
+    """
+    with connection:
+        cursor = connection.execute(queries.sql_backfill_taken_classes)
+    logger.info(f'Backfilled class counters of {cursor.rowcount} subscriptions')
+    return cursor.rowcount
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Verifies the class counters stored on subscription.')
+    parser.add_argument('--database', default=config.database_file,
+                        help=f'database file (default: {config.database_file})')
+    parser.add_argument('--backfill', action='store_true', help='recompute all counters from the class table')
+    args = parser.parse_args()
+    logging.basicConfig(format='%(levelname)-8s %(message)s', level=logging.INFO)
+
+    connection = sqlite_config.connect(args.database, config.database_profile)
+    try:
+        if args.backfill:
+            backfill_taken_classes(connection)
+        mismatches = verify_taken_classes(connection)
+        for mismatch in mismatches:
+            print(f'Subscription {mismatch["subscription_id"]}: '
+                  f'online {mismatch["taken_classes_online"]} (expected {mismatch["expected_taken_classes_online"]}), '
+                  f'in person {mismatch["taken_classes_in_person"]} '
+                  f'(expected {mismatch["expected_taken_classes_in_person"]})')
+        print(f'{len(mismatches)} subscription(s) with wrong class counters')
+    finally:
+        connection.close()
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
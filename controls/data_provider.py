@@ -1,169 +1,563 @@
+import json
 import logging
+import re
 import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Hashable, Iterable, Iterator, Optional, TypeVar
 
 import pandas as pd
 
-from controls import queries
+import config
+from controls import migrations, queries, retry, sqlite_config
+from controls.cache import CacheStats, data_versions, get_cache_stats, VersionedCache
+from controls.connection_pool import ConnectionPool, PoolStats
+from controls.query_stats import get_query_stats, instrumented, QueryStats, record_pandas, record_statement
+from controls.retry import get_retry_stats, RetryStats
+from controls.table_query import TablePage, TableQuery, TableQueryBuilder
 from controls.types import Customer
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+_search_term_pattern = re.compile(r'\w+')
+_max_search_terms = 8
+
+_T = TypeVar('_T')
+
+# Called with the tables and the keys (ids by key column) written by a transaction, after it commits
+CommitListener = Callable[[set[str], dict[str, set]], None]
+
+# Key column of each table with a row_version (see sql/1.5.0.sql)
+_key_column_by_versioned_table = {
+    'customer': 'customer_id',
+    'dog': 'dog_id',
+    'person': 'person_id',
+    'training': 'training_id',
+    'subscription': 'subscription_id',
+    'class': 'class_id',
+}
+
+
+def make_search_query(text: str) -> str:
+    """
+    Turns free text into an FTS5 query where every word must match the prefix of some indexed word. Quoting the terms
+    keeps FTS5 operators typed by the user (AND, NEAR, *, ...) from being interpreted.
+    """
+    terms = _search_term_pattern.findall(text)[:_max_search_terms]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+class StaleDataError(RuntimeError):
+    """
+    An update did not match the row_version it was made from: the row was changed (or deleted) meanwhile.
+    """
+
+    def __init__(self, table: str, ids: list) -> None:
+        super().__init__(f'{table} {", ".join(str(id_) for id_ in ids)} was modified by someone else in the meantime. '
+                         f'Press Reset to load the latest data')
+        self.table = table
+        self.ids = ids
+
 
 class DataProvider:
-    # TODO configurable file location
+    __pool: Optional[ConnectionPool] = None
+    __pool_lock = threading.Lock()
+    # Reference data, invalidated when a transaction that wrote to one of its tables commits
+    __trainings_cache = VersionedCache('trainings', tables=('training',),
+                                       ttl_seconds=config.reference_data_cache_ttl_seconds)
+    __commit_listeners: list[CommitListener] = []
+
+    def __init__(self, connection: Optional[sqlite3.Connection] = None) -> None:
+        """
+        :param connection: connection to use instead of one from the pool, whose transaction is managed by its owner
+          (see controls.write_queue): commit and rollback are not allowed then.
+        """
+        self.__external_connection = connection
 
     def __enter__(self):
-        logger.info('Connecting to database...')
-        self.__connection = sqlite3.connect('sql/lekker_woof.db')
-        logger.info('Connected')
+        if self.__external_connection is not None:
+            self.__connection = self.__external_connection
+        else:
+            logger.debug('Checking out database connection...')
+            self.__connection = DataProvider.__get_pool().checkout()
+            logger.debug('Checked out')
+        self.__written_tables: set[str] = set()
+        self.__written_keys: dict[str, set] = defaultdict(set)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        logger.info('Closing connection...')
-        self.__connection.close()
+        if self.__external_connection is None:
+            logger.debug('Checking in database connection...')
+            DataProvider.__get_pool().checkin(self.__connection)
+        self.__written_tables.clear()
+        self.__written_keys.clear()
         return 0
 
+    @staticmethod
+    def pool_stats() -> PoolStats:
+        return DataProvider.__get_pool().stats()
+
+    @staticmethod
+    def cache_stats() -> dict[str, CacheStats]:
+        return get_cache_stats()
+
+    @staticmethod
+    def retry_stats() -> dict[str, RetryStats]:
+        """
+        :return: retries and timeouts of the operations that failed on a lock, by operation name.
+        """
+        return get_retry_stats()
+
+    @staticmethod
+    def query_stats() -> dict[str, QueryStats]:
+        """
+        :return: timings of the calls to the methods of this class, by method name.
+        """
+        return get_query_stats()
+
+    @staticmethod
+    def add_commit_listener(listener: CommitListener) -> None:
+        """
+        For caches invalidated per key. Listeners are also called, without committing, with the rows an update found
+        stale (see StaleDataError).
+        """
+        DataProvider.__commit_listeners.append(listener)
+
+    @staticmethod
+    def __notify_commit_listeners(tables: set[str], keys: dict[str, set]) -> None:
+        for listener in DataProvider.__commit_listeners:
+            try:
+                listener(tables, keys)
+            except Exception:
+                logger.exception(f'Commit listener {listener} failed')
+
+    @staticmethod
+    def close_pool() -> None:
+        with DataProvider.__pool_lock:
+            if DataProvider.__pool is not None:
+                DataProvider.__pool.close_all()
+                DataProvider.__pool = None
+
+    @staticmethod
+    def __get_pool() -> ConnectionPool:
+        if DataProvider.__pool is None:
+            with DataProvider.__pool_lock:
+                if DataProvider.__pool is None:
+                    DataProvider.__pool = ConnectionPool(
+                        connect=DataProvider.__connect,
+                        max_size=config.database_pool_size,
+                        max_age_seconds=config.database_pool_max_age_seconds,
+                        checkout_timeout_seconds=config.database_pool_checkout_timeout_seconds)
+        return DataProvider.__pool
+
+    @staticmethod
+    def __connect() -> sqlite3.Connection:
+        logger.info(f'Connecting to database {config.database_file} (profile {config.database_profile})...')
+        connection = sqlite_config.connect(config.database_file, config.database_profile,
+                                           busy_timeout_ms=config.database_busy_timeout_ms)
+        if config.database_file == sqlite_config.IN_MEMORY_DATABASE:
+            # Nothing creates the in-memory schema upfront
+            migrations.migrate(connection)
+        logger.info('Connected')
+        return connection
+
+    @instrumented
     def commit(self) -> None:
+        self.__check_owns_transaction()
         logger.info('Committing...')
-        self.__connection.commit()
+        # A commit failing on a lock leaves the transaction open: it can be retried as is
+        retry.run(self.__connection.commit, name='commit')
+        DataProvider.publish_committed(*self.pop_written_data())
         logger.info('Committed')
 
     def rollback(self) -> None:
+        self.__check_owns_transaction()
         logger.info('Rolling back...')
         self.__connection.rollback()
+        self.pop_written_data()
         logger.info('Rolled back')
 
+    def __check_owns_transaction(self) -> None:
+        if self.__external_connection is not None:
+            raise RuntimeError('The transaction of this connection is managed by its owner')
+
+    def pop_written_data(self) -> tuple[set[str], dict[str, set]]:
+        """
+        :return: the tables and the keys (ids by key column) written since the last commit or rollback, then forgets
+          them. For the owner of the connection, see publish_committed.
+        """
+        written_data = set(self.__written_tables), dict(self.__written_keys)
+        self.__written_tables.clear()
+        self.__written_keys.clear()
+        return written_data
+
+    @staticmethod
+    def publish_committed(tables: set[str], keys: dict[str, set]) -> None:
+        """
+        Invalidates what caches hold of the data written by a committed transaction.
+        """
+        data_versions.bump(tables)
+        DataProvider.__notify_commit_listeners(tables, keys)
+
+    def ping(self) -> None:
+        self.__connection.execute('SELECT 1').fetchone()
+
+    @contextmanager
+    def read_transaction(self) -> Iterator[None]:
+        """
+        Runs the reads inside the block against one consistent snapshot of the database. Reuses the current transaction
+        if there is one.
+        """
+        if self.__connection.in_transaction:
+            yield
+            return
+        self.__connection.execute('BEGIN')
+        try:
+            yield
+        finally:
+            self.__connection.rollback()
+
+    def __execute_write(self, query: str, params: Any, many: bool = False) -> sqlite3.Cursor:
+        """
+        Starts an immediate transaction first if none is open: it takes the write lock upfront, waiting (and retrying)
+        for it, instead of failing in the middle of the transaction when upgrading a read lock.
+        :param many: executes the query for each params in the params list.
+        """
+        if not self.__connection.in_transaction:
+            retry.run(lambda: self.__connection.execute('BEGIN IMMEDIATE'), name='begin_immediate')
+        start = time.perf_counter()
+        cursor = self.__connection.executemany(query, params) if many else self.__connection.execute(query, params)
+        record_statement(self.__connection, query, params[0] if many else params, time.perf_counter() - start, 0)
+        return cursor
+
+    def __fetch_rows(self, query: str, params: dict) -> tuple[list[str], list[tuple]]:
+        """
+        :return: the column names and the rows of the query.
+        """
+        start = time.perf_counter()
+        cursor = self.__connection.execute(query, params)
+        rows = cursor.fetchall()
+        record_statement(self.__connection, query, params, time.perf_counter() - start, len(rows))
+        return [column[0] for column in cursor.description], rows
+
+    def __fetch_records(self, query: str, params: dict) -> list[dict]:
+        columns, rows = self.__fetch_rows(query, params)
+        return [dict(zip(columns, row)) for row in rows]
+
+    def __read_frame(self, query: str, params: Optional[dict] = None) -> pd.DataFrame:
+        # What pd.read_sql does, with the SQL and the pandas parts timed apart
+        columns, rows = self.__fetch_rows(query, params or {})
+        start = time.perf_counter()
+        frame = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+        record_pandas(time.perf_counter() - start)
+        return frame
+
+    def __mark_written(self, table: str, **keys: Any) -> None:
+        """
+        :param keys: ids by key column of the rows written, or of the rows they belong to, for commit listeners.
+        """
+        self.__written_tables.add(table)
+        for key_column, key in keys.items():
+            if key is not None:
+                self.__written_keys[key_column].add(key)
+
+    def __get_cached(self, cache: VersionedCache, key: Hashable, loader: Callable[[], _T]) -> _T:
+        # Uncommitted writes of this transaction must neither be read from nor stored in the cache
+        if self.__written_tables & set(cache.tables):
+            return loader()
+        return cache.get_or_load(key, loader)
+
+    def __get_table_page(self, query_builder: TableQueryBuilder, table_query: TableQuery,
+                         tables: tuple[str, ...]) -> TablePage:
+        """
+        :param tables: read by the base query of the builder. The row count of the previous page is reused until they
+          change.
+        """
+        page_query, page_params, count_query, count_params = query_builder.build(table_query)
+        with self.read_transaction():
+            versions = list(data_versions.get(tables))
+            records = self.__fetch_records(page_query, page_params)
+            if (table_query.row_count is not None and table_query.row_count_data_versions == versions
+                    and not self.__written_tables & set(tables)):
+                row_count = table_query.row_count
+            else:
+                row_count = self.__fetch_rows(count_query, count_params)[1][0][0]
+        last_key = query_builder.get_row_key(records[-1], table_query) if records else None
+        return TablePage(records=records, row_count=row_count, page_size=table_query.page_size, last_key=last_key,
+                         data_versions=versions)
+
+    @instrumented
     def get_all_customers(self) -> pd.DataFrame:
         logger.debug('get_all_customers')
-        return pd.read_sql(queries.sql_get_all_customers, self.__connection)
+        return self.__read_frame(queries.sql_get_all_customers)
+
+    @instrumented
+    def get_customers_page(self, table_query: TableQuery, column_types: dict[str, str]) -> TablePage:
+        logger.debug(f'get_customers_page {table_query}')
+        return self.__get_table_page(TableQueryBuilder(queries.sql_get_all_customers, 'dog_id', column_types),
+                                     table_query, tables=('customer', 'dog', 'person'))
 
+    @instrumented
+    def search(self, query: str, limit: int = 10) -> pd.DataFrame:
+        logger.debug(f'search {query} limit={limit}')
+        return self.__read_frame(queries.sql_search_customers,
+                                 {'query': make_search_query(query) or '""', 'limit': limit})
+
+    @instrumented
     def get_customer_by_dog_id(self, dog_id: int) -> Customer:
         logger.debug(f'get_customer_by_dog_id {dog_id}')
-        customer_df = pd.read_sql(queries.sql_customer_by_dog_id, self.__connection,
-                                  params={'dog_id': dog_id})
-
-        customer_data_df = customer_df.loc[:, ['customer_id', 'address', 'balance_in_eur', 'customer_notes',
-                                               'customer_created_timestamp']]
-        customer_data_df = customer_data_df.drop_duplicates(subset=['customer_id'], keep='first')
-        customer_data = customer_data_df.to_dict('records')
-        if len(customer_data) != 1:
-            raise ValueError(f'Expected 1 and only 1 entry for customer_data, but found {len(customer_data)} '
-                             f'for dog {dog_id}')
-        customer_data = customer_data[0]
-
-        dogs_df = customer_df.loc[:, ['dog_id', 'dog_name', 'birth_date', 'breed', 'is_male', 'dog_notes',
-                                      'dog_created_timestamp']]
-        dogs_df = dogs_df.drop_duplicates(subset=['dog_id'], keep='first')
-        dogs = dogs_df.to_dict('records')
-
-        persons_df = customer_df.loc[:, ['person_id', 'person_name', 'phone1', 'phone2', 'email_address',
-                                         'person_created_timestamp']]
-        persons_df = persons_df.drop_duplicates(subset=['person_id'], keep='first')
-        persons = persons_df.to_dict('records')
+        with self.read_transaction():
+            customer_data = self.__fetch_records(queries.sql_customer_by_dog_id, {'dog_id': dog_id})
+            if len(customer_data) != 1:
+                raise ValueError(f'Expected 1 and only 1 entry for customer_data, but found {len(customer_data)} '
+                                 f'for dog {dog_id}')
+            customer_data = customer_data[0]
+
+            params = {'customer_id': customer_data['customer_id']}
+            dogs = self.__fetch_records(queries.sql_dogs_by_customer_id, params)
+            persons = self.__fetch_records(queries.sql_persons_by_customer_id, params)
 
         # TODO return DataFrames instead
         return Customer(customer_data, dogs, persons)
 
+    @instrumented
     def insert_customer(self, customer_data: dict) -> int:
         logger.info(f'Inserting customer: ${customer_data}')
-        cur = self.__connection.execute(queries.sql_insert_customer, customer_data)
+        self.__mark_written('customer')
+        cur = self.__execute_write(queries.sql_insert_customer, customer_data)
         customer_id = cur.lastrowid
         logger.info(f'Customer inserted with id ${customer_id}')
         return customer_id
 
+    @instrumented
     def update_customer(self, customer_data: dict) -> None:
         logger.info(f'Updating customer: ${customer_data}')
-        self.__connection.execute(queries.sql_update_customer, customer_data)
+        self.__mark_written('customer', customer_id=customer_data['customer_id'])
+        cursor = self.__execute_write(queries.sql_update_customer, customer_data)
+        self.__check_updated(cursor.rowcount, 1, 'customer', [customer_data['customer_id']])
         logger.info(f'Customer updated')
 
+    @instrumented
+    def update_customers(self, customers: list[dict]) -> int:
+        """
+        Column-minimal updates: only the fields present in each dict (besides customer_id) are written.
+        :return: number of statements executed.
+        """
+        return self.__update_partially('customer', 'customer_id', queries.customer_columns_by_field, customers)
+
+    @instrumented
     def insert_dog(self, dog: dict, customer_id: int) -> int:
         logger.info(f'Inserting dog of customer {customer_id}: ${dog}')
+        self.__mark_written('dog', customer_id=customer_id)
         params = dog.copy()
         params['customer_id'] = customer_id
-        cur = self.__connection.execute(queries.sql_insert_dog, params)
+        cur = self.__execute_write(queries.sql_insert_dog, params)
         dog_id = cur.lastrowid
         logger.info(f'Dog inserted with id ${dog_id}')
         return dog_id
 
+    @instrumented
     def update_dog(self, dog: dict) -> None:
         logger.info(f'Updating dog: ${dog}')
-        self.__connection.execute(queries.sql_update_dog, dog)
+        self.__mark_written('dog', dog_id=dog['dog_id'])
+        cursor = self.__execute_write(queries.sql_update_dog, dog)
+        self.__check_updated(cursor.rowcount, 1, 'dog', [dog['dog_id']])
         logger.info(f'Dog updated')
 
+    @instrumented
+    def update_dogs(self, dogs: list[dict]) -> int:
+        """
+        See update_customers.
+        """
+        return self.__update_partially('dog', 'dog_id', queries.dog_columns_by_field, dogs)
+
+    @instrumented
     def insert_person(self, person: dict, customer_id: int) -> int:
         logger.info(f'Inserting person of customer {customer_id}: ${person}')
+        self.__mark_written('person', customer_id=customer_id)
         params = person.copy()
         params['customer_id'] = customer_id
-        cur = self.__connection.execute(queries.sql_insert_person, params)
+        cur = self.__execute_write(queries.sql_insert_person, params)
         person_id = cur.lastrowid
         logger.info(f'Person inserted with id ${person_id}')
         return person_id
 
+    @instrumented
     def update_person(self, person: dict) -> None:
         logger.info(f'Updating person: ${person}')
-        self.__connection.execute(queries.sql_update_person, person)
+        self.__mark_written('person', person_id=person['person_id'])
+        cursor = self.__execute_write(queries.sql_update_person, person)
+        self.__check_updated(cursor.rowcount, 1, 'person', [person['person_id']])
         logger.info(f'Person updated')
 
+    @instrumented
+    def update_persons(self, persons: list[dict]) -> int:
+        """
+        See update_customers.
+        """
+        return self.__update_partially('person', 'person_id', queries.person_columns_by_field, persons)
+
+    def __update_partially(self, table: str, key_column: str, columns_by_field: dict[str, str],
+                           rows: list[dict]) -> int:
+        # Rows updating the same columns share one statement, executed once for all of them
+        rows_by_fields: dict[tuple[str, ...], list[dict]] = defaultdict(list)
+        for row in rows:
+            fields = tuple(sorted(field for field in row if field in columns_by_field))
+            if fields:
+                rows_by_fields[fields].append(row)
+
+        for fields, same_shaped_rows in rows_by_fields.items():
+            logger.info(f'Updating {fields} of {len(same_shaped_rows)} {table}(s)')
+            query = queries.make_partial_update(table, key_column, {field: columns_by_field[field] for field in fields})
+            cursor = self.__execute_write(query, same_shaped_rows, many=True)
+            self.__check_updated(cursor.rowcount, len(same_shaped_rows), table,
+                                 [row[key_column] for row in same_shaped_rows])
+        for same_shaped_rows in rows_by_fields.values():
+            for row in same_shaped_rows:
+                self.__mark_written(table, **{key_column: row[key_column]})
+        return len(rows_by_fields)
+
+    @staticmethod
+    def __check_updated(updated_count: int, expected_count: int, table: str, ids: list) -> None:
+        # Updates only match rows still at the row_version the data was read with
+        if updated_count != expected_count:
+            logger.warning(f'Updated {updated_count} of {expected_count} {table}(s) {ids}: stale row_version')
+            # Whatever is cached of these rows is stale as well
+            DataProvider.__notify_commit_listeners({table}, {_key_column_by_versioned_table[table]: set(ids)})
+            raise StaleDataError(table, ids)
+
+    @instrumented
+    def get_row_versions(self, table: str, ids: Iterable[int]) -> dict[int, int]:
+        """
+        Lets caches and open forms check whether what they hold is still current with a single indexed read.
+        :return: row_version by id, for the ids that still exist.
+        """
+        if table not in _key_column_by_versioned_table:
+            raise ValueError(f'Table {table} has no row_version')
+        ids = list(ids)
+        logger.debug(f'get_row_versions {table} {ids}')
+        if not ids:
+            return {}
+        query = queries.make_row_versions_query(table, _key_column_by_versioned_table[table])
+        return dict(self.__fetch_rows(query, {'ids': json.dumps(ids)})[1])
+
+    @instrumented
     def get_all_trainings(self) -> pd.DataFrame:
         logger.debug('get_all_trainings')
-        return pd.read_sql(queries.sql_get_all_trainings, self.__connection)
-
+        return self.__read_frame(queries.sql_get_all_trainings)
+
+    @instrumented
+    def get_trainings_page(self, table_query: TableQuery, column_types: dict[str, str]) -> TablePage:
+        logger.debug(f'get_trainings_page {table_query}')
+        query_builder = TableQueryBuilder(queries.sql_get_all_trainings, 'training_id', column_types)
+        key = json.dumps(['page', table_query.signature, table_query.page_current, table_query.after_key,
+                          sorted(column_types.items())])
+        return self.__get_cached(DataProvider.__trainings_cache, key,
+                                 lambda: self.__get_table_page(query_builder, table_query,
+                                                               tables=DataProvider.__trainings_cache.tables))
+
+    @instrumented
+    def get_training_options(self) -> list[dict]:
+        """
+        :return: select options (label and value) of all trainings. Shared with other callers: do not modify.
+        """
+        logger.debug('get_training_options')
+        return self.__get_cached(DataProvider.__trainings_cache, 'options', self.__load_training_options)
+
+    def __load_training_options(self) -> list[dict]:
+        return [
+            {'label': f'{training["name"]} (€ {training["price"]:.2f})', 'value': training['training_id']}
+            for training in self.__fetch_records(queries.sql_get_all_trainings, {})
+        ]
+
+    @instrumented
     def get_training_by_id(self, training_id: int) -> pd.DataFrame:
         logger.debug(f'get_training_by_id {training_id}')
-        return pd.read_sql(queries.sql_training_by_id, self.__connection, params={'training_id': training_id})
+        return self.__read_frame(queries.sql_training_by_id, {'training_id': training_id})
 
+    @instrumented
     def insert_training(self, training_data: dict) -> int:
         logger.info(f'Inserting training: ${training_data}')
-        cur = self.__connection.execute(queries.sql_insert_training, training_data)
+        self.__mark_written('training')
+        cur = self.__execute_write(queries.sql_insert_training, training_data)
         training_id = cur.lastrowid
         logger.info(f'Training inserted with id ${training_id}')
         return training_id
 
+    @instrumented
     def update_training(self, training_data: dict) -> None:
         logger.info(f'Updating training: ${training_data}')
-        self.__connection.execute(queries.sql_update_training, training_data)
+        self.__mark_written('training', training_id=training_data['training_id'])
+        cursor = self.__execute_write(queries.sql_update_training, training_data)
+        self.__check_updated(cursor.rowcount, 1, 'training', [training_data['training_id']])
         logger.info(f'Training updated')
 
+    @instrumented
     def get_subscriptions_by_dog_id(self, dog_id: int) -> pd.DataFrame:
         logger.debug(f'get_subscriptions_by_dog_id {dog_id}')
-        return pd.read_sql(queries.sql_subscriptions_by_dog_id, self.__connection, params={'dog_id': dog_id})
+        return self.__read_frame(queries.sql_subscriptions_by_dog_id, {'dog_id': dog_id})
 
+    @instrumented
+    def get_subscriptions_by_customer_id(self, customer_id: int) -> pd.DataFrame:
+        logger.debug(f'get_subscriptions_by_customer_id {customer_id}')
+        return self.__read_frame(queries.sql_subscriptions_by_customer_id, {'customer_id': customer_id})
+
+    @instrumented
     def get_subscription_by_id(self, subscription_id: int) -> pd.DataFrame:
         logger.debug(f'get_subscription_by_id {subscription_id}')
-        return pd.read_sql(queries.sql_subscription_by_id, self.__connection,
-                           params={'subscription_id': subscription_id})
+        return self.__read_frame(queries.sql_subscription_by_id, {'subscription_id': subscription_id})
 
+    @instrumented
     def insert_subscription(self, subscription_data: dict) -> int:
         logger.info(f'Inserting subscription: ${subscription_data}')
-        cur = self.__connection.execute(queries.sql_insert_subscription, subscription_data)
+        self.__mark_written('subscription', dog_id=subscription_data['dog_id'])
+        cur = self.__execute_write(queries.sql_insert_subscription, subscription_data)
         subscription_id = cur.lastrowid
         logger.info(f'Subscription inserted with id ${subscription_id}')
         return subscription_id
 
+    @instrumented
     def update_subscription(self, subscription_data: dict) -> None:
         logger.info(f'Updating subscription: ${subscription_data}')
-        self.__connection.execute(queries.sql_update_subscription, subscription_data)
+        self.__mark_written('subscription', dog_id=subscription_data['dog_id'],
+                            subscription_id=subscription_data['subscription_id'])
+        cursor = self.__execute_write(queries.sql_update_subscription, subscription_data)
+        self.__check_updated(cursor.rowcount, 1, 'subscription', [subscription_data['subscription_id']])
         logger.info(f'Subscription updated')
 
+    @instrumented
     def get_classes_by_subscription_id(self, subscription_id: int) -> pd.DataFrame:
         logger.debug(f'get_classes_by_subscription_id {subscription_id}')
-        return pd.read_sql(queries.sql_classes_by_subscription_id, self.__connection,
-                           params={'subscription_id': subscription_id})
+        return self.__read_frame(queries.sql_classes_by_subscription_id, {'subscription_id': subscription_id})
 
+    @instrumented
     def get_single_classes_by_dog_id(self, dog_id: int) -> pd.DataFrame:
         logger.debug(f'get_single_classes_by_dog_id {dog_id}')
-        return pd.read_sql(queries.sql_single_classes_by_dog_id, self.__connection,
-                           params={'dog_id': dog_id})
+        return self.__read_frame(queries.sql_single_classes_by_dog_id, {'dog_id': dog_id})
+
+    @instrumented
+    def get_single_classes_by_customer_id(self, customer_id: int) -> pd.DataFrame:
+        logger.debug(f'get_single_classes_by_customer_id {customer_id}')
+        return self.__read_frame(queries.sql_single_classes_by_customer_id, {'customer_id': customer_id})
 
+    @instrumented
     def insert_class(self, class_data: dict) -> int:
         logger.info(f'Inserting class: ${class_data}')
-        cur = self.__connection.execute(queries.sql_insert_class, class_data)
+        self.__mark_written('class', dog_id=class_data.get('dog_id'),
+                            subscription_id=class_data.get('subscription_id'))
+        cur = self.__execute_write(queries.sql_insert_class, class_data)
         class_id = cur.lastrowid
         logger.info(f'Class inserted with id ${class_id}')
         return class_id
 
+    @instrumented
     def update_class(self, class_data: dict) -> None:
         logger.info(f'Updating class: ${class_data}')
-        self.__connection.execute(queries.sql_update_class, class_data)
+        self.__mark_written('class', dog_id=class_data.get('dog_id'),
+                            subscription_id=class_data.get('subscription_id'), class_id=class_data['class_id'])
+        cursor = self.__execute_write(queries.sql_update_class, class_data)
+        self.__check_updated(cursor.rowcount, 1, 'class', [class_data['class_id']])
         logger.info(f'Class updated')
@@ -0,0 +1,322 @@
+"""
+Operational metrics in the Prometheus text format, served at GET /metrics (see install): latency and payload sizes of
+the Dash callbacks by output, DataProvider calls, caches, connection pool, write queue, retries and memory.
+
+With several worker processes (see server.py), whichever worker answers a scrape reports the metrics of all of them:
+each worker publishes its own to the shared cache every config.metrics_publish_interval_seconds, and /metrics sums
+them. Totals include those of the workers that stopped, so that they never drop; gauges only cover the running ones.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Any, Iterable, Optional
+
+import flask
+
+import config
+from controls import shared_cache, write_queue
+from controls.data_provider import DataProvider
+from controls.query_stats import Histogram
+
+logger = logging.getLogger(__name__)
+
+_prefix = 'lekker_woof'
+_content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Fields of the stats dataclasses which are current values rather than running totals
+_gauge_fields = {'entries', 'size_bytes', 'open_connections', 'idle_connections', 'max_batch_size', 'queued_units'}
+# Gauges that are the same in every worker (those of the shared cache) or already a maximum: not summed across workers
+_max_gauge_fields = {'entries', 'size_bytes', 'max_batch_size'}
+
+# Workers that published longer ago are considered gone, e.g. killed
+_running_worker_max_age_intervals = 3
+
+
+@dataclass
+class _CallbackMetrics:
+    duration_seconds: Histogram = field(default_factory=Histogram)
+    request_bytes: Histogram = field(default_factory=lambda: Histogram(bounds=BYTES_BUCKETS))
+    response_bytes: Histogram = field(default_factory=lambda: Histogram(bounds=BYTES_BUCKETS))
+    errors: int = 0
+
+
+@dataclass
+class _Family:
+    metric_type: str  # 'counter', 'gauge' or 'histogram'
+    help_text: str
+    samples: dict[tuple, Any] = field(default_factory=dict)  # value (a Histogram for histograms) by labels
+    aggregation: str = 'sum'  # of gauges across workers: 'sum' or 'max'
+
+
+_metrics_by_callback_output: dict[str, _CallbackMetrics] = {}
+_callback_metrics_lock = threading.Lock()
+
+# Id of this worker in the shared cache (pids are reused), and the pid it was made in: forked workers make their own
+_worker_id: Optional[str] = None
+_worker_id_pid: Optional[int] = None
+_worker_id_lock = threading.Lock()
+# Process running the publishing thread
+_publisher_pid: Optional[int] = None
+
+
+def install(server: flask.Flask) -> None:
+    """
+    Measures the Dash callback requests and serves the metrics at /metrics.
+    """
+    @server.before_request
+    def start_callback_timer() -> None:
+        if shared_cache.get_store() is not None:
+            _start_publishing()
+        if flask.request.path.endswith('/_dash-update-component'):
+            flask.g.callback_start = time.perf_counter()
+
+    @server.after_request
+    def record_callback(response: flask.Response) -> flask.Response:
+        start = flask.g.pop('callback_start', None)
+        if start is not None:
+            # Parsed by Dash already
+            body = flask.request.get_json(silent=True) or {}
+            record_callback_request(body.get('output', '?'), time.perf_counter() - start,
+                                    request_bytes=flask.request.content_length or 0,
+                                    response_bytes=response.calculate_content_length() or 0,
+                                    is_error=response.status_code >= 500)
+        return response
+
+    @server.route('/metrics')
+    def metrics() -> flask.Response:
+        return flask.Response(render_metrics(), content_type=_content_type)
+
+
+def record_callback_request(output: str, duration_seconds: float, request_bytes: int, response_bytes: int,
+                            is_error: bool) -> None:
+    with _callback_metrics_lock:
+        if output not in _metrics_by_callback_output:
+            _metrics_by_callback_output[output] = _CallbackMetrics()
+        metrics = _metrics_by_callback_output[output]
+        metrics.duration_seconds.observe(duration_seconds)
+        metrics.request_bytes.observe(request_bytes)
+        metrics.response_bytes.observe(response_bytes)
+        if is_error:
+            metrics.errors += 1
+
+
+def render_metrics() -> str:
+    families = _collect()
+    store = shared_cache.get_store()
+    if store is not None:
+        store.put_worker_metrics(_get_worker_id(), families)
+        running_since = time.time() - _running_worker_max_age_intervals * config.metrics_publish_interval_seconds
+        families = _merge([(worker_families, not is_stopped and published_at >= running_since)
+                           for worker_families, published_at, is_stopped in store.get_worker_metrics()])
+    _add_cache_hit_ratio(families)
+    return _render(families)
+
+
+def publish_stopped() -> None:
+    """
+    Publishes the last metrics of this worker process, which is stopping: its totals are kept, its gauges dropped.
+    """
+    store = shared_cache.get_store()
+    if store is not None:
+        store.put_worker_metrics(_get_worker_id(), _collect(), is_stopped=True)
+
+
+def _get_worker_id() -> str:
+    global _worker_id, _worker_id_pid
+    if _worker_id_pid != os.getpid():
+        with _worker_id_lock:
+            if _worker_id_pid != os.getpid():
+                _worker_id = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+                _worker_id_pid = os.getpid()
+    return _worker_id
+
+
+def _start_publishing() -> None:
+    """
+    Starts the thread publishing the metrics of this worker process, unless running already.
+    """
+    global _publisher_pid
+    # Threads do not survive a fork: each worker process starts its own
+    if _publisher_pid == os.getpid():
+        return
+    with _worker_id_lock:
+        if _publisher_pid == os.getpid():
+            return
+        _publisher_pid = os.getpid()
+    threading.Thread(target=_publish_periodically, name='metrics-publisher', daemon=True).start()
+
+
+def _publish_periodically() -> None:
+    while True:
+        time.sleep(config.metrics_publish_interval_seconds)
+        try:
+            shared_cache.get_store().put_worker_metrics(_get_worker_id(), _collect())
+        except Exception as e:
+            logger.warning(f'Metrics not published: {e}')
+
+
+def _collect() -> dict[str, _Family]:
+    """
+    :return: metrics of this process, by name.
+    """
+    collector = _Collector()
+
+    with _callback_metrics_lock:
+        callback_metrics = {(('output', output),): _CallbackMetrics(duration_seconds=metrics.duration_seconds.copy(),
+                                                                    request_bytes=metrics.request_bytes.copy(),
+                                                                    response_bytes=metrics.response_bytes.copy(),
+                                                                    errors=metrics.errors)
+                            for output, metrics in _metrics_by_callback_output.items()}
+    collector.histogram('callback_duration_seconds', 'Duration of the Dash callback requests',
+                        {labels: metrics.duration_seconds for labels, metrics in callback_metrics.items()})
+    collector.histogram('callback_request_bytes', 'Size of the Dash callback request bodies',
+                        {labels: metrics.request_bytes for labels, metrics in callback_metrics.items()})
+    collector.histogram('callback_response_bytes', 'Size of the Dash callback response bodies',
+                        {labels: metrics.response_bytes for labels, metrics in callback_metrics.items()})
+    collector.samples('callback_errors_total', 'counter', 'Dash callback requests answered with a server error',
+                      ((labels, metrics.errors) for labels, metrics in callback_metrics.items()))
+
+    query_stats = {(('method', method),): stats for method, stats in DataProvider.query_stats().items()}
+    collector.histogram('query_duration_seconds', 'Wall time of the DataProvider calls',
+                        {labels: stats.wall_seconds for labels, stats in query_stats.items()})
+    for name, help_text, attribute in (
+            ('query_sql_seconds_total', 'Time spent in SQLite by the DataProvider calls', 'sql_seconds'),
+            ('query_pandas_seconds_total', 'Time spent building data frames by the DataProvider calls',
+             'pandas_seconds'),
+            ('query_statements_total', 'Statements executed by the DataProvider calls', 'statements'),
+            ('query_rows_total', 'Rows returned to the DataProvider calls', 'rows'),
+            ('query_slow_calls_total', 'DataProvider calls written to the slow-query log', 'slow_calls')):
+        collector.samples(name, 'counter', help_text,
+                          ((labels, getattr(stats, attribute)) for labels, stats in query_stats.items()))
+
+    collector.dataclass_samples('cache', 'Cache', {(('cache', name),): asdict(stats)
+                                                   for name, stats in DataProvider.cache_stats().items()})
+    collector.dataclass_samples('pool', 'Connection pool', {(): asdict(DataProvider.pool_stats())})
+    write_queue_stats = write_queue.get_stats()
+    if write_queue_stats is not None:
+        collector.dataclass_samples('write_queue', 'Write queue', {(): asdict(write_queue_stats)})
+    collector.dataclass_samples('retry', 'Retries of database operations failing on a lock',
+                                {(('operation', operation),): asdict(stats)
+                                 for operation, stats in DataProvider.retry_stats().items()})
+
+    rss_bytes = _get_rss_bytes()
+    if rss_bytes is not None:
+        collector.samples('process_resident_memory_bytes', 'gauge', 'Resident memory of the processes',
+                          [((), rss_bytes)], prefixed=False)
+    return collector.families
+
+
+class _Collector:
+    """
+    Gathers metric families by name. Labels are tuples of (name, value) pairs.
+    """
+    def __init__(self) -> None:
+        self.families: dict[str, _Family] = {}
+
+    def samples(self, name: str, metric_type: str, help_text: str, samples: Iterable[tuple[tuple, float]],
+                prefixed: bool = True, aggregation: str = 'sum') -> None:
+        name = f'{_prefix}_{name}' if prefixed else name
+        self.families[name] = _Family(metric_type=metric_type, help_text=help_text, samples=dict(samples),
+                                      aggregation=aggregation)
+
+    def histogram(self, name: str, help_text: str, histograms: dict[tuple, Histogram]) -> None:
+        self.families[f'{_prefix}_{name}'] = _Family(metric_type='histogram', help_text=help_text,
+                                                     samples=dict(histograms))
+
+    def dataclass_samples(self, name: str, help_subject: str, stats_by_labels: dict[tuple, dict]) -> None:
+        """
+        One metric per field of the stats, a counter unless listed in _gauge_fields.
+        """
+        if not stats_by_labels:
+            return
+        for field_name in next(iter(stats_by_labels.values())):
+            is_gauge = field_name in _gauge_fields
+            self.samples(f'{name}_{field_name}' if is_gauge else f'{name}_{field_name}_total',
+                         'gauge' if is_gauge else 'counter', f'{help_subject}: {field_name.replace("_", " ")}',
+                         ((labels, stats[field_name]) for labels, stats in stats_by_labels.items()),
+                         aggregation='max' if field_name in _max_gauge_fields else 'sum')
+
+
+def _merge(worker_families: list[tuple[dict[str, _Family], bool]]) -> dict[str, _Family]:
+    """
+    :param worker_families: metrics of each worker, and whether it is running.
+    :return: totals of all workers; gauges of the running ones.
+    """
+    merged: dict[str, _Family] = {}
+    for families, is_running in worker_families:
+        for name, family in families.items():
+            if family.metric_type == 'gauge' and not is_running:
+                continue
+            if name not in merged:
+                merged[name] = _Family(metric_type=family.metric_type, help_text=family.help_text,
+                                       aggregation=family.aggregation)
+            samples = merged[name].samples
+            for labels, value in family.samples.items():
+                if labels not in samples:
+                    samples[labels] = value.copy() if isinstance(value, Histogram) else value
+                elif isinstance(value, Histogram):
+                    samples[labels].add(value)
+                elif family.aggregation == 'max':
+                    samples[labels] = max(samples[labels], value)
+                else:
+                    samples[labels] += value
+    return merged
+
+
+def _add_cache_hit_ratio(families: dict[str, _Family]) -> None:
+    # Derived from the totals: a ratio cannot be summed across workers
+    hits = families.get(f'{_prefix}_cache_hits_total', _Family('counter', '')).samples
+    misses = families.get(f'{_prefix}_cache_misses_total', _Family('counter', '')).samples
+    families[f'{_prefix}_cache_hit_ratio'] = _Family(
+        metric_type='gauge', help_text='Share of the cache lookups served from the cache',
+        samples={labels: hits[labels] / (hits[labels] + misses.get(labels, 0))
+                 for labels in hits if hits[labels] + misses.get(labels, 0)})
+
+
+def _render(families: dict[str, _Family]) -> str:
+    lines = []
+    for name, family in families.items():
+        lines.append(f'# HELP {name} {family.help_text}')
+        lines.append(f'# TYPE {name} {family.metric_type}')
+        for labels, value in family.samples.items():
+            if family.metric_type != 'histogram':
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(value.bounds + (float('inf'),), value.counts):
+                cumulative += count
+                bucket_labels = labels + (('le', _format_value(bound)),)
+                lines.append(f'{name}_bucket{_format_labels(bucket_labels)} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(value.sum)}')
+            lines.append(f'{name}_count{_format_labels(labels)} {value.count}')
+    return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{label}="{_escape_label_value(value)}"' for label, value in labels) + '}'
+
+
+def _escape_label_value(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _get_rss_bytes() -> Optional[int]:
+    try:
+        # Linux only: size and resident pages of the process
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
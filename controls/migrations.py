@@ -0,0 +1,218 @@
+"""
+Versioned schema migrations.
+
+Migrations are the `<major>.<minor>.<patch>.sql` scripts in the sql directory. Each one runs in a single transaction
+and is recorded, with its checksum, in the schema_migration table. Usage (from the repository root):
+
+    python -m controls.migrations [--database FILE] [--explain]
+"""
+import argparse
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import config
+from controls import queries, sqlite_config
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'sql')
+
+_migration_file_pattern = re.compile(r'^(\d+)\.(\d+)\.(\d+)\.sql$')
+_query_param_pattern = re.compile(r'(?<!:):(\w+)')
+
+_sql_create_migration_table = '''
+CREATE TABLE IF NOT EXISTS schema_migration (
+    version TEXT PRIMARY KEY,
+    checksum TEXT NOT NULL,
+    applied_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+'''
+
+
+class MigrationError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: str
+    script: str
+
+    @property
+    def version_key(self) -> tuple[int, ...]:
+        return tuple(int(part) for part in self.version.split('.'))
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.script.encode('utf-8')).hexdigest()
+
+    @property
+    def statements(self) -> list[str]:
+        return split_statements(self.script)
+
+
+def discover_migrations(directory: str = MIGRATIONS_DIRECTORY) -> list[Migration]:
+    migrations = []
+    for filename in os.listdir(directory):
+        match = _migration_file_pattern.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename), 'r') as sql_file:
+            migrations.append(Migration(version='.'.join(match.groups()), script=sql_file.read()))
+    return sorted(migrations, key=lambda migration: migration.version_key)
+
+
+def split_statements(script: str) -> list[str]:
+    """
+    Splits a script into complete SQL statements. Unlike splitting on blank lines, this keeps CREATE TRIGGER bodies
+    and statements with blank lines in them intact.
+    """
+    statements = []
+    current = ''
+    for line in script.splitlines(keepends=True):
+        current += line
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ''
+    if current.strip() and not _is_only_comments(current):
+        raise MigrationError(f'Incomplete SQL statement at the end of the script: {current}')
+    return statements
+
+
+def get_applied_migrations(connection: sqlite3.Connection) -> dict[str, str]:
+    """
+    :return: checksum by applied version.
+    """
+    rows = connection.execute('SELECT version, checksum FROM schema_migration').fetchall()
+    return {version: checksum for version, checksum in rows}
+
+
+def migrate(connection: sqlite3.Connection, migrations: Optional[list[Migration]] = None) -> list[str]:
+    """
+    Applies all pending migrations, each one in its own transaction.
+    :return: versions applied.
+    """
+    migrations = discover_migrations() if migrations is None else migrations
+    isolation_level = connection.isolation_level
+    connection.isolation_level = None  # transactions are controlled explicitly below
+    try:
+        connection.execute(_sql_create_migration_table)
+        _adopt_unversioned_schema(connection, migrations)
+        _verify_checksums(connection, migrations)
+
+        applied_versions = []
+        for migration in migrations:
+            if _apply(connection, migration):
+                applied_versions.append(migration.version)
+        if applied_versions:
+            connection.execute('PRAGMA optimize')
+        return applied_versions
+    finally:
+        connection.isolation_level = isolation_level
+
+
+def explain_queries(connection: sqlite3.Connection) -> dict[str, list[str]]:
+    """
+    :return: EXPLAIN QUERY PLAN lines of every query in controls.queries, by query name.
+    """
+    plans = {}
+    for query_name, query in vars(queries).items():
+        if not query_name.startswith('sql_') or not isinstance(query, str):
+            continue
+        params = {param: None for param in _query_param_pattern.findall(query)}
+        plans[query_name] = explain_query(connection, query, params)
+    return plans
+
+
+def explain_query(connection: sqlite3.Connection, query: str, params: Any) -> list[str]:
+    """
+    :return: EXPLAIN QUERY PLAN lines of the query.
+    """
+    rows = connection.execute(f'EXPLAIN QUERY PLAN {query}', params).fetchall()
+    # Columns are (id, parent, notused, detail); indent by depth like the sqlite3 shell does
+    depth_by_id = {0: -1}
+    lines = []
+    for node_id, parent_id, _, detail in rows:
+        depth = depth_by_id.get(parent_id, -1) + 1
+        depth_by_id[node_id] = depth
+        lines.append(f'{"  " * depth}{detail}')
+    return lines
+
+
+def _adopt_unversioned_schema(connection: sqlite3.Connection, migrations: list[Migration]) -> None:
+    """
+    Databases created before migrations were versioned already have the 1.0.0 schema: record it as applied.
+    """
+    if get_applied_migrations(connection) or not migrations:
+        return
+    has_schema = connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'customer'").fetchone() is not None
+    if has_schema and migrations[0].version == '1.0.0':
+        logger.info('Recording existing schema as version 1.0.0')
+        connection.execute('INSERT INTO schema_migration (version, checksum) VALUES (?, ?)',
+                           (migrations[0].version, migrations[0].checksum))
+
+
+def _is_only_comments(sql: str) -> bool:
+    return all(not line.strip() or line.strip().startswith('--') for line in sql.splitlines())
+
+
+def _verify_checksums(connection: sqlite3.Connection, migrations: list[Migration]) -> None:
+    applied = get_applied_migrations(connection)
+    for migration in migrations:
+        if migration.version in applied and applied[migration.version] != migration.checksum:
+            raise MigrationError(f'Migration {migration.version} was modified after being applied')
+
+
+def _apply(connection: sqlite3.Connection, migration: Migration) -> bool:
+    # IMMEDIATE takes the write lock upfront, so concurrent runners apply each migration only once
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        if migration.version in get_applied_migrations(connection):
+            connection.execute('COMMIT')
+            return False
+        logger.info(f'Applying migration {migration.version}...')
+        for statement in migration.statements:
+            logger.debug(f'Running SQL statement: {statement}')
+            connection.execute(statement)
+        connection.execute('INSERT INTO schema_migration (version, checksum) VALUES (?, ?)',
+                           (migration.version, migration.checksum))
+        connection.execute('COMMIT')
+        logger.info(f'Applied migration {migration.version}')
+        return True
+    except sqlite3.Error as e:
+        connection.execute('ROLLBACK')
+        raise MigrationError(f'Migration {migration.version} failed and was rolled back: {e}') from e
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Applies pending database migrations.')
+    parser.add_argument('--database', default=config.database_file,
+                        help=f'database file (default: {config.database_file})')
+    parser.add_argument('--explain', action='store_true',
+                        help='print the query plan of every query in controls.queries after migrating')
+    args = parser.parse_args()
+    logging.basicConfig(format='%(levelname)-8s %(message)s', level=logging.INFO)
+
+    connection = sqlite_config.connect(args.database, config.database_profile)
+    try:
+        applied_versions = migrate(connection)
+        print(f'Applied migrations: {", ".join(applied_versions)}' if applied_versions else 'Database is up to date')
+
+        if args.explain:
+            for query_name, plan in explain_queries(connection).items():
+                print('--------------------------------------')
+                print(query_name)
+                for line in plan:
+                    print(f'  {line}')
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
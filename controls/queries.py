@@ -2,23 +2,23 @@
 #              CUSTOMER                #
 ########################################
 
+# customer_list_summary is maintained by triggers, see sql/1.4.0.sql
 sql_get_all_customers = '''
 SELECT
-    d.dog_id,
-    d.name dog_name,
-    d.birth_date,
-    d.breed,
-    d.is_male,
-    c.balance_in_eur,
-    c.address,
-    group_concat(p.name, ', ') owners,
-    group_concat(DISTINCT p.phone1) phones1,
-    group_concat(DISTINCT p.phone2) phones2,
-    group_concat(DISTINCT p.email_address) email_addresses
-FROM dog d
-INNER JOIN customer c USING(customer_id)
-iNNER JOIN person p USING(customer_id)
-GROUP BY d.dog_id, c.customer_id 
+    s.dog_id,
+    s.dog_id AS id,
+    s.dog_name,
+    s.birth_date,
+    s.breed,
+    s.is_male,
+    s.sex,
+    s.balance_in_eur,
+    s.address,
+    s.owners,
+    s.phones1,
+    s.phones2,
+    s.email_addresses
+FROM customer_list_summary s
 '''
 
 sql_customer_by_dog_id = '''
@@ -28,6 +28,14 @@ SELECT
     c.balance_in_eur,
     c.notes AS customer_notes,
     c.created_timestamp AS customer_created_timestamp,
+    c.row_version
+FROM dog d
+INNER JOIN customer c USING(customer_id)
+WHERE d.dog_id = :dog_id
+'''
+
+sql_dogs_by_customer_id = '''
+SELECT
     d.dog_id,
     d.name dog_name,
     d.birth_date,
@@ -35,16 +43,24 @@ SELECT
     d.is_male,
     d.notes AS dog_notes,
     d.created_timestamp AS dog_created_timestamp,
+    d.row_version
+FROM dog d
+WHERE d.customer_id = :customer_id
+ORDER BY d.dog_id
+'''
+
+sql_persons_by_customer_id = '''
+SELECT
     p.person_id,
     p.name person_name,
     p.phone1,
     p.phone2,
     p.email_address,
-    p.created_timestamp AS person_created_timestamp
-FROM customer c
-INNER JOIN dog d USING(customer_id)
-iNNER JOIN person p USING(customer_id)
-WHERE c.customer_id = (SELECT customer_id FROM dog WHERE dog_id = :dog_id)
+    p.created_timestamp AS person_created_timestamp,
+    p.row_version
+FROM person p
+WHERE p.customer_id = :customer_id
+ORDER BY p.person_id
 '''
 
 sql_insert_customer = '''
@@ -57,9 +73,16 @@ UPDATE customer SET
     address=:address, 
     balance_in_eur=:balance_in_eur,
     notes=:customer_notes
-WHERE customer_id=:customer_id
+WHERE customer_id=:customer_id AND row_version=:row_version
 '''
 
+# Column written by each customer form field, for column-minimal updates (see make_partial_update)
+customer_columns_by_field = {
+    'address': 'address',
+    'balance_in_eur': 'balance_in_eur',
+    'customer_notes': 'notes',
+}
+
 sql_insert_dog = '''
 INSERT INTO dog(customer_id, name, birth_date, breed, is_male, notes)
 VALUES(:customer_id, :dog_name, :birth_date, :breed, :is_male, :dog_notes)
@@ -72,9 +95,17 @@ UPDATE dog SET
     breed=:breed,
     is_male=:is_male,
     notes=:dog_notes
-WHERE dog_id=:dog_id
+WHERE dog_id=:dog_id AND row_version=:row_version
 '''
 
+dog_columns_by_field = {
+    'dog_name': 'name',
+    'birth_date': 'birth_date',
+    'breed': 'breed',
+    'is_male': 'is_male',
+    'dog_notes': 'notes',
+}
+
 sql_insert_person = '''
 INSERT INTO person(customer_id, name, phone1, phone2, email_address)
 VALUES(:customer_id, :person_name, :phone1, :phone2, :email_address)
@@ -86,7 +117,55 @@ UPDATE person SET
     phone1=:phone1,
     phone2=:phone2,
     email_address=:email_address
-WHERE person_id=:person_id
+WHERE person_id=:person_id AND row_version=:row_version
+'''
+
+person_columns_by_field = {
+    'person_name': 'name',
+    'phone1': 'phone1',
+    'phone2': 'phone2',
+    'email_address': 'email_address',
+}
+
+
+def make_partial_update(table: str, key_column: str, column_by_field: dict[str, str]) -> str:
+    """
+    :return: UPDATE of only the given columns, with one named parameter per field, the key column and the row_version
+      the row is expected to have as parameters.
+    """
+    assignments = ',\n    '.join(f'{column}=:{field}' for field, column in column_by_field.items())
+    return f'''
+UPDATE {table} SET
+    {assignments}
+WHERE {key_column}=:{key_column} AND row_version=:row_version
+'''
+
+
+def make_row_versions_query(table: str, key_column: str) -> str:
+    """
+    :return: SELECT of the key and row_version of the rows whose key is in :ids, a JSON array.
+    """
+    return f'''
+SELECT {key_column} AS id, row_version
+FROM {table}
+WHERE {key_column} IN (SELECT value FROM json_each(:ids))
+'''
+
+
+# :query is an FTS5 query, see data_provider.make_search_query. Customers without dogs have no profile page.
+sql_search_customers = '''
+SELECT
+    s.rowid AS customer_id,
+    (SELECT MIN(d.dog_id) FROM dog d WHERE d.customer_id = s.rowid) AS dog_id,
+    s.dog_names,
+    s.person_names,
+    s.address
+FROM customer_search s
+WHERE customer_search MATCH :query
+    AND EXISTS (SELECT 1 FROM dog d WHERE d.customer_id = s.rowid)
+-- Weights of address, customer_notes, dog_names, dog_breeds, dog_notes, person_names, phones, email_addresses
+ORDER BY bm25(customer_search, 3.0, 1.0, 10.0, 2.0, 1.0, 10.0, 5.0, 5.0)
+LIMIT :limit
 '''
 
 ########################################
@@ -96,12 +175,13 @@ WHERE person_id=:person_id
 sql_get_all_trainings = '''
 SELECT
     t.training_id,
+    t.training_id AS id,
     t.name,
     t.price,
     t.classes_online,
     t.classes_in_person,
     t.created_timestamp
-FROM training t;
+FROM training t
 '''
 
 sql_training_by_id = '''
@@ -111,7 +191,8 @@ SELECT
     t.price,
     t.classes_online,
     t.classes_in_person,
-    t.created_timestamp
+    t.created_timestamp,
+    t.row_version
 FROM training t
 WHERE t.training_id=:training_id
 '''
@@ -127,7 +208,7 @@ UPDATE training SET
     price=:price,
     classes_online=:classes_online,
     classes_in_person=:classes_in_person
-WHERE training_id=:training_id
+WHERE training_id=:training_id AND row_version=:row_version
 '''
 
 ########################################
@@ -137,6 +218,7 @@ WHERE training_id=:training_id
 sql_subscriptions_by_dog_id = '''
 SELECT
     s.subscription_id,
+    s.subscription_id AS id,
     s.dog_id,
     s.actual_price,
     s.notes,
@@ -145,22 +227,33 @@ SELECT
     t.price AS training_price,
     t.classes_online AS total_classes_online,
     t.classes_in_person AS total_classes_in_person,
-    taken.taken_classes_online,
-    taken.taken_classes_in_person
+    s.taken_classes_online,
+    s.taken_classes_in_person
 FROM subscription s
 INNER JOIN training t USING (training_id)
-INNER JOIN (
-    SELECT
-        c.subscription_id,
-        COUNT(*) FILTER (WHERE c.is_online = FALSE) AS taken_classes_online,
-        COUNT(*) FILTER (WHERE c.is_online = TRUE) AS taken_classes_in_person
-    FROM class c
-    WHERE c.subscription_id IS NOT NULL
-    GROUP BY c.subscription_id
-) taken USING (subscription_id)
 WHERE s.dog_id=:dog_id
 '''
 
+sql_subscriptions_by_customer_id = '''
+SELECT
+    s.subscription_id,
+    s.subscription_id AS id,
+    s.dog_id,
+    s.actual_price,
+    s.notes,
+    s.created_timestamp,
+    t.name AS training_name,
+    t.price AS training_price,
+    t.classes_online AS total_classes_online,
+    t.classes_in_person AS total_classes_in_person,
+    s.taken_classes_online,
+    s.taken_classes_in_person
+FROM dog d
+INNER JOIN subscription s USING (dog_id)
+INNER JOIN training t USING (training_id)
+WHERE d.customer_id=:customer_id
+'''
+
 sql_subscription_by_id = '''
 SELECT
     s.subscription_id,
@@ -171,7 +264,8 @@ SELECT
     s.created_timestamp,
     t.training_id,
     t.classes_online AS total_classes_online,
-    t.classes_in_person AS total_classes_in_person
+    t.classes_in_person AS total_classes_in_person,
+    s.row_version
 FROM subscription s
 INNER JOIN training t USING (training_id)
 INNER JOIN dog d USING (dog_id)
@@ -189,7 +283,37 @@ UPDATE subscription SET
     dog_id=:dog_id,
     actual_price=:actual_price,
     notes=:notes
-WHERE subscription_id = :subscription_id
+WHERE subscription_id = :subscription_id AND row_version = :row_version
+'''
+
+# Subscriptions whose trigger-maintained class counters differ from the class table
+sql_verify_taken_classes = '''
+SELECT
+    s.subscription_id,
+    s.taken_classes_online,
+    s.taken_classes_in_person,
+    COALESCE(taken.taken_classes_online, 0) AS expected_taken_classes_online,
+    COALESCE(taken.taken_classes_in_person, 0) AS expected_taken_classes_in_person
+FROM subscription s
+LEFT JOIN (
+    SELECT
+        c.subscription_id,
+        COUNT(*) FILTER (WHERE c.is_online) AS taken_classes_online,
+        COUNT(*) FILTER (WHERE NOT c.is_online) AS taken_classes_in_person
+    FROM class c
+    WHERE c.subscription_id IS NOT NULL
+    GROUP BY c.subscription_id
+) taken USING (subscription_id)
+WHERE s.taken_classes_online != COALESCE(taken.taken_classes_online, 0)
+    OR s.taken_classes_in_person != COALESCE(taken.taken_classes_in_person, 0)
+'''
+
+sql_backfill_taken_classes = '''
+UPDATE subscription SET
+    taken_classes_online = (
+        SELECT COUNT(*) FROM class c WHERE c.subscription_id = subscription.subscription_id AND c.is_online),
+    taken_classes_in_person = (
+        SELECT COUNT(*) FROM class c WHERE c.subscription_id = subscription.subscription_id AND NOT c.is_online)
 '''
 
 ########################################
@@ -202,7 +326,8 @@ SELECT
     c.is_online,
     c.class_date,
     c.notes,
-    c.created_timestamp
+    c.created_timestamp,
+    c.row_version
 FROM class c
 WHERE c.subscription_id=:subscription_id
 '''
@@ -214,11 +339,27 @@ SELECT
     c.single_class_price,
     c.class_date,
     c.notes,
-    c.created_timestamp
+    c.created_timestamp,
+    c.row_version
 FROM class c
 WHERE c.dog_id=:dog_id
 '''
 
+sql_single_classes_by_customer_id = '''
+SELECT
+    c.class_id,
+    c.dog_id,
+    c.is_online,
+    c.single_class_price,
+    c.class_date,
+    c.notes,
+    c.created_timestamp,
+    c.row_version
+FROM dog d
+INNER JOIN class c USING (dog_id)
+WHERE d.customer_id=:customer_id
+'''
+
 sql_insert_class = '''
 INSERT INTO class (subscription_id, dog_id, single_class_price, is_online, class_date, notes)
 VALUES(:subscription_id, :dog_id, :single_class_price, :is_online, :class_date, :notes)
@@ -232,5 +373,5 @@ UPDATE class SET
     is_online=:is_online,
     class_date=:class_date,
     notes=:notes
-WHERE class_id = :class_id
+WHERE class_id = :class_id AND row_version = :row_version
 '''
@@ -0,0 +1,201 @@
+"""
+Timings of the DataProvider methods, aggregated by method: wall time (histogram), time spent in SQLite and in pandas,
+statements executed and rows returned. Calls slower than config.slow_query_threshold_seconds are written to the
+slow-query log with the query plans of their statements.
+"""
+import functools
+import logging
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional, TypeVar
+
+import config
+from controls import migrations, tracing
+
+logger = logging.getLogger(__name__)
+
+slow_query_logger = logging.getLogger(f'{__name__}.slow')
+# Whatever the level of the app log
+slow_query_logger.setLevel(logging.WARNING)
+if config.slow_query_log_file:
+    # Several worker processes may append to the same file: it is not rotated
+    _slow_query_handler = logging.FileHandler(config.slow_query_log_file, delay=True)
+    _slow_query_handler.setFormatter(logging.Formatter('%(asctime)s %(process)d %(message)s'))
+    slow_query_logger.addHandler(_slow_query_handler)
+
+_F = TypeVar('_F', bound=Callable)
+
+_comment_pattern = re.compile(r'--[^\n]*')
+_whitespace_pattern = re.compile(r'\s+')
+
+# Upper bounds of the histogram buckets, the last bucket has none
+DEFAULT_BUCKETS_SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+@dataclass
+class Histogram:
+    bounds: tuple[float, ...] = DEFAULT_BUCKETS_SECONDS
+    counts: list[int] = field(default_factory=list)  # by bucket, one more than bounds
+    count: int = 0
+    sum: float = 0
+
+    def __post_init__(self) -> None:
+        if not self.counts:
+            self.counts = [0] * (len(self.bounds) + 1)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """
+        :return: upper bound of the bucket holding the q-quantile (inf for the last bucket), 0 if empty.
+        """
+        if not self.count:
+            return 0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float('inf')
+
+    def copy(self) -> 'Histogram':
+        return Histogram(bounds=self.bounds, counts=list(self.counts), count=self.count, sum=self.sum)
+
+    def add(self, other: 'Histogram') -> None:
+        """
+        Adds the observations of another histogram with the same buckets, e.g. of another process.
+        """
+        if other.bounds != self.bounds:
+            raise ValueError(f'Histogram buckets differ: {self.bounds} and {other.bounds}')
+        self.counts = [count + other_count for count, other_count in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+
+
+@dataclass
+class QueryStats:
+    calls: int = 0
+    statements: int = 0
+    rows: int = 0
+    sql_seconds: float = 0
+    pandas_seconds: float = 0
+    slow_calls: int = 0
+    wall_seconds: Histogram = field(default_factory=Histogram)
+
+
+@dataclass
+class _Statement:
+    connection: sqlite3.Connection
+    query: str
+    params: Any
+    seconds: float
+    rows: int
+
+
+@dataclass
+class _Call:
+    statements: list[_Statement] = field(default_factory=list)
+    pandas_seconds: float = 0
+
+
+_stats_by_method: dict[str, QueryStats] = {}
+_stats_lock = threading.Lock()
+_current_call: ContextVar[Optional[_Call]] = ContextVar('current_query_call', default=None)
+
+
+def get_query_stats() -> dict[str, QueryStats]:
+    with _stats_lock:
+        return {method: QueryStats(calls=stats.calls, statements=stats.statements, rows=stats.rows,
+                                   sql_seconds=stats.sql_seconds, pandas_seconds=stats.pandas_seconds,
+                                   slow_calls=stats.slow_calls, wall_seconds=stats.wall_seconds.copy())
+                for method, stats in _stats_by_method.items()}
+
+
+def reset_query_stats() -> None:
+    with _stats_lock:
+        _stats_by_method.clear()
+
+
+def instrumented(method: _F) -> _F:
+    """
+    Decorator of the DataProvider methods to time. Methods called by another instrumented method are counted in it.
+    """
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if _current_call.get() is not None:
+            return method(*args, **kwargs)
+        call = _Call()
+        token = _current_call.set(call)
+        start = time.perf_counter()
+        try:
+            with tracing.span(f'DataProvider.{method.__name__}', category='sql'):
+                return method(*args, **kwargs)
+        finally:
+            wall_seconds = time.perf_counter() - start
+            _current_call.reset(token)
+            _record_call(method.__name__, call, wall_seconds)
+
+    return wrapper
+
+
+def record_statement(connection: sqlite3.Connection, query: str, params: Any, seconds: float, rows: int) -> None:
+    """
+    :param seconds: time spent executing the statement and fetching its rows.
+    """
+    call = _current_call.get()
+    if call is not None:
+        call.statements.append(_Statement(connection=connection, query=query, params=params, seconds=seconds,
+                                          rows=rows))
+
+
+def record_pandas(seconds: float) -> None:
+    """
+    :param seconds: time spent building data frames out of fetched rows.
+    """
+    call = _current_call.get()
+    if call is not None:
+        call.pandas_seconds += seconds
+
+
+def _record_call(method_name: str, call: _Call, wall_seconds: float) -> None:
+    is_slow = wall_seconds >= config.slow_query_threshold_seconds
+    with _stats_lock:
+        if method_name not in _stats_by_method:
+            _stats_by_method[method_name] = QueryStats()
+        stats = _stats_by_method[method_name]
+        stats.calls += 1
+        stats.statements += len(call.statements)
+        stats.rows += sum(statement.rows for statement in call.statements)
+        stats.sql_seconds += sum(statement.seconds for statement in call.statements)
+        stats.pandas_seconds += call.pandas_seconds
+        stats.wall_seconds.observe(wall_seconds)
+        if is_slow:
+            stats.slow_calls += 1
+    if is_slow:
+        _log_slow_call(method_name, call, wall_seconds)
+
+
+def _log_slow_call(method_name: str, call: _Call, wall_seconds: float) -> None:
+    sql_seconds = sum(statement.seconds for statement in call.statements)
+    lines = [f'Slow {method_name}: {wall_seconds * 1000:.1f} ms (SQL {sql_seconds * 1000:.1f} ms, '
+             f'pandas {call.pandas_seconds * 1000:.1f} ms), {len(call.statements)} statement(s)']
+    for statement in call.statements:
+        # Parameter values are left out: they hold customer data
+        # On one line: comments would hide the rest of the query
+        query = _whitespace_pattern.sub(' ', _comment_pattern.sub('', statement.query)).strip()
+        lines.append(f'  {statement.seconds * 1000:.1f} ms, {statement.rows} row(s): {query}')
+        try:
+            lines.extend(f'    {line}' for line in migrations.explain_query(statement.connection, statement.query,
+                                                                           statement.params))
+        except sqlite3.Error as e:
+            lines.append(f'    (no query plan: {e})')
+    slow_query_logger.warning('\n'.join(lines))
@@ -0,0 +1,115 @@
+"""
+Retries of database operations that failed because another connection (or process) holds a lock, with jittered
+exponential backoff, until a per-operation deadline.
+"""
+import logging
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Callable, Optional, TypeVar
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_T = TypeVar('_T')
+
+# Primary result codes of lock contention, see https://www.sqlite.org/rescode.html
+_SQLITE_BUSY = 5
+_SQLITE_LOCKED = 6
+
+
+class DatabaseBusyError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    initial_backoff_seconds: float
+    max_backoff_seconds: float
+    deadline_seconds: float  # from the first attempt; no retry starts after it
+
+    def get_backoff_seconds(self, retry_count: int) -> float:
+        # "Full jitter": spreads out the retries of operations that failed at the same time
+        return random.uniform(0, min(self.max_backoff_seconds, self.initial_backoff_seconds * 2 ** retry_count))
+
+
+default_policy = RetryPolicy(
+    initial_backoff_seconds=config.database_retry_initial_backoff_seconds,
+    max_backoff_seconds=config.database_retry_max_backoff_seconds,
+    deadline_seconds=config.database_retry_deadline_seconds,
+)
+
+
+@dataclass
+class RetryStats:
+    operations: int = 0
+    retried_operations: int = 0  # operations that needed at least one retry
+    retries: int = 0
+    timeouts: int = 0  # operations that still failed at the deadline
+
+
+_stats_by_operation: dict[str, RetryStats] = {}
+_stats_lock = threading.Lock()
+
+
+def get_retry_stats() -> dict[str, RetryStats]:
+    with _stats_lock:
+        return {operation: replace(stats) for operation, stats in _stats_by_operation.items()}
+
+
+def is_retryable(error: BaseException) -> bool:
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    error_code = getattr(error, 'sqlite_errorcode', None)
+    if error_code is not None:
+        # Extended codes (e.g. SQLITE_BUSY_SNAPSHOT) keep the primary code in their lowest byte
+        return error_code & 0xff in (_SQLITE_BUSY, _SQLITE_LOCKED)
+    message = str(error)
+    return 'database is locked' in message or 'database table is locked' in message or 'busy' in message
+
+
+def run(operation: Callable[[], _T], name: str, policy: Optional[RetryPolicy] = None,
+        on_retry: Optional[Callable[[], None]] = None) -> _T:
+    """
+    Runs the operation, again while it fails with a retryable error.
+    :param name: for logging and stats.
+    :param on_retry: called before each retry, e.g. to roll back what the failed attempt left behind.
+    :raise DatabaseBusyError: if it still fails at the deadline of the policy.
+    """
+    policy = policy or default_policy
+    deadline = time.monotonic() + policy.deadline_seconds
+    retry_count = 0
+    try:
+        while True:
+            try:
+                return operation()
+            except sqlite3.OperationalError as e:
+                if not is_retryable(e):
+                    raise
+                backoff_seconds = policy.get_backoff_seconds(retry_count)
+                if time.monotonic() + backoff_seconds > deadline:
+                    logger.error(f'{name} still failing after {retry_count} retries: {e}')
+                    with _stats_lock:
+                        _get_stats(name).timeouts += 1
+                    raise DatabaseBusyError(f'The database is busy, please try again ({e})') from e
+                logger.warning(f'{name} failed ({e}), retrying in {backoff_seconds * 1000:.0f} ms')
+                if on_retry is not None:
+                    on_retry()
+                time.sleep(backoff_seconds)
+                retry_count += 1
+    finally:
+        with _stats_lock:
+            stats = _get_stats(name)
+            stats.operations += 1
+            stats.retries += retry_count
+            if retry_count:
+                stats.retried_operations += 1
+
+
+def _get_stats(name: str) -> RetryStats:
+    if name not in _stats_by_operation:
+        _stats_by_operation[name] = RetryStats()
+    return _stats_by_operation[name]
@@ -0,0 +1,342 @@
+"""
+Cache shared by all the worker processes of the app, stored in a local SQLite file (see config.shared_cache_file).
+
+When enabled, the caches of controls.cache keep their entries here instead of in process memory, and the data versions
+of the tables live here as well: a commit in one worker invalidates the entries of every worker.
+"""
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Iterable, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Invalidation of a whole namespace, see SharedCacheStore.clear
+_all_keys = '*'
+
+_sql_create_schema = [
+    '''
+CREATE TABLE IF NOT EXISTS cache_entry (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID
+''',
+    'CREATE INDEX IF NOT EXISTS idx_cache_entry_stored_at ON cache_entry(stored_at)',
+    # Other keys an entry can be found by, deleted along with it
+    '''
+CREATE TABLE IF NOT EXISTS cache_alias (
+    namespace TEXT NOT NULL,
+    alias TEXT NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY (namespace, alias)
+) WITHOUT ROWID
+''',
+    'CREATE INDEX IF NOT EXISTS idx_cache_alias_key ON cache_alias(namespace, key)',
+    # Incremented by every invalidation of the namespace
+    '''
+CREATE TABLE IF NOT EXISTS cache_generation (
+    namespace TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL
+) WITHOUT ROWID
+''',
+    # Generation at which each key was last invalidated, so that values loaded before are not stored. Only needed while
+    # loads may be in progress, so they are pruned after a while
+    '''
+CREATE TABLE IF NOT EXISTS cache_invalidation (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    invalidated_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID
+''',
+    # Same for aliases: an alias may be invalidated before the entry it will point to is stored
+    '''
+CREATE TABLE IF NOT EXISTS cache_alias_invalidation (
+    namespace TEXT NOT NULL,
+    alias TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    invalidated_at REAL NOT NULL,
+    PRIMARY KEY (namespace, alias)
+) WITHOUT ROWID
+''',
+    '''
+CREATE TABLE IF NOT EXISTS data_version (
+    table_name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+) WITHOUT ROWID
+''',
+    # Last metrics published by each worker process, kept after it stops so that the totals of all workers never drop
+    '''
+CREATE TABLE IF NOT EXISTS worker_metrics (
+    worker_id TEXT PRIMARY KEY,
+    metrics BLOB NOT NULL,
+    published_at REAL NOT NULL,
+    is_stopped INTEGER NOT NULL
+) WITHOUT ROWID
+''',
+]
+
+_invalidation_retention_seconds = 10 * 60
+
+
+class SharedCacheStore:
+    """
+    Entries are pickled values grouped in namespaces (one per cache). Every operation is atomic: writes run in a single
+    IMMEDIATE transaction, so workers never see half-written entries. Total size is bounded by max_bytes, evicting the
+    expired entries and then the oldest ones.
+    """
+
+    def __init__(self, file: str, max_bytes: int) -> None:
+        self.__file = file
+        self.__max_bytes = max_bytes
+        self.__connection: Optional[sqlite3.Connection] = None
+        self.__connection_pid: Optional[int] = None
+        self.__lock = threading.Lock()
+
+    def __connect(self) -> sqlite3.Connection:
+        # Connections must not be shared with forked worker processes
+        if self.__connection is None or self.__connection_pid != os.getpid():
+            logger.info(f'Opening shared cache {self.__file}...')
+            connection = sqlite3.connect(self.__file, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode = WAL').fetchall()
+            # Entries can always be loaded again: losing the last ones on a power loss is fine
+            connection.execute('PRAGMA synchronous = OFF')
+            connection.execute('PRAGMA busy_timeout = 5000')
+            connection.execute('BEGIN IMMEDIATE')
+            for statement in _sql_create_schema:
+                connection.execute(statement)
+            connection.execute('COMMIT')
+            self.__connection = connection
+            self.__connection_pid = os.getpid()
+        return self.__connection
+
+    def __write(self, statements: Iterable[tuple[str, tuple]]) -> None:
+        connection = self.__connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            for query, params in statements:
+                connection.execute(query, params)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """
+        :return: the value, None if there is no fresh entry.
+        """
+        with self.__lock:
+            row = self.__connect().execute(
+                'SELECT value FROM cache_entry WHERE namespace = ? AND key = ? AND expires_at > ?',
+                (namespace, key, time.time())).fetchone()
+        return pickle.loads(row[0]) if row is not None else None
+
+    def get_by_alias(self, namespace: str, alias: str) -> Optional[Any]:
+        with self.__lock:
+            row = self.__connect().execute('''
+SELECT e.value
+FROM cache_alias a
+INNER JOIN cache_entry e USING (namespace, key)
+WHERE a.namespace = ? AND a.alias = ? AND e.expires_at > ?
+''', (namespace, alias, time.time())).fetchone()
+        return pickle.loads(row[0]) if row is not None else None
+
+    def generation(self, namespace: str) -> int:
+        with self.__lock:
+            row = self.__connect().execute(
+                'SELECT generation FROM cache_generation WHERE namespace = ?', (namespace,)).fetchone()
+        return row[0] if row is not None else 0
+
+    def put(self, namespace: str, key: str, value: Any, ttl_seconds: float, generation: Optional[int] = None,
+            aliases: Iterable[str] = ()) -> bool:
+        """
+        :param generation: the generation read before loading the value. If the key, one of the aliases (or the
+          namespace) was invalidated since, the value may be stale and is not stored. None to store it anyway.
+        :return: whether the value was stored.
+        """
+        aliases = list(aliases)
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.__max_bytes:
+            logger.warning(f'Shared cache skipped {namespace} {key}: {len(blob)} bytes exceed the cache size')
+            return False
+        now = time.time()
+        with self.__lock:
+            connection = self.__connect()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                if generation is not None and connection.execute('''
+SELECT 1 FROM cache_invalidation WHERE namespace = ? AND key IN (?, ?) AND generation > ?
+UNION ALL
+SELECT 1 FROM cache_alias_invalidation
+WHERE namespace = ? AND alias IN (SELECT value FROM json_each(?)) AND generation > ?
+''', (namespace, key, _all_keys, generation, namespace, _to_json_array(aliases), generation)).fetchone() is not None:
+                    connection.execute('COMMIT')
+                    logger.debug(f'Shared cache skipped {namespace} {key}: invalidated while it was loaded')
+                    return False
+                self.__delete_entries(connection, namespace, [key])
+                connection.execute('INSERT INTO cache_entry VALUES (?, ?, ?, ?, ?, ?)',
+                                   (namespace, key, blob, len(blob), now, now + ttl_seconds))
+                connection.executemany('INSERT OR REPLACE INTO cache_alias VALUES (?, ?, ?)',
+                                       [(namespace, alias, key) for alias in aliases])
+                self.__evict(connection, now)
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        return True
+
+    def __evict(self, connection: sqlite3.Connection, now: float) -> None:
+        size_bytes = connection.execute('SELECT COALESCE(SUM(size_bytes), 0) FROM cache_entry').fetchone()[0]
+        if size_bytes <= self.__max_bytes:
+            return
+        connection.execute('DELETE FROM cache_alias WHERE (namespace, key) IN '
+                           '(SELECT namespace, key FROM cache_entry WHERE expires_at <= ?)', (now,))
+        connection.execute('DELETE FROM cache_entry WHERE expires_at <= ?', (now,))
+        # Oldest first, until within the bound
+        oldest = connection.execute('SELECT namespace, key, size_bytes FROM cache_entry ORDER BY stored_at').fetchall()
+        size_bytes = connection.execute('SELECT COALESCE(SUM(size_bytes), 0) FROM cache_entry').fetchone()[0]
+        evicted = []
+        for namespace, key, entry_size_bytes in oldest:
+            if size_bytes <= self.__max_bytes:
+                break
+            evicted.append((namespace, key))
+            size_bytes -= entry_size_bytes
+        connection.executemany('DELETE FROM cache_alias WHERE namespace = ? AND key = ?', evicted)
+        connection.executemany('DELETE FROM cache_entry WHERE namespace = ? AND key = ?', evicted)
+        logger.debug(f'Shared cache evicted {len(evicted)} entries')
+
+    @staticmethod
+    def __delete_entries(connection: sqlite3.Connection, namespace: str, keys: list[str]) -> int:
+        params = [(namespace, key) for key in keys]
+        connection.executemany('DELETE FROM cache_alias WHERE namespace = ? AND key = ?', params)
+        return connection.executemany('DELETE FROM cache_entry WHERE namespace = ? AND key = ?', params).rowcount
+
+    def invalidate(self, namespace: str, keys: Iterable[str] = (), aliases: Iterable[str] = ()) -> int:
+        """
+        Deletes the entries of the keys, and of the keys the aliases point to, in every worker.
+        :return: number of entries deleted.
+        """
+        keys, aliases = list(keys), list(aliases)
+        now = time.time()
+        with self.__lock:
+            connection = self.__connect()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                keys += [row[0] for row in connection.execute(
+                    'SELECT key FROM cache_alias WHERE namespace = ? AND alias IN (SELECT value FROM json_each(?))',
+                    (namespace, _to_json_array(aliases)))]
+                generation = self.__bump_generation(connection, namespace)
+                connection.executemany('INSERT OR REPLACE INTO cache_invalidation VALUES (?, ?, ?, ?)',
+                                       [(namespace, key, generation, now) for key in keys])
+                connection.executemany('INSERT OR REPLACE INTO cache_alias_invalidation VALUES (?, ?, ?, ?)',
+                                       [(namespace, alias, generation, now) for alias in aliases])
+                for table in ('cache_invalidation', 'cache_alias_invalidation'):
+                    connection.execute(f'DELETE FROM {table} WHERE invalidated_at < ?',
+                                       (now - _invalidation_retention_seconds,))
+                deleted_count = self.__delete_entries(connection, namespace, keys)
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        return deleted_count
+
+    def clear(self, namespace: str) -> None:
+        self.invalidate(namespace, keys=[_all_keys])
+        with self.__lock:
+            self.__write([('DELETE FROM cache_alias WHERE namespace = ?', (namespace,)),
+                          ('DELETE FROM cache_entry WHERE namespace = ?', (namespace,))])
+
+    @staticmethod
+    def __bump_generation(connection: sqlite3.Connection, namespace: str) -> int:
+        return connection.execute('''
+INSERT INTO cache_generation VALUES (?, 1)
+ON CONFLICT (namespace) DO UPDATE SET generation = generation + 1
+RETURNING generation
+''', (namespace,)).fetchone()[0]
+
+    def get_data_versions(self, tables: Iterable[str]) -> tuple[int, ...]:
+        tables = list(tables)
+        with self.__lock:
+            version_by_table = dict(self.__connect().execute(
+                'SELECT table_name, version FROM data_version WHERE table_name IN (SELECT value FROM json_each(?))',
+                (_to_json_array(tables),)).fetchall())
+        return tuple(version_by_table.get(table, 0) for table in tables)
+
+    def bump_data_versions(self, tables: Iterable[str]) -> None:
+        with self.__lock:
+            self.__write([('''
+INSERT INTO data_version VALUES (?, 1)
+ON CONFLICT (table_name) DO UPDATE SET version = version + 1
+''', (table,)) for table in tables])
+
+    def put_worker_metrics(self, worker_id: str, metrics: Any, is_stopped: bool = False) -> None:
+        blob = pickle.dumps(metrics, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.__lock:
+            self.__write([('INSERT OR REPLACE INTO worker_metrics VALUES (?, ?, ?, ?)',
+                           (worker_id, blob, time.time(), is_stopped))])
+
+    def get_worker_metrics(self) -> list[tuple[Any, float, bool]]:
+        """
+        :return: metrics, time they were published and whether the worker stopped since, for every worker.
+        """
+        with self.__lock:
+            rows = self.__connect().execute('SELECT metrics, published_at, is_stopped FROM worker_metrics').fetchall()
+        return [(pickle.loads(blob), published_at, bool(is_stopped)) for blob, published_at, is_stopped in rows]
+
+    def namespace_size(self, namespace: str) -> tuple[int, int]:
+        """
+        :return: number of entries and their size in bytes.
+        """
+        with self.__lock:
+            return self.__connect().execute(
+                'SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM cache_entry WHERE namespace = ?',
+                (namespace,)).fetchone()
+
+
+def remove_store_file(file: str) -> None:
+    """
+    Deletes the file of a shared cache, with its WAL files. Only while no process uses it.
+    """
+    with _store_lock:
+        if _store is not None:
+            raise RuntimeError('The shared cache is in use')
+    for path in (file, f'{file}-wal', f'{file}-shm'):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _to_json_array(values: list) -> str:
+    # json_each keeps the number of bound parameters constant, however many values there are
+    return json.dumps(values)
+
+
+_store: Optional[SharedCacheStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> Optional[SharedCacheStore]:
+    """
+    :return: the shared cache of this app, None if it is disabled (config.shared_cache_file is empty).
+    """
+    global _store
+    if not config.shared_cache_file:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SharedCacheStore(config.shared_cache_file, config.shared_cache_max_bytes)
+    return _store
@@ -0,0 +1,96 @@
+import logging
+import sqlite3
+import threading
+from dataclasses import dataclass, replace
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+IN_MEMORY_DATABASE = ':memory:'
+_in_memory_uri = 'file:lekker_woof?mode=memory&cache=shared'
+
+
+@dataclass(frozen=True)
+class SqliteProfile:
+    """
+    PRAGMAs applied to every new connection. None means "keep SQLite's default".
+    """
+    journal_mode: Optional[str] = None
+    synchronous: Optional[str] = None
+    mmap_size: Optional[int] = None  # bytes
+    cache_size: Optional[int] = None  # pages if positive, KiB if negative
+    temp_store: Optional[str] = None
+    busy_timeout_ms: Optional[int] = None
+
+
+PROFILES = {
+    'default': SqliteProfile(),
+    'performance': SqliteProfile(
+        # Readers no longer block behind writers (and vice versa)
+        journal_mode='WAL',
+        # Safe with WAL: a power loss may only lose the last transactions, never corrupt the database
+        synchronous='NORMAL',
+        mmap_size=256 * 1024 * 1024,
+        cache_size=-64 * 1024,
+        temp_store='MEMORY',
+        busy_timeout_ms=5000,
+    ),
+}
+
+# Keeps the shared in-memory database alive while the pool recycles its connections
+_in_memory_anchor: Optional[sqlite3.Connection] = None
+_in_memory_anchor_lock = threading.Lock()
+
+
+def get_profile(profile_name: str) -> SqliteProfile:
+    if profile_name not in PROFILES:
+        raise ValueError(f'Unknown SQLite profile {profile_name}. Available: {", ".join(PROFILES)}')
+    return PROFILES[profile_name]
+
+
+def connect(database_file: str, profile_name: str, busy_timeout_ms: Optional[int] = None) -> sqlite3.Connection:
+    """
+    Opens a connection to the database and applies the given profile. Connections may be shared across threads (one
+    at a time), as required by the connection pool.
+    :param database_file: path of the database file, or IN_MEMORY_DATABASE for an in-memory database shared by all
+      connections of this process (for tests and benchmarks).
+    :param profile_name: one of PROFILES.
+    :param busy_timeout_ms: overrides the busy timeout of the profile if given.
+    """
+    profile = get_profile(profile_name)
+    if busy_timeout_ms is not None:
+        profile = replace(profile, busy_timeout_ms=busy_timeout_ms)
+    if database_file == IN_MEMORY_DATABASE:
+        connection = _connect_in_memory()
+    else:
+        connection = sqlite3.connect(database_file, check_same_thread=False)
+    apply_profile(connection, profile)
+    return connection
+
+
+def apply_profile(connection: sqlite3.Connection, profile: SqliteProfile) -> None:
+    pragmas = {
+        'journal_mode': profile.journal_mode,
+        'synchronous': profile.synchronous,
+        'mmap_size': profile.mmap_size,
+        'cache_size': profile.cache_size,
+        'temp_store': profile.temp_store,
+        'busy_timeout': profile.busy_timeout_ms,
+    }
+    for pragma, value in pragmas.items():
+        if value is None:
+            continue
+        # PRAGMAs do not accept bound parameters. Values come from PROFILES, never from user input.
+        connection.execute(f'PRAGMA {pragma} = {value}').fetchall()
+    logger.debug(f'Applied SQLite profile {profile}')
+
+
+def _connect_in_memory() -> sqlite3.Connection:
+    global _in_memory_anchor
+    with _in_memory_anchor_lock:
+        if _in_memory_anchor is None:
+            _in_memory_anchor = sqlite3.connect(_in_memory_uri, uri=True, check_same_thread=False)
+    connection = sqlite3.connect(_in_memory_uri, uri=True, check_same_thread=False)
+    # With a shared cache, readers would otherwise wait for the table locks held by a writing connection
+    connection.execute('PRAGMA read_uncommitted = true')
+    return connection
@@ -0,0 +1,221 @@
+"""
+Server-side paging, filtering and sorting for DataTables in custom mode (page_action, filter_action and sort_action
+set to 'custom'). The DataTable filter_query and sort_by are translated into parameterized SQL over a base query.
+
+Pages are fetched with keyset pagination: the sort key of the last row of each page is kept by the client (see
+update_page_keys), so the next page is an index range scan instead of an OFFSET that reads every previous row.
+Jumping to a page whose previous page was never loaded falls back to OFFSET. The row count of the filtered set is kept
+along with the keys, and only counted again when the filter, the sort or the data change.
+"""
+import json
+import logging
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+_filter_part_pattern = re.compile(r'^\{(?P<column>[^}]+)\}\s+(?P<operator>\S+)\s*(?P<value>.*)$')
+
+_comparison_operators = {
+    '=': '=', 'eq': '=',
+    '!=': '!=', 'ne': '!=',
+    '<': '<', 'lt': '<',
+    '<=': '<=', 'le': '<=',
+    '>': '>', 'gt': '>',
+    '>=': '>=', 'ge': '>=',
+}
+_case_prefixable_operators = set(_comparison_operators) | {'contains'}
+
+
+@dataclass
+class TableQuery:
+    page_current: int
+    page_size: int
+    sort_by: list[dict] = field(default_factory=list)  # DataTable sort_by: [{'column_id': ..., 'direction': ...}]
+    filter_query: str = ''
+    after_key: Optional[list] = None  # sort key of the last row of the previous page, if known
+    row_count: Optional[int] = None  # of the filtered rows, if counted before at row_count_data_versions
+    row_count_data_versions: Optional[list] = None
+
+    @property
+    def signature(self) -> str:
+        """
+        Page keys are only valid for the filter, sort and page size they were computed with.
+        """
+        return json.dumps([self.page_size, self.sort_by, self.filter_query])
+
+    @classmethod
+    def from_table_state(cls, page_current: int, page_size: int, sort_by: Optional[list[dict]],
+                         filter_query: Optional[str], page_keys: Optional[dict]):
+        table_query = cls(page_current=page_current or 0, page_size=page_size, sort_by=sort_by or [],
+                          filter_query=filter_query or '')
+        if page_keys and page_keys.get('signature') == table_query.signature:
+            table_query.after_key = page_keys['last_key_by_page'].get(str(table_query.page_current - 1))
+            table_query.row_count = page_keys.get('row_count')
+            table_query.row_count_data_versions = page_keys.get('row_count_data_versions')
+        return table_query
+
+
+@dataclass
+class TablePage:
+    records: list[dict]
+    row_count: int
+    page_size: int
+    last_key: Optional[list]
+    data_versions: list  # of the tables of the base query, when row_count was counted
+
+    @property
+    def page_count(self) -> int:
+        return max(1, math.ceil(self.row_count / self.page_size))
+
+
+def update_page_keys(page_keys: Optional[dict], table_query: TableQuery, page: TablePage) -> dict:
+    """
+    :return: new page keys (to be kept in a dcc.Store) including the last key of the page just loaded.
+    """
+    if not page_keys or page_keys.get('signature') != table_query.signature:
+        page_keys = {'signature': table_query.signature, 'last_key_by_page': {}}
+    if page.last_key is not None:
+        page_keys['last_key_by_page'][str(table_query.page_current)] = page.last_key
+    page_keys['row_count'] = page.row_count
+    page_keys['row_count_data_versions'] = page.data_versions
+    return page_keys
+
+
+class TableQueryBuilder:
+    def __init__(self, base_query: str, key_column: str, column_types: dict[str, str]) -> None:
+        """
+        :param base_query: SELECT whose result set is paged. Must not end with a semicolon.
+        :param key_column: unique column of the base query, used as the last sort key.
+        :param column_types: DataTable type ('numeric', 'text', 'datetime', 'any') by column id. Only these columns
+          can be filtered and sorted on.
+        """
+        self.__base_query = base_query
+        self.__key_column = key_column
+        self.__column_types = column_types
+
+    def build(self, table_query: TableQuery) -> tuple[str, dict, str, dict]:
+        """
+        :return: page query and its params, row count query and its params.
+        """
+        params = {}
+        filter_conditions = self.__make_filter_conditions(table_query.filter_query, params)
+        count_params = dict(params)
+        count_where = f'WHERE {" AND ".join(filter_conditions)}' if filter_conditions else ''
+        count_query = f'SELECT COUNT(*) FROM ({self.__base_query}) {count_where}'
+
+        sort_columns = self.__get_sort_columns(table_query.sort_by)
+        page_conditions = list(filter_conditions)
+        if table_query.after_key is not None:
+            page_conditions.append(self.__make_keyset_condition(sort_columns, table_query.after_key, params))
+        else:
+            params['offset'] = table_query.page_current * table_query.page_size
+        params['limit'] = table_query.page_size
+
+        page_where = f'WHERE {" AND ".join(page_conditions)}' if page_conditions else ''
+        order_by = ', '.join(f'{column} {"DESC" if is_descending else "ASC"}' for column, is_descending in sort_columns)
+        offset = ' OFFSET :offset' if table_query.after_key is None else ''
+        page_query = f'SELECT * FROM ({self.__base_query}) {page_where} ORDER BY {order_by} LIMIT :limit{offset}'
+        return page_query, params, count_query, count_params
+
+    def get_row_key(self, record: dict, table_query: TableQuery) -> list:
+        return [record[column] for column, _ in self.__get_sort_columns(table_query.sort_by)]
+
+    def __get_sort_columns(self, sort_by: list[dict]) -> list[tuple[str, bool]]:
+        """
+        :return: (column, is_descending) for each sorted column, always ending with the key column.
+        """
+        sort_columns = [
+            (sort['column_id'], sort['direction'] == 'desc')
+            for sort in sort_by
+            if sort['column_id'] in self.__column_types and sort['column_id'] != self.__key_column
+        ]
+        return sort_columns + [(self.__key_column, False)]
+
+    def __make_filter_conditions(self, filter_query: str, params: dict) -> list[str]:
+        conditions = []
+        for filter_part in filter_query.split(' && '):
+            filter_part = filter_part.strip()
+            if not filter_part:
+                continue
+            condition = self.__make_filter_condition(filter_part, params)
+            if condition is None:
+                logger.warning(f'Ignoring unsupported filter: {filter_part}')
+                continue
+            conditions.append(condition)
+        return conditions
+
+    def __make_filter_condition(self, filter_part: str, params: dict) -> Optional[str]:
+        match = _filter_part_pattern.match(filter_part)
+        if not match or match['column'] not in self.__column_types:
+            return None
+        column = match['column']
+        operator = match['operator']
+        value = self.__parse_value(match['value'])
+
+        if operator == 'is':
+            if value == 'blank':
+                return f"({column} IS NULL OR {column} = '')"
+            if value == 'nil':
+                return f'{column} IS NULL'
+            return None
+
+        # Operators may be prefixed with s (case-sensitive) or i (case-insensitive, the default here)
+        is_case_sensitive = False
+        if operator[:1] in ('s', 'i') and operator[1:] in _case_prefixable_operators:
+            is_case_sensitive = operator[0] == 's'
+            operator = operator[1:]
+
+        param = f'p{len(params)}'
+        if operator == 'contains':
+            if is_case_sensitive:
+                params[param] = str(value)
+                return f'instr({column}, :{param}) > 0'
+            params[param] = f'%{self.__escape_like(str(value))}%'
+            return f"{column} LIKE :{param} ESCAPE '\\'"
+        if operator == 'datestartswith':
+            params[param] = f'{self.__escape_like(str(value))}%'
+            return f"{column} LIKE :{param} ESCAPE '\\'"
+        if operator in _comparison_operators:
+            if self.__column_types[column] == 'numeric':
+                try:
+                    value = float(value)
+                except ValueError:
+                    return None
+            params[param] = value
+            collate = ' COLLATE NOCASE' if isinstance(value, str) and not is_case_sensitive else ''
+            return f'{column} {_comparison_operators[operator]} :{param}{collate}'
+        return None
+
+    @staticmethod
+    def __make_keyset_condition(sort_columns: list[tuple[str, bool]], after_key: list, params: dict) -> str:
+        """
+        Rows strictly after after_key in the sort order. SQLite sorts NULLs first, so they are handled explicitly.
+        """
+        alternatives = []
+        equalities = []
+        for (column, is_descending), value in zip(sort_columns, after_key):
+            param = f'p{len(params)}'
+            params[param] = value
+            if value is None:
+                after = 'FALSE' if is_descending else f'{column} IS NOT NULL'
+            elif is_descending:
+                after = f'({column} < :{param} OR {column} IS NULL)'
+            else:
+                after = f'{column} > :{param}'
+            alternatives.append(' AND '.join(equalities + [after]))
+            equalities.append(f'{column} IS :{param}')
+        return '(' + ' OR '.join(f'({alternative})' for alternative in alternatives) + ')'
+
+    @staticmethod
+    def __parse_value(value: str) -> Any:
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in ('"', "'", '`'):
+            return value[1:-1]
+        return value
+
+    @staticmethod
+    def __escape_like(value: str) -> str:
+        return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
@@ -0,0 +1,166 @@
+"""
+Tracing spans written in the Chrome trace event format, to be opened in Perfetto (https://ui.perfetto.dev) or
+chrome://tracing. Each process writes its own file, trace_<pid>.json in config.trace_directory, rotated by size.
+Tracing is off if no directory is set: spans then cost a function call.
+
+Every Dash callback request gets a span (see install), and nested spans come from:
+
+    with tracing.span('load customer', dog_id=dog_id):
+        ...
+
+    @tracing.traced()
+    def make_layout(...):
+        ...
+"""
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, ContextManager, Iterator, Optional, TypeVar
+
+import flask
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_F = TypeVar('_F', bound=Callable)
+
+is_enabled = bool(config.trace_directory)
+
+# Trace events go through the logging machinery for its rotation and locking, but never reach the app log
+_event_logger = logging.getLogger(f'{__name__}.events')
+_event_logger.propagate = False
+_event_logger.setLevel(logging.INFO)
+_event_handler_pid: Optional[int] = None
+_event_handler_lock = threading.Lock()
+
+
+class TraceFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Writes one event per line in the JSON array format, whose closing bracket is optional: files stay valid traces
+    however they end.
+    """
+    def __init__(self, filename: str) -> None:
+        super().__init__(filename, maxBytes=config.trace_file_max_bytes, backupCount=config.trace_file_backup_count,
+                         delay=True)
+        self.setFormatter(logging.Formatter('%(message)s,'))
+
+    def _open(self):
+        stream = super()._open()
+        if stream.tell() == 0:
+            metadata = dict(name='process_name', ph='M', pid=os.getpid(), tid=0,
+                            args=dict(name=f'worker {os.getpid()}'))
+            stream.write(f'[\n{json.dumps(metadata)},\n')
+        return stream
+
+
+def span(name: str, category: str = 'app', **args: Any) -> ContextManager[None]:
+    """
+    :param category: to filter spans in the trace viewer, e.g. 'sql'.
+    :param args: shown with the span. Must be serializable to JSON.
+    """
+    if not is_enabled:
+        return nullcontext()
+    return _span(name, category, args)
+
+
+def traced(name: Optional[str] = None, category: str = 'app') -> Callable[[_F], _F]:
+    """
+    Decorator wrapping each call of the function in a span.
+    :param name: name of the span, the module and qualified name of the function by default.
+    """
+    def decorator(function: _F) -> _F:
+        if not is_enabled:
+            return function
+        span_name = name or f'{function.__module__}.{function.__qualname__}'
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with _span(span_name, category, {}):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def install(server: flask.Flask) -> None:
+    """
+    Opens a span for each Dash callback request, named after the outputs of the callback, with nested spans for the
+    (de)serialization of the request and the response.
+    """
+    if not is_enabled:
+        return
+    logger.info(f'Tracing to {config.trace_directory}')
+    # Dash (pinned in requirements.txt) serializes callback results with this function
+    from dash import _callback
+    _callback.to_json = traced('serialize response', category='json')(_callback.to_json)
+
+    @server.before_request
+    def start_callback_span() -> None:
+        if not flask.request.path.endswith('/_dash-update-component'):
+            return
+        start = time.perf_counter()
+        # Parsed once: Dash gets the cached body
+        body = flask.request.get_json(silent=True) or {}
+        _write_event('deserialize request', 'json', start, time.perf_counter(), {})
+        flask.g.callback_span = (f'callback {body.get("output", "?")}', start,
+                                 dict(inputs=body.get('changedPropIds', [])))
+
+    @server.teardown_request
+    def end_callback_span(error: Optional[BaseException]) -> None:
+        callback_span = flask.g.pop('callback_span', None)
+        if callback_span is None:
+            return
+        name, start, args = callback_span
+        if error is not None:
+            args['error'] = repr(error)
+        _write_event(name, 'callback', start, time.perf_counter(), args)
+
+
+@contextmanager
+def _span(name: str, category: str, args: dict) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        args = dict(args, error=repr(e))
+        raise
+    finally:
+        _write_event(name, category, start, time.perf_counter(), args)
+
+
+# Timestamps of trace events are in microseconds since the epoch (so that the files of all processes line up), measured
+# with the monotonic clock
+_epoch_offset_seconds = time.time() - time.perf_counter()
+
+
+def _write_event(name: str, category: str, start: float, end: float, args: dict) -> None:
+    event = dict(name=name, cat=category, ph='X', ts=round((_epoch_offset_seconds + start) * 1_000_000),
+                 dur=round((end - start) * 1_000_000), pid=os.getpid(), tid=threading.get_native_id(), args=args)
+    try:
+        message = json.dumps(event, default=str)
+    except ValueError as e:
+        logger.warning(f'Trace event {name} not written: {e}')
+        return
+    _get_event_logger().info(message)
+
+
+def _get_event_logger() -> logging.Logger:
+    global _event_handler_pid
+    # Forked worker processes write their own file
+    if _event_handler_pid != os.getpid():
+        with _event_handler_lock:
+            if _event_handler_pid != os.getpid():
+                for handler in list(_event_logger.handlers):
+                    _event_logger.removeHandler(handler)
+                    handler.close()
+                os.makedirs(config.trace_directory, exist_ok=True)
+                _event_logger.addHandler(TraceFileHandler(f'{config.trace_directory}/trace_{os.getpid()}.json'))
+                _event_handler_pid = os.getpid()
+    return _event_logger
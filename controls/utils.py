@@ -1,9 +1,7 @@
-import json
 import re
 from typing import Any, TypeVar
 
 import pandas as pd
-from bidict import bidict
 
 _T = TypeVar('_T')
 
@@ -22,23 +20,13 @@ def get_single_row_as_dict(df: pd.DataFrame) -> dict:
     return records[0]
 
 
-def flatten(ls: list[list[_T]]) -> list[_T]:
-    return [item for sublist in ls for item in sublist]
-
+def split_by_column(df: pd.DataFrame, column: str) -> dict[Any, pd.DataFrame]:
+    """
+    :return: one DataFrame (with a fresh index) per distinct value of the column.
+    """
+    return {key: group.reset_index(drop=True) for key, group in df.groupby(column)}
 
-class BidictDecoder(json.JSONDecoder):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs, object_hook=self.__object_hook)
-
-    @staticmethod
-    def __object_hook(dct) -> Any:
-        if '__bidict__' in dct:
-            return bidict(dct['data'])
-        return dct
 
+def flatten(ls: list[list[_T]]) -> list[_T]:
+    return [item for sublist in ls for item in sublist]
 
-class BidictEncoder(json.JSONEncoder):
-    def default(self, obj: Any) -> Any:
-        if isinstance(obj, bidict):
-            return {'__bidict__': True, 'data': obj._fwdm}
-        return super().default(obj)
@@ -0,0 +1,245 @@
+"""
+Single writer of the database. Callbacks submit units of work, functions writing through the DataProvider they are
+given, and get a future back. The writer thread owns the write connection and commits the units queued meanwhile in a
+single transaction (group commit), each one in its own savepoint: a failing unit is rolled back alone. Batches that
+fail on a lock held by another process are written again (see controls/retry.py), so units may run more than once.
+
+Units must neither commit nor roll back, and should be short: validate the data before submitting it.
+"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, replace
+from typing import Callable, Optional, TypeVar
+
+import config
+from controls import migrations, retry, sqlite_config
+from controls.data_provider import DataProvider
+
+logger = logging.getLogger(__name__)
+
+_T = TypeVar('_T')
+
+WriteUnit = Callable[[DataProvider], _T]
+
+
+class WriteTimeoutError(RuntimeError):
+    pass
+
+
+@dataclass
+class WriteQueueStats:
+    units: int = 0
+    failed_units: int = 0  # rolled back alone, the rest of their batch was committed
+    batches: int = 0
+    failed_batches: int = 0  # failed to commit: all their units failed
+    cancelled_units: int = 0  # timed out before the writer started them
+    max_batch_size: int = 0
+    queued_units: int = 0
+
+
+@dataclass
+class _QueuedUnit:
+    name: str
+    unit: WriteUnit
+    future: Future
+
+
+class WriteQueue:
+    def __init__(self, connect: Callable[[], sqlite3.Connection], max_batch_size: int,
+                 max_wait_seconds: float) -> None:
+        """
+        :param connect: factory of the write connection.
+        :param max_batch_size: maximum number of units committed together.
+        :param max_wait_seconds: how long the writer waits for more units before committing a batch that is not full.
+        """
+        self.__connect = connect
+        self.__max_batch_size = max_batch_size
+        self.__max_wait_seconds = max_wait_seconds
+        self.__queue: queue.Queue[Optional[_QueuedUnit]] = queue.Queue()
+        self.__stats = WriteQueueStats()
+        self.__stats_lock = threading.Lock()
+        self.__thread = threading.Thread(target=self.__run, name='database-writer', daemon=True)
+        self.__thread.start()
+
+    def submit(self, unit: WriteUnit, name: str) -> 'Future[_T]':
+        """
+        :param name: for logging.
+        """
+        future = Future()
+        self.__queue.put(_QueuedUnit(name=name, unit=unit, future=future))
+        return future
+
+    def close(self) -> None:
+        """
+        Stops the writer once the units already queued are written.
+        """
+        self.__queue.put(None)
+        self.__thread.join()
+
+    def stats(self) -> WriteQueueStats:
+        with self.__stats_lock:
+            return replace(self.__stats, queued_units=self.__queue.qsize())
+
+    def __run(self) -> None:
+        connection = self.__connect()
+        try:
+            is_closing = False
+            while not is_closing:
+                batch, is_closing = self.__take_batch()
+                if batch:
+                    self.__write_batch(connection, batch)
+        finally:
+            connection.close()
+            logger.info('Database writer stopped')
+
+    def __take_batch(self) -> tuple[list[_QueuedUnit], bool]:
+        """
+        :return: the units to commit together, and whether the queue was closed.
+        """
+        first = self.__queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.__max_wait_seconds
+        while len(batch) < self.__max_batch_size:
+            try:
+                queued = self.__queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if queued is None:
+                return batch, True
+            batch.append(queued)
+        return batch, False
+
+    def __write_batch(self, connection: sqlite3.Connection, batch: list[_QueuedUnit]) -> None:
+        # Units cancelled by their callers (see run) are skipped
+        started = [queued for queued in batch if queued.future.set_running_or_notify_cancel()]
+        if len(started) < len(batch):
+            with self.__stats_lock:
+                self.__stats.cancelled_units += len(batch) - len(started)
+        batch = started
+        if not batch:
+            return
+        logger.debug(f'Writing {len(batch)} unit(s): {[queued.name for queued in batch]}')
+        try:
+            # Another process may hold the write lock: the whole batch is then rolled back and written again
+            outcomes, written_tables, written_keys = retry.run(lambda: self.__try_write_batch(connection, batch),
+                                                               name='write_batch')
+        except Exception as e:
+            logger.exception(f'Batch of {len(batch)} unit(s) failed')
+            for queued in batch:
+                queued.future.set_exception(e)
+            with self.__stats_lock:
+                self.__stats.failed_batches += 1
+                self.__stats.failed_units += len(batch)
+            return
+
+        DataProvider.publish_committed(written_tables, written_keys)
+        failed_count = sum(1 for _, _, error in outcomes if error is not None)
+        with self.__stats_lock:
+            self.__stats.batches += 1
+            self.__stats.units += len(batch)
+            self.__stats.failed_units += failed_count
+            self.__stats.max_batch_size = max(self.__stats.max_batch_size, len(batch))
+        for queued, result, error in outcomes:
+            if error is None:
+                queued.future.set_result(result)
+            else:
+                queued.future.set_exception(error)
+
+    @staticmethod
+    def __try_write_batch(connection: sqlite3.Connection, batch: list[_QueuedUnit]) \
+            -> tuple[list[tuple[_QueuedUnit, object, Optional[Exception]]], set[str], dict[str, set]]:
+        """
+        Writes and commits the batch, or rolls it back entirely if it cannot be committed.
+        :return: the result or the error of each unit, and the tables and keys written by the units that succeeded.
+        """
+        outcomes: list[tuple[_QueuedUnit, object, Optional[Exception]]] = []
+        written_tables: set[str] = set()
+        written_keys: dict[str, set] = {}
+        try:
+            # Takes the write lock upfront
+            connection.execute('BEGIN IMMEDIATE')
+            for queued in batch:
+                with DataProvider(connection) as data_provider:
+                    connection.execute('SAVEPOINT unit')
+                    try:
+                        result = queued.unit(data_provider)
+                        connection.execute('RELEASE unit')
+                    except Exception as e:
+                        if retry.is_retryable(e):
+                            raise
+                        connection.execute('ROLLBACK TO unit')
+                        connection.execute('RELEASE unit')
+                        logger.warning(f'Unit {queued.name} rolled back: {e}')
+                        outcomes.append((queued, None, e))
+                        continue
+                    tables, keys = data_provider.pop_written_data()
+                outcomes.append((queued, result, None))
+                written_tables |= tables
+                for key_column, ids in keys.items():
+                    written_keys.setdefault(key_column, set()).update(ids)
+            connection.commit()
+        except BaseException:
+            if connection.in_transaction:
+                connection.rollback()
+            raise
+        return outcomes, written_tables, written_keys
+
+
+def _connect() -> sqlite3.Connection:
+    logger.info(f'Opening write connection to {config.database_file}...')
+    connection = sqlite_config.connect(config.database_file, config.database_profile,
+                                       busy_timeout_ms=config.database_busy_timeout_ms)
+    if config.database_file == sqlite_config.IN_MEMORY_DATABASE:
+        migrations.migrate(connection)
+    return connection
+
+
+_write_queue: Optional[WriteQueue] = None
+_write_queue_pid: Optional[int] = None
+_write_queue_lock = threading.Lock()
+
+
+def get_write_queue() -> WriteQueue:
+    global _write_queue, _write_queue_pid
+    # The writer thread does not survive a fork: worker processes start their own
+    if _write_queue is None or _write_queue_pid != os.getpid():
+        with _write_queue_lock:
+            if _write_queue is None or _write_queue_pid != os.getpid():
+                _write_queue = WriteQueue(_connect, max_batch_size=config.write_queue_max_batch_size,
+                                          max_wait_seconds=config.write_queue_max_wait_seconds)
+                _write_queue_pid = os.getpid()
+    return _write_queue
+
+
+def get_stats() -> Optional[WriteQueueStats]:
+    """
+    :return: stats of the write queue of this process, None if it has not written anything yet.
+    """
+    if _write_queue is None or _write_queue_pid != os.getpid():
+        return None
+    return _write_queue.stats()
+
+
+def run(unit: WriteUnit, name: Optional[str] = None) -> _T:
+    """
+    Submits the unit and waits for it to be committed.
+    :return: what the unit returned.
+    :raise: what the unit raised, or WriteTimeoutError if it could not be started within
+      config.write_queue_unit_timeout_seconds.
+    """
+    name = name or getattr(unit, '__name__', None) or repr(unit)
+    future = get_write_queue().submit(unit, name)
+    try:
+        return future.result(timeout=config.write_queue_unit_timeout_seconds)
+    except TimeoutError:
+        if future.cancel():
+            raise WriteTimeoutError(f'The database is busy, {name} was not saved. Please try again')
+        # Already being written: its batch is about to commit
+        return future.result()
@@ -1,11 +1,11 @@
 from typing import Any
 
-import pandas as pd
-from dash import dash_table, html, Input, State
+from dash import callback, dash_table, dcc, html, Input, Output, State
 from dash.exceptions import PreventUpdate
 
 from components.page_callback import change_page_callback, MultiPageCallbackData, Pages
 from controls.data_provider import DataProvider
+from controls.table_query import TableQuery, update_page_keys
 
 
 class Ids:
@@ -25,7 +25,7 @@ class Controller:
         {'id': 'owners', 'name': 'Owners\' names'},
         {'id': 'balance_in_eur', 'name': 'Account balance', 'type': 'numeric'},
         {'id': 'breed', 'name': 'Breed'},
-        {'id': 'sex', 'name': 'Sex'},  # computed in code from is_male
+        {'id': 'sex', 'name': 'Sex'},  # computed in SQL from is_male
         {'id': 'birth_date', 'name': 'Birth date', 'type': 'datetime'},
         {'id': 'address', 'name': 'Address'},
         {'id': 'phones1', 'name': 'Phones'},
@@ -34,51 +34,61 @@ class Controller:
     ]
 
     id_customers_data_table = Ids.element('DataTable', 'customers')
+    id_page_keys_store = Ids.element('Store', 'customers-page-keys')
 
     page_size = 10
 
     @staticmethod
-    def load_customers() -> list[dict]:
+    @callback(
+        Output(id_customers_data_table, 'data'),
+        Output(id_customers_data_table, 'page_count'),
+        Output(id_page_keys_store, 'data'),
+        inputs=dict(
+            page_current=Input(id_customers_data_table, 'page_current'),
+            page_size=Input(id_customers_data_table, 'page_size'),
+            sort_by=Input(id_customers_data_table, 'sort_by'),
+            filter_query=Input(id_customers_data_table, 'filter_query'),
+            page_keys=State(id_page_keys_store, 'data'),
+        )
+    )
+    def load_customers_page(page_current: int, page_size: int, sort_by: list[dict], filter_query: str,
+                            page_keys: dict) -> tuple[list[dict], int, dict]:
+        table_query = TableQuery.from_table_state(page_current, page_size, sort_by, filter_query, page_keys)
+        column_types = {column['id']: column.get('type', 'text') for column in Controller.customers_columns}
         with DataProvider() as data_provider:
-            customers_df = data_provider.get_all_customers()
-            customers_df['id'] = customers_df['dog_id']
-            customers_df['sex'] = customers_df['is_male'].map({1: 'Male', 0: 'Female'})
-            return customers_df.to_dict('records')
+            page = data_provider.get_customers_page(table_query, column_types)
+        return page.records, page.page_count, update_page_keys(page_keys, table_query, page)
 
     @staticmethod
     @change_page_callback(
         new_page=Pages.customer_profile_path_param,
         inputs=dict(
             active_cell=Input(id_customers_data_table, 'active_cell'),
-            table_data=State(id_customers_data_table, 'data'),
         )
     )
-    def on_cell_clicked(active_cell: dict, table_data: dict) -> MultiPageCallbackData:
+    def on_cell_clicked(active_cell: dict) -> MultiPageCallbackData:
         if not active_cell:
             raise PreventUpdate
-        # FIXME doesn't work with filters
-        row = active_cell['row']
-        customers_df = pd.DataFrame.from_records(table_data)
-        dog_id = customers_df.at[row, 'dog_id']
-        return MultiPageCallbackData(page_param_value=dog_id)
+        # Rows have the dog id as row id, whatever the page, sort or filter
+        return MultiPageCallbackData(page_param_value=active_cell['row_id'])
 
 
 def layout() -> html.Div:
-    customers = Controller.load_customers()
-
+    # Rows are loaded one page at a time by Controller.load_customers_page
     return html.Div([
+        dcc.Store(id=Controller.id_page_keys_store),
         dash_table.DataTable(
             id=Controller.id_customers_data_table,
-            data=customers,
+            data=[],
             columns=Controller.customers_columns,
             editable=False,
             row_deletable=False,
             row_selectable=False,
-            filter_action='native',
+            filter_action='custom',
             filter_options={'case': 'insensitive'},
-            sort_action='native',
+            sort_action='custom',
             sort_mode="multi",
-            page_action="native",
+            page_action="custom",
             page_current=0,
             page_size=Controller.page_size,
             css=[{"selector": ".row", "rule": "margin: 0; display: block"}],
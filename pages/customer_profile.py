@@ -1,17 +1,23 @@
+import json
 import logging
-from dataclasses import dataclass
+import uuid
+from dataclasses import asdict, dataclass
 from enum import Enum
 from typing import Any, Optional, TypedDict
 
 import dash_bootstrap_components as bootstrap
 import pandas as pd
 from bidict import bidict
-from dash import ALL, callback, ctx, html, Input, MATCH, Output, State
+from dash import ALL, callback, ctx, dcc, html, Input, no_update, Output, Patch, State
 from dash.dash_table import DataTable
 from dash.exceptions import PreventUpdate
 
-from components.dict_form import DataStore as FormData, DictFormAIO, FieldType, Ids as FormIds
+from components.dict_form import CallbackMode, DataStore as FormData, DictFormAIO, FieldType, Ids as FormIds, \
+    register_fields_config
+import config
 from components.page_callback import change_page_callback, MultiPageCallbackData, Pages, user_message_callback
+from controls import tracing, utils, write_queue
+from controls.cache import LruCache
 from controls.data_provider import DataProvider
 from controls.types import Customer, UserMessage
 from pages.customer_list import Ids
@@ -31,15 +37,36 @@ class DogProfile:
     single_classes: pd.DataFrame
 
 
+@dataclass
+class SavedCustomer:
+    customer_id: int
+    customer_row_version: Optional[int]  # None if the customer itself was not saved
+    # By index of the forms, (None, None) for those not saved
+    dog_ids_and_row_versions: list[tuple[Optional[int], Optional[int]]]
+    person_ids_and_row_versions: list[tuple[Optional[int], Optional[int]]]
+    statement_count: int
+
+
 @dataclass
 class CustomerProfile:
     customer: Customer
     dog_profile_by_id: dict[int, DogProfile]
 
+    @property
+    def customer_id(self) -> int:
+        return self.customer.customer_data['customer_id']
+
     def get_dog_profile(self, dog_id: int) -> DogProfile:
         return self.dog_profile_by_id[dog_id] if dog_id in self.dog_profile_by_id \
             else DogProfile(subscriptions=pd.DataFrame(), single_classes=pd.DataFrame())
 
+    def estimate_size_bytes(self) -> int:
+        size_bytes = len(json.dumps(asdict(self.customer), default=str))
+        for dog_profile in self.dog_profile_by_id.values():
+            size_bytes += int(dog_profile.subscriptions.memory_usage(deep=True).sum())
+            size_bytes += int(dog_profile.single_classes.memory_usage(deep=True).sum())
+        return size_bytes
+
 
 class Ids:
     class Id(TypedDict):
@@ -59,10 +86,6 @@ class Ids:
     def dog_subscriptions_table(cls, dog_id: Any = '') -> Id:
         return cls.element('DataTable-DogSubscriptions', dog_id)
 
-    @classmethod
-    def get_dog_id_from_subscription_table_id(cls, element_id: Id) -> int:
-        return int(element_id['index'])
-
     @classmethod
     def dog_single_classes_table(cls, dog_id: Any = '') -> Id:
         return cls.element('DataTable-DogSingleClasses', dog_id)
@@ -126,6 +149,7 @@ class Controller:
 
     id_main_container = Ids.element('Container')
     id_dogs_tabs = Ids.element('Tabs', 'Dogs')
+    id_dog_tabs_store = Ids.element('Store', 'dog-tabs')
     id_persons_tabs = Ids.element('Tabs', 'persons')
     id_reset_button = Ids.element('Button', 'reset-customer')
     id_save_button = Ids.element('Button', 'save-customer')
@@ -133,57 +157,84 @@ class Controller:
     id_dog_form = 'DogForm'
     id_person_form = 'PersonForm'
     tab_id_add_dog_tab = 'AddDog'
-
-    # Dog validation components
-    __dog_forms_filter = dict(form_id=id_dog_form, form_index=MATCH)
-    __id_field_dog_name = FormIds.field_element(field_type=FieldType.TEXT, field_name='dog_name', **__dog_forms_filter)
-    __id_feedback_dog_name = FormIds.field_feedback(field_name='dog_name', **__dog_forms_filter)
-    __id_field_breed = FormIds.field_element(field_type=FieldType.TEXT, field_name='breed', **__dog_forms_filter)
-    __id_feedback_breed = FormIds.field_feedback(field_name='breed', **__dog_forms_filter)
-
-    # Person validation components
-    __person_forms_filter = dict(form_id=id_person_form, form_index=MATCH)
-    __id_field_person_name = FormIds.field_element(field_type=FieldType.TEXT, field_name='person_name',
-                                                   **__person_forms_filter)
-    __id_feedback_person_name = FormIds.field_feedback(field_name='person_name', **__person_forms_filter)
-    __id_field_email_address = FormIds.field_element(field_type=FieldType.EMAIL, field_name='email_address',
-                                                     **__person_forms_filter)
-    __id_feedback_email_address = FormIds.field_feedback(field_name='email_address', **__person_forms_filter)
-
-    __last_new_dog_id = 0
-    __last_new_person_id = 0
+    # Profiles of large households have many fields: keep editing (and validation) in the browser
+    form_callback_mode = CallbackMode.CLIENTSIDE
 
     __default_dog_name = 'New Doggo'
 
+    # Profiles by customer_id, shared by all callbacks: do not modify them. Invalidated by on_data_committed
+    __profile_cache = LruCache('customer_profiles', max_bytes=config.customer_profile_cache_max_bytes,
+                               ttl_seconds=config.customer_profile_cache_ttl_seconds,
+                               size_of=lambda profile: profile.estimate_size_bytes())
+
+    @classmethod
+    def get_cached_profile_by_dog_id(cls, dog_id: int) -> CustomerProfile:
+        # Pages get the id from the URL, as a string: aliases hold the ids of the rows
+        dog_id = int(dog_id)
+        customer_profile = cls.__profile_cache.get_by_alias(('dog_id', dog_id))
+        if customer_profile is not None:
+            return customer_profile
+        generation = cls.__profile_cache.generation
+        customer_profile = cls.get_profile_by_dog_id(dog_id=dog_id)
+        cls.__profile_cache.put(customer_profile.customer_id, customer_profile, generation,
+                                aliases=cls.__get_row_keys(customer_profile))
+        return customer_profile
+
+    @staticmethod
+    def __get_row_keys(customer_profile: CustomerProfile) -> list[tuple[str, Any]]:
+        """
+        :return: key column and id of the rows in the profile, the aliases it is invalidated by.
+        """
+        keys = [('dog_id', dog['dog_id']) for dog in customer_profile.customer.dogs]
+        keys += [('person_id', person['person_id']) for person in customer_profile.customer.persons]
+        for dog_profile in customer_profile.dog_profile_by_id.values():
+            if 'subscription_id' in dog_profile.subscriptions:
+                keys += [('subscription_id', id_) for id_ in dog_profile.subscriptions['subscription_id'].tolist()]
+            if 'class_id' in dog_profile.single_classes:
+                keys += [('class_id', id_) for id_ in dog_profile.single_classes['class_id'].tolist()]
+        return keys
+
+    @classmethod
+    def on_data_committed(cls, tables: set[str], keys: dict[str, set]) -> None:
+        if keys.get('training_id'):
+            # Subscriptions show the name and price of their training
+            cls.__profile_cache.clear()
+            return
+        cls.__profile_cache.invalidate(
+            keys=keys.get('customer_id', ()),
+            aliases=[(key_column, id_) for key_column, ids in keys.items() for id_ in ids])
+
     @staticmethod
     def get_profile_by_dog_id(dog_id: int) -> CustomerProfile:
-        with DataProvider() as data_provider:
+        with DataProvider() as data_provider, data_provider.read_transaction():
             customer = data_provider.get_customer_by_dog_id(dog_id=dog_id)
-
-            dogs_profiles = {}
-            for dog in customer.dogs:
-                other_dog_id = dog['dog_id']
-                subscriptions = data_provider.get_subscriptions_by_dog_id(dog_id=other_dog_id)
-                single_classes = data_provider.get_single_classes_by_dog_id(dog_id=other_dog_id)
-                dogs_profiles[other_dog_id] = DogProfile(
-                    subscriptions=subscriptions,
-                    single_classes=single_classes,
-                )
-
-            return CustomerProfile(
-                customer=customer,
-                dog_profile_by_id=dogs_profiles
+            customer_id = customer.customer_data['customer_id']
+            subscriptions = data_provider.get_subscriptions_by_customer_id(customer_id=customer_id)
+            single_classes = data_provider.get_single_classes_by_customer_id(customer_id=customer_id)
+
+        subscriptions_by_dog_id = utils.split_by_column(subscriptions, 'dog_id')
+        single_classes_by_dog_id = utils.split_by_column(single_classes, 'dog_id')
+        dogs_profiles = {}
+        for dog in customer.dogs:
+            other_dog_id = dog['dog_id']
+            dogs_profiles[other_dog_id] = DogProfile(
+                subscriptions=subscriptions_by_dog_id.get(other_dog_id, subscriptions.iloc[0:0]),
+                single_classes=single_classes_by_dog_id.get(other_dog_id, single_classes.iloc[0:0]),
             )
 
+        return CustomerProfile(
+            customer=customer,
+            dog_profile_by_id=dogs_profiles
+        )
+
     @staticmethod
     @change_page_callback(
         new_page=Pages.subscription_profile_path_param,
         inputs=dict(
             active_cell_list=Input(Ids.dog_subscriptions_table(dog_id=ALL), 'active_cell'),
-            table_data_list=State(Ids.dog_subscriptions_table(dog_id=ALL), 'data'),
         )
     )
-    def on_cell_clicked(active_cell_list: list[Optional[dict]], table_data_list: list[dict]) -> MultiPageCallbackData:
+    def on_cell_clicked(active_cell_list: list[Optional[dict]]) -> MultiPageCallbackData:
         if not ctx.triggered:
             raise PreventUpdate
         if len(ctx.triggered) > 1:
@@ -192,63 +243,54 @@ class Controller:
                              f'and not all being None: {ctx.triggered_id}')
             raise PreventUpdate
         assert len(ctx.triggered) == 1
-        active_cell = ctx.triggered[0]
-        triggered_id = ctx.triggered_id
-        triggered_dog_id = Ids.get_dog_id_from_subscription_table_id(element_id=triggered_id)
-        for table_data in table_data_list:
-            subscriptions_df = pd.DataFrame.from_records(table_data)
-            dog_id = subscriptions_df['dog_id'].drop_duplicates()
-            assert len(dog_id) == 1
-            dog_id = dog_id.iat[0]
-            if dog_id != triggered_dog_id:
-                continue
-            # FIXME doesn't work with filters
-            row = active_cell['value']['row']
-            subscription_id = subscriptions_df.at[row, 'subscription_id']
-            return MultiPageCallbackData(page_param_value=subscription_id)
-        # TODO user message and error log
-        raise PreventUpdate('Could not find table for the dog clicked on')
+        active_cell = ctx.triggered[0]['value']
+        if not active_cell:
+            raise PreventUpdate
+        # Rows have the subscription id as row id
+        return MultiPageCallbackData(page_param_value=active_cell['row_id'])
 
     @staticmethod
     @callback(
         Output(id_dogs_tabs, 'children'),
         Output(id_dogs_tabs, 'active_tab'),
+        Output(id_dog_tabs_store, 'data'),
         inputs=dict(
             active_tab=Input(id_dogs_tabs, 'active_tab'),
-            dogs_tabs=Input(id_dogs_tabs, 'children'),
+            dog_tabs=State(id_dog_tabs_store, 'data'),
         ),
         prevent_initial_call=True
     )
-    def on_active_tab_changed(active_tab: str, dogs_tabs: list[bootstrap.Tab]) -> tuple[list[bootstrap.Tab], str]:
-        if not dogs_tabs:
+    def on_active_tab_changed(active_tab: str, dog_tabs: dict) -> tuple[Patch, str, dict]:
+        if not dog_tabs:
             raise PreventUpdate
         if active_tab == 'None':
             # make sure there's always a dog selected
-            assert len(dogs_tabs) > 0
-            return dogs_tabs, Controller.__get_tab_id(dogs_tabs[0])
+            assert len(dog_tabs['tab_ids']) > 0
+            return no_update, dog_tabs['tab_ids'][0], no_update
 
         if active_tab == Controller.tab_id_add_dog_tab:
-            return Controller.__add_new_dog_tab(dogs_tabs)
-        else:
+            return Controller.__add_new_dog_tab(dog_tabs)
+        if active_tab in dog_tabs['loaded_tab_ids']:
             raise PreventUpdate
+        return Controller.__load_dog_tab(active_tab, dog_tabs)
 
     @staticmethod
     @callback(
         Output(id_main_container, 'children'),
         inputs=dict(
             reset_button_clicks=Input(id_reset_button, 'n_clicks'),
-            active_tab=Input(id_dogs_tabs, 'active_tab'),
-            dogs_tabs=Input(id_dogs_tabs, 'children'),
+            active_tab=State(id_dogs_tabs, 'active_tab'),
+            dog_tabs=State(id_dog_tabs_store, 'data'),
         ),
         prevent_initial_call=True
     )
-    def reset_data(reset_button_clicks: int, active_tab: str, dogs_tabs: list[bootstrap.Tab]):
+    def reset_data(reset_button_clicks: int, active_tab: str, dog_tabs: dict):
         if not reset_button_clicks:
             raise PreventUpdate
         if active_tab == 'None':
             # make sure there's always a dog selected
-            assert len(dogs_tabs) > 0
-            dog_id = Controller.__get_tab_id(dogs_tabs[0])
+            assert len(dog_tabs['tab_ids']) > 0
+            dog_id = dog_tabs['tab_ids'][0]
         else:
             dog_id = active_tab
         assert dog_id is not None
@@ -258,103 +300,182 @@ class Controller:
     @user_message_callback(
         inputs=dict(
             save_button_clicks=Input(id_save_button, 'n_clicks'),
-            customer_data_json=State(FormIds.form_data_store(id_customer_data_form), 'data'),
-            dogs_json=State(FormIds.form_data_store(id_dog_form, ALL), 'data'),
-            persons_json=State(FormIds.form_data_store(id_person_form, ALL), 'data'),
+            customer_data_store=State(FormIds.form_data_store(id_customer_data_form), 'data'),
+            dog_stores=State(FormIds.form_data_store(id_dog_form, ALL), 'data'),
+            person_stores=State(FormIds.form_data_store(id_person_form, ALL), 'data'),
+        ),
+        extra_outputs=(
+            Output(FormIds.form_data_store(id_customer_data_form), 'data', allow_duplicate=True),
+            Output(FormIds.form_data_store(id_dog_form, ALL), 'data', allow_duplicate=True),
+            Output(FormIds.form_data_store(id_person_form, ALL), 'data', allow_duplicate=True),
         )
     )
-    def save_customer(save_button_clicks: int, customer_data_json: str, dogs_json: str,
-                      persons_json: str) -> UserMessage:
+    def save_customer(save_button_clicks: int, customer_data_store: dict, dog_stores: list[dict],
+                      person_stores: list[dict]) -> tuple[UserMessage, Any, list, list]:
         if not save_button_clicks:
             raise PreventUpdate
 
         logger.info('Saving customer...')
-        logger.debug(f'customer_data={customer_data_json} dogs={dogs_json} persons={persons_json}')
-
-        with DataProvider() as data_provider:
-            try:
-                customer_data = FormData.from_json(customer_data_json)
-                logger.info(f'Validating customer data: {customer_data.data}')
-                customer_data.validate()
-                if customer_data.is_insertion:
-                    customer_id = data_provider.insert_customer(customer_data.data)
-                else:
-                    customer_id = customer_data.data['customer_id']
-                    data_provider.update_customer(customer_data.data)
-                logger.info(f'Saved customer {customer_id}')
-
-                for dog_json in dogs_json:
-                    dog = FormData.from_json(dog_json)
-                    logger.info(f'Validating dog: {dog.data}')
-                    dog.validate()
-                    if dog.is_insertion:
-                        dog_id = data_provider.insert_dog(dog.data, customer_id=customer_id)
-                    else:
-                        dog_id = dog.data['dog_id']
-                        data_provider.update_dog(dog.data)
-                    logger.info(f'Saved dog {dog_id} from customer {customer_id}')
-
-                for person_json in persons_json:
-                    person = FormData.from_json(person_json)
-                    logger.info(f'Validating person: {person.data}')
-                    person.validate()
-                    if person.is_insertion:
-                        person_id = data_provider.insert_person(person.data, customer_id=customer_id)
-                    else:
-                        person_id = person.data['person_id']
-                        data_provider.update_person(person.data)
-                    logger.info(f'Saved person {person_id} from customer {customer_id}')
-
-                data_provider.commit()
-                return UserMessage(message='Customer saved successfully', header='Success', type='success')
-            except RuntimeError as e:
-                data_provider.rollback()
-                return UserMessage(message=f'Error saving customer: {e}', header='Error', type='danger')
+        logger.debug(f'customer_data={customer_data_store} dogs={dog_stores} persons={person_stores}')
+
+        # Only new and modified entities are validated and written; updates only write the modified columns
+        try:
+            customer_data = FormData.from_store(customer_data_store)
+            dogs = [FormData.from_store(dog_store) for dog_store in dog_stores]
+            persons = [FormData.from_store(person_store) for person_store in person_stores]
+            for form_data in [customer_data] + dogs + persons:
+                if form_data.is_insertion or form_data.is_modified:
+                    logger.info(f'Validating {form_data.form_id}: {form_data.data}')
+                    form_data.validate()
+
+            saved = write_queue.run(lambda data_provider: Controller.__write_customer(
+                data_provider, customer_data, dogs, persons), name='save_customer')
+            logger.info(f'Customer {saved.customer_id} saved with {saved.statement_count} statement(s)')
+
+            # The forms must update the saved ids and row versions, or saving them again would insert them twice or be
+            # seen as a conflict
+            customer_patch = FormData.make_saved_patch(
+                {'customer_id': saved.customer_id, 'row_version': saved.customer_row_version}) \
+                if saved.customer_row_version is not None else no_update
+            dog_patches = [
+                FormData.make_saved_patch({'dog_id': dog_id, 'row_version': row_version})
+                if dog_id is not None else no_update
+                for dog_id, row_version in saved.dog_ids_and_row_versions
+            ]
+            person_patches = [
+                FormData.make_saved_patch({'person_id': person_id, 'row_version': row_version})
+                if person_id is not None else no_update
+                for person_id, row_version in saved.person_ids_and_row_versions
+            ]
+            return UserMessage(message='Customer saved successfully', header='Success', type='success'), \
+                customer_patch, dog_patches, person_patches
+        except RuntimeError as e:
+            return UserMessage(message=f'Error saving customer: {e}', header='Error', type='danger'), \
+                no_update, [no_update] * len(dog_stores), [no_update] * len(person_stores)
+
+    @staticmethod
+    def __write_customer(data_provider: DataProvider, customer_data: FormData, dogs: list[FormData],
+                         persons: list[FormData]) -> SavedCustomer:
+        statement_count = 0
+        customer_id = customer_data.data['customer_id']
+        customer_row_version = None
+        if customer_data.is_insertion or customer_data.is_modified:
+            if customer_data.is_insertion:
+                customer_id = data_provider.insert_customer(customer_data.data)
+                statement_count += 1
+            else:
+                statement_count += data_provider.update_customers(
+                    [customer_data.get_modified_data('customer_id', 'row_version')])
+            customer_row_version = data_provider.get_row_versions('customer', [customer_id])[customer_id]
+
+        # Id of each saved dog, by index of its form; None if it was not saved
+        saved_dog_ids: list[Optional[int]] = []
+        modified_dogs = []
+        for dog in dogs:
+            if dog.is_insertion:
+                saved_dog_ids.append(data_provider.insert_dog(dog.data, customer_id=customer_id))
+                statement_count += 1
+            elif dog.is_modified:
+                saved_dog_ids.append(dog.data['dog_id'])
+                modified_dogs.append(dog.get_modified_data('dog_id', 'row_version'))
+            else:
+                saved_dog_ids.append(None)
+        statement_count += data_provider.update_dogs(modified_dogs)
+
+        saved_person_ids: list[Optional[int]] = []
+        modified_persons = []
+        for person in persons:
+            if person.is_insertion:
+                saved_person_ids.append(data_provider.insert_person(person.data, customer_id=customer_id))
+                statement_count += 1
+            elif person.is_modified:
+                saved_person_ids.append(person.data['person_id'])
+                modified_persons.append(person.get_modified_data('person_id', 'row_version'))
+            else:
+                saved_person_ids.append(None)
+        statement_count += data_provider.update_persons(modified_persons)
+
+        dog_row_versions = data_provider.get_row_versions('dog', [id_ for id_ in saved_dog_ids if id_ is not None])
+        person_row_versions = data_provider.get_row_versions(
+            'person', [id_ for id_ in saved_person_ids if id_ is not None])
+        return SavedCustomer(
+            customer_id=customer_id,
+            customer_row_version=customer_row_version,
+            dog_ids_and_row_versions=[(id_, dog_row_versions.get(id_)) for id_ in saved_dog_ids],
+            person_ids_and_row_versions=[(id_, person_row_versions.get(id_)) for id_ in saved_person_ids],
+            statement_count=statement_count,
+        )
 
     @classmethod
-    def __add_new_dog_tab(cls, dogs_tabs: list[bootstrap.Tab]) -> tuple[list[bootstrap.Tab], str]:
+    def __add_new_dog_tab(cls, dog_tabs: dict) -> tuple[Patch, str, dict]:
         new_dog_tab = Controller.make_dog_tab(
             dog=cls.__make_new_dog(),
             profile=DogProfile(
                 subscriptions=pd.DataFrame(),
                 single_classes=pd.DataFrame(),
             ), is_insertion=True)
-        dogs_tabs.insert(len(dogs_tabs) - 1, new_dog_tab)
         new_dog_id = new_dog_tab.tab_id
-        return dogs_tabs, new_dog_id
+        tabs_patch = Patch()
+        # Right before the add dog tab, which is always the last one
+        tabs_patch.insert(len(dog_tabs['tab_ids']), new_dog_tab)
+        dog_tabs['tab_ids'].append(new_dog_id)
+        dog_tabs['loaded_tab_ids'].append(new_dog_id)
+        return tabs_patch, new_dog_id, dog_tabs
 
-    @staticmethod
-    def __get_tab_id(tab: bootstrap.Tab):
-        return tab['props']['tab_id']
+    @classmethod
+    def __load_dog_tab(cls, tab_id: str, dog_tabs: dict) -> tuple[Patch, str, dict]:
+        customer_profile = cls.get_cached_profile_by_dog_id(dog_id=int(tab_id))
+        dogs = [dog for dog in customer_profile.customer.dogs if str(dog['dog_id']) == tab_id]
+        if len(dogs) != 1:
+            raise PreventUpdate(f'Could not find dog {tab_id} in the customer profile')
+        dog = dogs[0]
+        logger.debug(f'Loading tab of dog {tab_id}')
+        tabs_patch = Patch()
+        tabs_patch[dog_tabs['tab_ids'].index(tab_id)]['props']['children'] = cls.make_dog_tab_content(
+            dog=dog, profile=customer_profile.get_dog_profile(dog_id=dog['dog_id']), is_insertion=False)
+        dog_tabs['loaded_tab_ids'].append(tab_id)
+        return tabs_patch, no_update, dog_tabs
 
     @classmethod
-    def make_dog_tab(cls, dog: dict, profile: DogProfile, is_insertion: bool) -> bootstrap.Tab:
+    def make_dog_tab(cls, dog: dict, profile: Optional[DogProfile], is_insertion: bool) -> bootstrap.Tab:
+        """
+        :param profile: None to render a placeholder instead, whose content is loaded when the tab is activated.
+        """
         # TODO update label when name is changed
+        dog_id = dog['dog_id']
+        content = cls.make_dog_tab_content(dog, profile, is_insertion) \
+            if profile is not None \
+            else [html.Div(bootstrap.Spinner(size='sm'), className='p-3')]
+        return bootstrap.Tab(
+            content,
+            id=Ids.element('DogTab', dog_id),
+            className='p-3 border border-top-0 border-secondary',
+            label=dog['dog_name'],
+            tab_id=str(dog_id))
+
+    @classmethod
+    def make_dog_tab_content(cls, dog: dict, profile: DogProfile, is_insertion: bool) -> list:
         dog_id = dog['dog_id']
         dog_form = DictFormAIO(
             data=dog,
             fields_config=cls.dog_fields_config,
             is_insertion=is_insertion,
             form_id=cls.id_dog_form,
-            form_index=dog_id)
+            form_index=dog_id,
+            callback_mode=cls.form_callback_mode)
         subscriptions_table = cls.make_subscriptions_table(dog_id, profile.subscriptions) \
             if profile.subscriptions is not None and not profile.subscriptions.empty \
             else html.Div('No trainings yet.', className='p-3')
         single_classes_table = cls.make_single_classes_table(dog_id, profile.single_classes) \
             if profile.single_classes is not None and not profile.single_classes.empty \
             else html.Div('No single classes.', className='p-3')
-        return bootstrap.Tab(
-            [
-                dog_form,
-                html.H5('Trainings', className='mt-4'),
-                subscriptions_table,
-                html.H5('Single classes', className='mt-4'),
-                single_classes_table
-            ],
-            id=Ids.element('DogTab', dog_id),
-            className='p-3 border border-top-0 border-secondary',
-            label=dog['dog_name'],
-            tab_id=str(dog_id))
+        return [
+            dog_form,
+            html.H5('Trainings', className='mt-4'),
+            subscriptions_table,
+            html.H5('Single classes', className='mt-4'),
+            single_classes_table
+        ]
 
     @classmethod
     def make_subscriptions_table(cls, dog_id: int, subscriptions: pd.DataFrame) -> DataTable:
@@ -390,41 +511,11 @@ class Controller:
                 fields_config=Controller.person_fields_config,
                 is_insertion=is_insertion,
                 form_id=Controller.id_person_form,
-                form_index=person['person_id']),
+                form_index=person['person_id'],
+                callback_mode=Controller.form_callback_mode),
             id=Ids.element('PersonContainer', person['person_id']),
             className='mt-2 p-3 border border-secondary')
 
-    @staticmethod
-    @callback(Output(__id_field_dog_name, 'invalid'), Output(__id_feedback_dog_name, 'children'),
-              inputs=dict(dog_name=Input(__id_field_dog_name, 'value')))
-    def validate_dog_name(dog_name: str) -> tuple[bool, str]:
-        return Controller.__validate_required_field(dog_name)
-
-    @staticmethod
-    @callback(Output(__id_field_breed, 'invalid'), Output(__id_feedback_breed, 'children'),
-              inputs=dict(dog_breed=Input(__id_field_breed, 'value')))
-    def validate_dog_breed(dog_breed: str) -> tuple[bool, str]:
-        return Controller.__validate_required_field(dog_breed)
-
-    @staticmethod
-    @callback(Output(__id_field_person_name, 'invalid'), Output(__id_feedback_person_name, 'children'),
-              inputs=dict(person_name=Input(__id_field_person_name, 'value')))
-    def validate_person_name(person_name: str) -> tuple[bool, str]:
-        return Controller.__validate_required_field(person_name)
-
-    @staticmethod
-    @callback(Output(__id_field_email_address, 'invalid'), Output(__id_feedback_email_address, 'children'),
-              inputs=dict(email_address=Input(__id_field_email_address, 'value')))
-    def validate_email_address(email_address: str) -> tuple[bool, str]:
-        return Controller.__validate_required_field(email_address,
-                                                    'Field is required and must be a valid email address')
-
-    @staticmethod
-    def __validate_required_field(value: Optional[str], error_message: str = 'Field is required') -> tuple[bool, str]:
-        if not value:
-            return True, error_message
-        return False, ''
-
     @classmethod
     def make_new_profile(cls) -> CustomerProfile:
         return CustomerProfile(
@@ -449,22 +540,28 @@ class Controller:
             'person_id': cls.__generate_new_person_id(),
         }
 
-    @classmethod
-    def __generate_new_dog_id(cls) -> str:
-        cls.__last_new_dog_id += 1
-        return f'N{cls.__last_new_dog_id}'
+    # Random, unlike a counter: worker processes and threads need no shared state to generate them
+    @staticmethod
+    def __generate_new_dog_id() -> str:
+        return f'N{uuid.uuid4().hex}'
 
-    @classmethod
-    def __generate_new_person_id(cls) -> str:
-        cls.__last_new_person_id += 1
-        return f'N-{cls.__last_new_person_id}'
+    @staticmethod
+    def __generate_new_person_id() -> str:
+        return f'N-{uuid.uuid4().hex}'
+
+
+register_fields_config(Controller.id_customer_data_form, Controller.customer_data_fields_config)
+register_fields_config(Controller.id_dog_form, Controller.dog_fields_config)
+register_fields_config(Controller.id_person_form, Controller.person_fields_config)
+DataProvider.add_commit_listener(Controller.on_data_committed)
 
 
+@tracing.traced()
 def make_layout(dog_id: int) -> list:
     logger.debug(f'Making layout for dog_id={dog_id}')
     customer_profile, is_insertion = (Controller.make_new_profile(), True) \
         if dog_id is None \
-        else (Controller.get_profile_by_dog_id(dog_id=dog_id), False)
+        else (Controller.get_cached_profile_by_dog_id(dog_id=dog_id), False)
 
     logger.debug(f'Loaded customer profile: {customer_profile}')
     customer = customer_profile.customer
@@ -478,12 +575,21 @@ def make_layout(dog_id: int) -> list:
         label='+',
         tab_id=Controller.tab_id_add_dog_tab)
 
+    # Only the active dog tab is rendered, the others are loaded by Controller.on_active_tab_changed
     dogs_tabs = []
+    loaded_tab_ids = []
     for dog in customer.dogs:
         other_dog_id = dog['dog_id']
-        dog_profile = customer_profile.get_dog_profile(dog_id=other_dog_id)
+        is_active = is_insertion or str(other_dog_id) == str(dog_id)
+        dog_profile = customer_profile.get_dog_profile(dog_id=other_dog_id) if is_active else None
         dog_tab = Controller.make_dog_tab(dog=dog, profile=dog_profile, is_insertion=is_insertion)
         dogs_tabs.append(dog_tab)
+        if is_active:
+            loaded_tab_ids.append(dog_tab.tab_id)
+    dog_tabs_store = dcc.Store(id=Controller.id_dog_tabs_store, data={
+        'tab_ids': [dog_tab.tab_id for dog_tab in dogs_tabs],
+        'loaded_tab_ids': loaded_tab_ids,
+    })
     dogs_tabs.append(add_dog_tab)
 
     row_dogs_tabs = bootstrap.Row(
@@ -502,7 +608,8 @@ def make_layout(dog_id: int) -> list:
                     data=customer.customer_data,
                     fields_config=Controller.customer_data_fields_config,
                     is_insertion=is_insertion,
-                    form_id=Controller.id_customer_data_form),
+                    form_id=Controller.id_customer_data_form,
+                    callback_mode=Controller.form_callback_mode),
                 className='mt-2 p-3 border border-secondary'
             )
         )
@@ -530,7 +637,7 @@ def make_layout(dog_id: int) -> list:
             )
         )
     )
-    children = [row_dogs_tabs] + rows_persons + [row_customer_data, row_buttons]
+    children = [dog_tabs_store, row_dogs_tabs] + rows_persons + [row_customer_data, row_buttons]
     logger.debug(f'Done making layout.')
     return children
 
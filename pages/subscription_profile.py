@@ -4,12 +4,13 @@ from typing import Any, Optional
 
 import dash_bootstrap_components as bootstrap
 import pandas as pd
-from dash import callback, html, Input, Output, State
+from dash import callback, html, Input, no_update, Output, State
 from dash.exceptions import PreventUpdate
 
-from components.dict_form import DataStore as FormData, DictFormAIO, FieldType, Ids as FormIds
+from components.dict_form import DataStore as FormData, DictFormAIO, FieldType, Ids as FormIds, \
+    register_fields_config
 from components.page_callback import user_message_callback
-from controls import consts, utils
+from controls import consts, tracing, utils, write_queue
 from controls.data_provider import DataProvider
 from controls.types import UserMessage
 
@@ -43,7 +44,7 @@ class Controller:
     id_subscription_data_form = 'SubscriptionDataForm'
 
     def __enter__(self):
-        self.__data_provider = DataProvider()
+        self.__data_provider = DataProvider().__enter__()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -56,26 +57,21 @@ class Controller:
         return self.__data_provider.get_classes_by_subscription_id(subscription_id=subscription_id)
 
     def get_training_options(self) -> list[dict]:
-        trainings_df = self.__data_provider.get_all_trainings()
-        trainings: pd.Series = trainings_df.apply(lambda row: {
-            'label': f'{row["name"]} (€ {row["price"]:.2f})',
-            'value': row["training_id"],
-        }, axis=1)
-        return trainings.to_list()
+        return self.__data_provider.get_training_options()
 
     @staticmethod
     @callback(
         Output(id_main_container, 'children'),
         inputs=dict(
             reset_button_clicks=Input(id_reset_button, 'n_clicks'),
-            subscription_data_json=State(FormIds.form_data_store(id_subscription_data_form), 'data'),
+            subscription_data_store=State(FormIds.form_data_store(id_subscription_data_form), 'data'),
         ),
         prevent_initial_call=True
     )
-    def reset_data(reset_button_clicks: int, subscription_data_json: str):
+    def reset_data(reset_button_clicks: int, subscription_data_store: dict):
         if not reset_button_clicks:
             raise PreventUpdate
-        subscription_data = FormData.from_json(subscription_data_json)
+        subscription_data = FormData.from_store(subscription_data_store)
         subscription_id = subscription_data.get_field_value('subscription_id')
         assert subscription_id is not None
         return make_layout(subscription_id)
@@ -84,36 +80,49 @@ class Controller:
     @user_message_callback(
         inputs=dict(
             save_button_clicks=Input(id_save_button, 'n_clicks'),
-            subscription_data_json=State(FormIds.form_data_store(id_subscription_data_form), 'data'),
-        )
+            subscription_data_store=State(FormIds.form_data_store(id_subscription_data_form), 'data'),
+        ),
+        extra_outputs=(Output(FormIds.form_data_store(id_subscription_data_form), 'data', allow_duplicate=True),)
     )
-    def save_subscription(save_button_clicks: int, subscription_data_json: str) -> UserMessage:
+    def save_subscription(save_button_clicks: int, subscription_data_store: dict) -> tuple[UserMessage, Any]:
         if not save_button_clicks:
             raise PreventUpdate
 
         logger.info('Saving subscription...')
-        logger.debug(f'subscription_data={subscription_data_json}')
+        logger.debug(f'subscription_data={subscription_data_store}')
 
         # TODO current price (readonly) vs new price, update customer balance
-        with DataProvider() as data_provider:
-            try:
-                subscription_data = FormData.from_json(subscription_data_json)
-                logger.info(f'Validating subscription data: {subscription_data.data}')
-                subscription_data.validate()
-                if subscription_data.is_insertion:
-                    subscription_id = data_provider.insert_subscription(subscription_data.data)
-                else:
-                    subscription_id = subscription_data.data['subscription_id']
-                    data_provider.update_subscription(subscription_data.data)
-                logger.info(f'Saved subscription {subscription_id}')
-
-                data_provider.commit()
-                return UserMessage(message='Subscription saved successfully', header='Success', type='success')
-            except RuntimeError as e:
-                data_provider.rollback()
-                return UserMessage(message=f'Error saving subscription: {e}', header='Error', type='danger')
+        try:
+            subscription_data = FormData.from_store(subscription_data_store)
+            logger.info(f'Validating subscription data: {subscription_data.data}')
+            subscription_data.validate()
+            subscription_id, row_version = write_queue.run(lambda data_provider: Controller.__write_subscription(
+                data_provider, subscription_data), name='save_subscription')
+            logger.info(f'Saved subscription {subscription_id}')
+            # See save_training
+            saved_patch = FormData.make_saved_patch({'subscription_id': subscription_id, 'row_version': row_version})
+            return UserMessage(message='Subscription saved successfully', header='Success', type='success'), \
+                saved_patch
+        except RuntimeError as e:
+            return UserMessage(message=f'Error saving subscription: {e}', header='Error', type='danger'), no_update
+
+    @staticmethod
+    def __write_subscription(data_provider: DataProvider, subscription_data: FormData) -> tuple[int, int]:
+        """
+        :return: id and row_version of the subscription.
+        """
+        if subscription_data.is_insertion:
+            subscription_id = data_provider.insert_subscription(subscription_data.data)
+        else:
+            subscription_id = subscription_data.data['subscription_id']
+            data_provider.update_subscription(subscription_data.data)
+        return subscription_id, data_provider.get_row_versions('subscription', [subscription_id])[subscription_id]
+
+
+register_fields_config(Controller.id_subscription_data_form, Controller.subscription_data_fields_config)
 
 
+@tracing.traced()
 def make_layout(subscription_id: Optional[int]) -> list:
     logger.debug(f'Making layout for subscription_id={subscription_id}')
     with Controller() as control:
@@ -127,8 +136,10 @@ def make_layout(subscription_id: Optional[int]) -> list:
 
         training_options = control.get_training_options()
         logger.debug(f'Loaded {len(training_options)} training options')
-        form_data_fields = control.subscription_data_fields_config.copy()
-        form_data_fields['training_id']['options'] = training_options
+        # The shared config is left as is: requests render concurrently
+        fields_config = control.subscription_data_fields_config
+        form_data_fields = {**fields_config,
+                            'training_id': {**fields_config['training_id'], 'options': training_options}}
         # TODO onChange, automatically set new price (client-side pls)
 
         classes_df = control.get_classes_by_subscription_id(subscription_id=subscription_id)
@@ -1,11 +1,11 @@
 from typing import Any
 
-import pandas as pd
-from dash import dash_table, html, Input, State
+from dash import callback, dash_table, dcc, html, Input, Output, State
 from dash.exceptions import PreventUpdate
 
 from components.page_callback import change_page_callback, MultiPageCallbackData, Pages
 from controls.data_provider import DataProvider
+from controls.table_query import TableQuery, update_page_keys
 
 
 class Ids:
@@ -28,49 +28,61 @@ class Controller:
     ]
 
     id_trainings_data_table = Ids.element('DataTable', 'trainings')
+    id_page_keys_store = Ids.element('Store', 'trainings-page-keys')
 
     page_size = 10
 
     @staticmethod
-    def load_trainings() -> list[dict]:
+    @callback(
+        Output(id_trainings_data_table, 'data'),
+        Output(id_trainings_data_table, 'page_count'),
+        Output(id_page_keys_store, 'data'),
+        inputs=dict(
+            page_current=Input(id_trainings_data_table, 'page_current'),
+            page_size=Input(id_trainings_data_table, 'page_size'),
+            sort_by=Input(id_trainings_data_table, 'sort_by'),
+            filter_query=Input(id_trainings_data_table, 'filter_query'),
+            page_keys=State(id_page_keys_store, 'data'),
+        )
+    )
+    def load_trainings_page(page_current: int, page_size: int, sort_by: list[dict], filter_query: str,
+                            page_keys: dict) -> tuple[list[dict], int, dict]:
+        table_query = TableQuery.from_table_state(page_current, page_size, sort_by, filter_query, page_keys)
+        column_types = {column['id']: column.get('type', 'text') for column in Controller.trainings_columns}
         with DataProvider() as data_provider:
-            trainings_df = data_provider.get_all_trainings()
-            return trainings_df.to_dict('records')
+            page = data_provider.get_trainings_page(table_query, column_types)
+        return page.records, page.page_count, update_page_keys(page_keys, table_query, page)
 
     @staticmethod
     @change_page_callback(
         new_page=Pages.training_profile_path_param,
         inputs=dict(
             active_cell=Input(id_trainings_data_table, 'active_cell'),
-            table_data=State(id_trainings_data_table, 'data'),
         )
     )
-    def on_cell_clicked(active_cell: dict, table_data: dict) -> MultiPageCallbackData:
+    def on_cell_clicked(active_cell: dict) -> MultiPageCallbackData:
         if not active_cell:
             raise PreventUpdate
-        # FIXME doesn't work with filters
-        row = active_cell['row']
-        trainings_df = pd.DataFrame.from_records(table_data)
-        training_id = trainings_df.at[row, 'training_id']
-        return MultiPageCallbackData(page_param_value=training_id)
+        # Rows have the training id as row id, whatever the page, sort or filter
+        return MultiPageCallbackData(page_param_value=active_cell['row_id'])
 
 
 def layout() -> html.Div:
-    trainings = Controller.load_trainings()
-
+    # Rows are loaded one page at a time by Controller.load_trainings_page
     return html.Div([
+        dcc.Store(id=Controller.id_page_keys_store),
         dash_table.DataTable(
             id=Controller.id_trainings_data_table,
-            data=trainings,
+            data=[],
             columns=Controller.trainings_columns,
             editable=False,
             row_deletable=False,
             row_selectable=False,
-            filter_action='native',
+            filter_action='custom',
             filter_options={'case': 'insensitive'},
-            sort_action='native',
+            sort_action='custom',
             sort_mode="multi",
-            page_action="native",
+            page_action="custom",
             page_current=0,
             page_size=Controller.page_size,
             css=[{"selector": ".row", "rule": "margin: 0; display: block"}],
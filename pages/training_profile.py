@@ -3,11 +3,13 @@ from typing import Any, Optional
 
 import dash_bootstrap_components as bootstrap
 import pandas as pd
-from dash import callback, html, Input, Output, State
+from dash import callback, html, Input, no_update, Output, State
 from dash.exceptions import PreventUpdate
 
-from components.dict_form import DataStore as FormData, DictFormAIO, FieldType, Ids as FormIds
+from components.dict_form import DataStore as FormData, DictFormAIO, FieldType, Ids as FormIds, \
+    register_fields_config
 from components.page_callback import user_message_callback
+from controls import tracing, write_queue
 from controls.data_provider import DataProvider
 from controls.types import UserMessage
 
@@ -50,14 +52,14 @@ class Controller:
         Output(id_main_container, 'children'),
         inputs=dict(
             reset_button_clicks=Input(id_reset_button, 'n_clicks'),
-            training_data_json=State(FormIds.form_data_store(id_training_data_form), 'data'),
+            training_data_store=State(FormIds.form_data_store(id_training_data_form), 'data'),
         ),
         prevent_initial_call=True
     )
-    def reset_data(reset_button_clicks: int, training_data_json: str):
+    def reset_data(reset_button_clicks: int, training_data_store: dict):
         if not reset_button_clicks:
             raise PreventUpdate
-        training_data = FormData.from_json(training_data_json)
+        training_data = FormData.from_store(training_data_store)
         training_id = training_data.get_field_value('training_id')
         assert training_id is not None
         return make_layout(training_id)
@@ -66,35 +68,47 @@ class Controller:
     @user_message_callback(
         inputs=dict(
             save_button_clicks=Input(id_save_button, 'n_clicks'),
-            training_data_json=State(FormIds.form_data_store(id_training_data_form), 'data'),
-        )
+            training_data_store=State(FormIds.form_data_store(id_training_data_form), 'data'),
+        ),
+        extra_outputs=(Output(FormIds.form_data_store(id_training_data_form), 'data', allow_duplicate=True),)
     )
-    def save_training(save_button_clicks: int, training_data_json: str) -> UserMessage:
+    def save_training(save_button_clicks: int, training_data_store: dict) -> tuple[UserMessage, Any]:
         if not save_button_clicks:
             raise PreventUpdate
 
         logger.info('Saving training...')
-        logger.debug(f'training_data={training_data_json}')
+        logger.debug(f'training_data={training_data_store}')
+
+        try:
+            training_data = FormData.from_store(training_data_store)
+            logger.info(f'Validating training data: {training_data.data}')
+            training_data.validate()
+            training_id, row_version = write_queue.run(lambda data_provider: Controller.__write_training(
+                data_provider, training_data), name='save_training')
+            logger.info(f'Saved training {training_id}')
+            # The form must update the saved row_version, or saving it again would be seen as a conflict
+            saved_patch = FormData.make_saved_patch({'training_id': training_id, 'row_version': row_version})
+            return UserMessage(message='Training saved successfully', header='Success', type='success'), saved_patch
+        except RuntimeError as e:
+            return UserMessage(message=f'Error saving training: {e}', header='Error', type='danger'), no_update
 
-        with DataProvider() as data_provider:
-            try:
-                training_data = FormData.from_json(training_data_json)
-                logger.info(f'Validating training data: {training_data.data}')
-                training_data.validate()
-                if training_data.is_insertion:
-                    training_id = data_provider.insert_training(training_data.data)
-                else:
-                    training_id = training_data.data['training_id']
-                    data_provider.update_training(training_data.data)
-                logger.info(f'Saved training {training_id}')
-
-                data_provider.commit()
-                return UserMessage(message='Training saved successfully', header='Success', type='success')
-            except RuntimeError as e:
-                data_provider.rollback()
-                return UserMessage(message=f'Error saving training: {e}', header='Error', type='danger')
+    @staticmethod
+    def __write_training(data_provider: DataProvider, training_data: FormData) -> tuple[int, int]:
+        """
+        :return: id and row_version of the training.
+        """
+        if training_data.is_insertion:
+            training_id = data_provider.insert_training(training_data.data)
+        else:
+            training_id = training_data.data['training_id']
+            data_provider.update_training(training_data.data)
+        return training_id, data_provider.get_row_versions('training', [training_id])[training_id]
+
+
+register_fields_config(Controller.id_training_data_form, Controller.training_data_fields_config)
 
 
+@tracing.traced()
 def make_layout(training_id: Optional[int]) -> list:
     logger.debug(f'Making layout for training_id={training_id}')
     training_df, is_insertion = (pd.DataFrame(), True) \
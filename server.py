@@ -0,0 +1,276 @@
+"""
+Production server: serves the app with pre-forked worker processes, each handling requests in a bounded number of
+threads. Only uses the standard library (wsgiref). Usage:
+
+    python server.py [--host HOST] [--port PORT] [--workers N] [--threads N]
+
+Signals sent to the main process:
+  * SIGTERM, SIGINT: graceful shutdown. Workers stop accepting connections and finish the requests in progress.
+  * SIGHUP: graceful restart. New workers are started, then the old ones are shut down gracefully.
+
+GET /ready answers 200 while a worker can serve requests (the database is reachable), 503 otherwise (e.g. shutting
+down), for load balancers and orchestrators.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from socketserver import ThreadingMixIn
+from typing import Optional
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+import config
+from app import app
+from controls import metrics, shared_cache, sqlite_config
+from controls.data_provider import DataProvider
+
+logger = logging.getLogger(__name__)
+
+# Set when this worker is shutting down, so that load balancers stop sending it requests
+_draining = threading.Event()
+
+
+@app.server.route('/ready')
+def ready():
+    if _draining.is_set():
+        return 'Shutting down', 503
+    try:
+        with DataProvider() as data_provider:
+            data_provider.ping()
+    except Exception as e:
+        logger.warning(f'Not ready: {e}')
+        return 'Database unavailable', 503
+    return 'Ready', 200
+
+
+class RequestHandler(WSGIRequestHandler):
+    # Connections idle (or sending their request) for longer are closed
+    timeout = config.server_request_timeout_seconds
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(f'{self.address_string()} {format % args}')
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    """
+    WSGI server handling each request in its own thread, at most max_threads at a time. Waits for the requests in
+    progress when closed.
+    """
+    daemon_threads = False
+    block_on_close = True
+
+    def __init__(self, server_address, max_threads: int, listening_socket: Optional[socket.socket] = None) -> None:
+        # Workers share the socket created by the main process, instead of binding their own
+        super().__init__(server_address, RequestHandler, bind_and_activate=listening_socket is None)
+        if listening_socket is not None:
+            self.socket.close()
+            self.socket = listening_socket
+            self.server_bind_done()
+        self.__request_slots = threading.BoundedSemaphore(max_threads)
+
+    def server_bind_done(self) -> None:
+        # What WSGIServer.server_bind sets up, besides binding
+        host, port = self.socket.getsockname()[:2]
+        self.server_name = socket.getfqdn(host)
+        self.server_port = port
+        self.setup_environ()
+
+    def process_request(self, request, client_address) -> None:
+        # Waits for a free thread, leaving further connections in the listen backlog (or to other workers)
+        self.__request_slots.acquire()
+        super().process_request(request, client_address)
+
+    def process_request_thread(self, request, client_address) -> None:
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.__request_slots.release()
+
+
+def make_listening_socket(host: str, port: int) -> socket.socket:
+    listening_socket = socket.create_server((host, port), backlog=config.server_listen_backlog)
+    listening_socket.set_inheritable(True)
+    return listening_socket
+
+
+def serve_worker(listening_socket: socket.socket, threads: int) -> None:
+    """
+    Runs in a worker process until it receives SIGTERM.
+    """
+    server = ThreadingWSGIServer(listening_socket.getsockname()[:2], max_threads=threads,
+                                 listening_socket=listening_socket)
+    server.set_app(app.server)
+
+    def shut_down(signum, frame) -> None:
+        logger.info(f'Worker {os.getpid()} shutting down...')
+        _draining.set()
+        # shutdown() waits for serve_forever to return: it must not be called from the thread running it
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, shut_down)
+    signal.signal(signal.SIGINT, shut_down)
+    # Restarts are handled by the main process
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    logger.info(f'Worker {os.getpid()} serving with {threads} threads')
+    try:
+        server.serve_forever()
+    finally:
+        # Waits for the requests in progress
+        server.server_close()
+        metrics.publish_stopped()
+        DataProvider.close_pool()
+        logger.info(f'Worker {os.getpid()} stopped')
+
+
+class Arbiter:
+    """
+    Main process: starts the workers, replaces the ones that die, and restarts or stops them on signals.
+    """
+
+    def __init__(self, listening_socket: socket.socket, workers: int, threads: int) -> None:
+        self.__listening_socket = listening_socket
+        self.__worker_count = workers
+        self.__threads = threads
+        self.__worker_pids: set[int] = set()
+        self.__is_stopping = False
+        self.__is_restart_requested = False
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.__on_stop)
+        signal.signal(signal.SIGINT, self.__on_stop)
+        signal.signal(signal.SIGHUP, self.__on_restart)
+        # Connections of the main process must not be shared with the workers
+        DataProvider.close_pool()
+        self.__spawn_workers()
+        while not self.__is_stopping:
+            if self.__is_restart_requested:
+                self.__is_restart_requested = False
+                self.__restart_workers()
+            self.__reap_workers()
+            if not self.__is_stopping:
+                self.__spawn_workers()
+            time.sleep(0.5)
+        self.__stop_workers(self.__worker_pids)
+
+    def __on_stop(self, signum, frame) -> None:
+        logger.info(f'Received signal {signum}: stopping')
+        self.__is_stopping = True
+
+    def __on_restart(self, signum, frame) -> None:
+        logger.info('Received SIGHUP: restarting workers')
+        self.__is_restart_requested = True
+
+    def __spawn_workers(self) -> None:
+        while len(self.__worker_pids) < self.__worker_count:
+            self.__worker_pids.add(self.__spawn_worker())
+
+    def __spawn_worker(self) -> int:
+        pid = os.fork()
+        if pid != 0:
+            logger.info(f'Started worker {pid}')
+            return pid
+        exit_code = 0
+        try:
+            serve_worker(self.__listening_socket, self.__threads)
+        except BaseException:
+            logger.exception(f'Worker {os.getpid()} failed')
+            exit_code = 1
+        finally:
+            logging.shutdown()
+            os._exit(exit_code)
+
+    def __restart_workers(self) -> None:
+        old_pids = set(self.__worker_pids)
+        self.__worker_pids = set()
+        # New workers accept connections while the old ones finish their requests
+        self.__spawn_workers()
+        self.__stop_workers(old_pids)
+
+    def __reap_workers(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.__worker_pids:
+                logger.warning(f'Worker {pid} exited with status {status}, replacing it')
+                self.__worker_pids.discard(pid)
+
+    @staticmethod
+    def __stop_workers(pids: set[int]) -> None:
+        for pid in pids:
+            Arbiter.__signal_worker(pid, signal.SIGTERM)
+        deadline = time.monotonic() + config.server_graceful_timeout_seconds
+        remaining = set(pids)
+        while remaining and time.monotonic() < deadline:
+            for pid in list(remaining):
+                try:
+                    if os.waitpid(pid, os.WNOHANG)[0] != 0:
+                        remaining.discard(pid)
+                except ChildProcessError:
+                    remaining.discard(pid)
+            time.sleep(0.1)
+        for pid in remaining:
+            logger.warning(f'Worker {pid} did not stop within {config.server_graceful_timeout_seconds}s, killing it')
+            Arbiter.__signal_worker(pid, signal.SIGKILL)
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+
+    @staticmethod
+    def __signal_worker(pid: int, signum: int) -> None:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+
+def prepare_shared_cache() -> None:
+    """
+    Workers must share their cache: the in-process caches of a worker are not invalidated by the writes of the others.
+    """
+    if not config.shared_cache_file:
+        config.shared_cache_file = f'{os.path.splitext(config.database_file)[0]}_cache.db'
+    # Entries of a previous run may predate changes made to the database while the server was down
+    shared_cache.remove_store_file(config.shared_cache_file)
+    logger.info(f'Workers share the cache {config.shared_cache_file}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Serves the app with pre-forked worker processes.')
+    parser.add_argument('--host', default=config.server_host)
+    parser.add_argument('--port', type=int, default=config.server_port)
+    parser.add_argument('--workers', type=int, default=config.server_workers)
+    parser.add_argument('--threads', type=int, default=config.server_threads, help='threads per worker')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format='%(asctime)s,%(msecs)03d %(process)d %(levelname)-8s [%(filename)s:%(lineno)d] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        level=logging.INFO)
+    is_multi_process = hasattr(os, 'fork') and args.workers > 1
+    if is_multi_process:
+        if config.database_file == sqlite_config.IN_MEMORY_DATABASE:
+            parser.error('several workers need a database file: each one would have its own in-memory database')
+        prepare_shared_cache()
+
+    listening_socket = make_listening_socket(args.host, args.port)
+    logger.info(f'Listening on {args.host}:{args.port} with {args.workers} worker(s) of {args.threads} thread(s)')
+    if not is_multi_process:
+        # Single process, e.g. on Windows
+        serve_worker(listening_socket, args.threads)
+        return
+    Arbiter(listening_socket, args.workers, args.threads).run()
+    listening_socket.close()
+    logger.info('Stopped')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
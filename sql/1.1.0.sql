@@ -0,0 +1,14 @@
+-- Foreign-key and lookup indexes
+CREATE INDEX idx_person_customer_id ON person(customer_id);
+
+CREATE INDEX idx_dog_customer_id ON dog(customer_id);
+
+CREATE INDEX idx_subscription_dog_id ON subscription(dog_id);
+
+CREATE INDEX idx_subscription_training_id ON subscription(training_id);
+
+CREATE INDEX idx_class_subscription_id ON class(subscription_id);
+
+CREATE INDEX idx_class_dog_id ON class(dog_id);
+
+CREATE INDEX idx_payment_customer_id ON payment(customer_id);
@@ -0,0 +1,40 @@
+-- Classes taken per subscription, kept up to date by the triggers on class below
+ALTER TABLE subscription ADD COLUMN taken_classes_online INTEGER NOT NULL DEFAULT 0;
+
+ALTER TABLE subscription ADD COLUMN taken_classes_in_person INTEGER NOT NULL DEFAULT 0;
+
+UPDATE subscription SET
+    taken_classes_online = (
+        SELECT COUNT(*) FROM class c WHERE c.subscription_id = subscription.subscription_id AND c.is_online),
+    taken_classes_in_person = (
+        SELECT COUNT(*) FROM class c WHERE c.subscription_id = subscription.subscription_id AND NOT c.is_online);
+
+CREATE TRIGGER trg_class_insert_taken_classes AFTER INSERT ON class
+WHEN NEW.subscription_id IS NOT NULL
+BEGIN
+    UPDATE subscription SET
+        taken_classes_online = taken_classes_online + (NEW.is_online != 0),
+        taken_classes_in_person = taken_classes_in_person + (NEW.is_online = 0)
+    WHERE subscription_id = NEW.subscription_id;
+END;
+
+CREATE TRIGGER trg_class_delete_taken_classes AFTER DELETE ON class
+WHEN OLD.subscription_id IS NOT NULL
+BEGIN
+    UPDATE subscription SET
+        taken_classes_online = taken_classes_online - (OLD.is_online != 0),
+        taken_classes_in_person = taken_classes_in_person - (OLD.is_online = 0)
+    WHERE subscription_id = OLD.subscription_id;
+END;
+
+CREATE TRIGGER trg_class_update_taken_classes AFTER UPDATE OF subscription_id, is_online ON class
+BEGIN
+    UPDATE subscription SET
+        taken_classes_online = taken_classes_online - (OLD.is_online != 0),
+        taken_classes_in_person = taken_classes_in_person - (OLD.is_online = 0)
+    WHERE subscription_id = OLD.subscription_id;
+    UPDATE subscription SET
+        taken_classes_online = taken_classes_online + (NEW.is_online != 0),
+        taken_classes_in_person = taken_classes_in_person + (NEW.is_online = 0)
+    WHERE subscription_id = NEW.subscription_id;
+END;
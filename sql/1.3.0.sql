@@ -0,0 +1,95 @@
+-- Full-text search over customers, their dogs and persons: one document per customer, with rowid = customer_id
+CREATE VIEW customer_search_document AS
+SELECT
+    c.customer_id,
+    c.address,
+    c.notes AS customer_notes,
+    (SELECT group_concat(d.name, ' ') FROM dog d WHERE d.customer_id = c.customer_id) AS dog_names,
+    (SELECT group_concat(d.breed, ' ') FROM dog d WHERE d.customer_id = c.customer_id) AS dog_breeds,
+    (SELECT group_concat(d.notes, ' ') FROM dog d WHERE d.customer_id = c.customer_id) AS dog_notes,
+    (SELECT group_concat(p.name, ' ') FROM person p WHERE p.customer_id = c.customer_id) AS person_names,
+    -- Phones are also indexed as digits only, so "0634" finds "06 34567891"
+    (SELECT group_concat(
+        p.phone1 || ' ' || replace(replace(replace(p.phone1, ' ', ''), '-', ''), '+', '') || ' ' ||
+        IFNULL(p.phone2 || ' ' || replace(replace(replace(p.phone2, ' ', ''), '-', ''), '+', ''), ''), ' ')
+     FROM person p WHERE p.customer_id = c.customer_id) AS phones,
+    (SELECT group_concat(p.email_address, ' ') FROM person p WHERE p.customer_id = c.customer_id) AS email_addresses
+FROM customer c;
+
+CREATE VIRTUAL TABLE customer_search USING fts5(
+    address, customer_notes, dog_names, dog_breeds, dog_notes, person_names, phones, email_addresses,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+INSERT INTO customer_search (rowid, address, customer_notes, dog_names, dog_breeds, dog_notes, person_names, phones,
+                             email_addresses)
+SELECT * FROM customer_search_document;
+
+CREATE TRIGGER trg_customer_insert_search AFTER INSERT ON customer
+BEGIN
+    INSERT INTO customer_search (rowid, address, customer_notes, dog_names, dog_breeds, dog_notes, person_names,
+                                 phones, email_addresses)
+    SELECT * FROM customer_search_document WHERE customer_id = NEW.customer_id;
+END;
+
+CREATE TRIGGER trg_customer_update_search AFTER UPDATE OF address, notes ON customer
+BEGIN
+    DELETE FROM customer_search WHERE rowid = NEW.customer_id;
+    INSERT INTO customer_search (rowid, address, customer_notes, dog_names, dog_breeds, dog_notes, person_names,
+                                 phones, email_addresses)
+    SELECT * FROM customer_search_document WHERE customer_id = NEW.customer_id;
+END;
+
+CREATE TRIGGER trg_customer_delete_search AFTER DELETE ON customer
+BEGIN
+    DELETE FROM customer_search WHERE rowid = OLD.customer_id;
+END;
+
+CREATE TRIGGER trg_dog_insert_search AFTER INSERT ON dog
+BEGIN
+    DELETE FROM customer_search WHERE rowid = NEW.customer_id;
+    INSERT INTO customer_search (rowid, address, customer_notes, dog_names, dog_breeds, dog_notes, person_names,
+                                 phones, email_addresses)
+    SELECT * FROM customer_search_document WHERE customer_id = NEW.customer_id;
+END;
+
+CREATE TRIGGER trg_dog_update_search AFTER UPDATE OF customer_id, name, breed, notes ON dog
+BEGIN
+    DELETE FROM customer_search WHERE rowid IN (OLD.customer_id, NEW.customer_id);
+    INSERT INTO customer_search (rowid, address, customer_notes, dog_names, dog_breeds, dog_notes, person_names,
+                                 phones, email_addresses)
+    SELECT * FROM customer_search_document WHERE customer_id IN (OLD.customer_id, NEW.customer_id);
+END;
+
+CREATE TRIGGER trg_dog_delete_search AFTER DELETE ON dog
+BEGIN
+    DELETE FROM customer_search WHERE rowid = OLD.customer_id;
+    INSERT INTO customer_search (rowid, address, customer_notes, dog_names, dog_breeds, dog_notes, person_names,
+                                 phones, email_addresses)
+    SELECT * FROM customer_search_document WHERE customer_id = OLD.customer_id;
+END;
+
+CREATE TRIGGER trg_person_insert_search AFTER INSERT ON person
+BEGIN
+    DELETE FROM customer_search WHERE rowid = NEW.customer_id;
+    INSERT INTO customer_search (rowid, address, customer_notes, dog_names, dog_breeds, dog_notes, person_names,
+                                 phones, email_addresses)
+    SELECT * FROM customer_search_document WHERE customer_id = NEW.customer_id;
+END;
+
+CREATE TRIGGER trg_person_update_search AFTER UPDATE OF customer_id, name, phone1, phone2, email_address ON person
+BEGIN
+    DELETE FROM customer_search WHERE rowid IN (OLD.customer_id, NEW.customer_id);
+    INSERT INTO customer_search (rowid, address, customer_notes, dog_names, dog_breeds, dog_notes, person_names,
+                                 phones, email_addresses)
+    SELECT * FROM customer_search_document WHERE customer_id IN (OLD.customer_id, NEW.customer_id);
+END;
+
+CREATE TRIGGER trg_person_delete_search AFTER DELETE ON person
+BEGIN
+    DELETE FROM customer_search WHERE rowid = OLD.customer_id;
+    INSERT INTO customer_search (rowid, address, customer_notes, dog_names, dog_breeds, dog_notes, person_names,
+                                 phones, email_addresses)
+    SELECT * FROM customer_search_document WHERE customer_id = OLD.customer_id;
+END;
@@ -0,0 +1,94 @@
+-- Pre-formatted customer list, one row per dog, kept up to date by the triggers below
+CREATE VIEW customer_list_summary_source AS
+SELECT
+    d.dog_id,
+    c.customer_id,
+    d.name AS dog_name,
+    d.birth_date,
+    d.breed,
+    d.is_male,
+    CASE WHEN d.is_male THEN 'Male' ELSE 'Female' END AS sex,
+    c.balance_in_eur,
+    c.address,
+    group_concat(p.name, ', ') AS owners,
+    group_concat(DISTINCT p.phone1) AS phones1,
+    group_concat(DISTINCT p.phone2) AS phones2,
+    group_concat(DISTINCT p.email_address) AS email_addresses
+FROM dog d
+INNER JOIN customer c USING(customer_id)
+INNER JOIN person p USING(customer_id)
+GROUP BY d.dog_id, c.customer_id;
+
+CREATE TABLE customer_list_summary (
+    dog_id INTEGER PRIMARY KEY,
+    customer_id INTEGER NOT NULL,
+    dog_name TEXT,
+    birth_date DATE,
+    breed TEXT,
+    is_male BOOLEAN,
+    sex TEXT,
+    balance_in_eur REAL,
+    address TEXT,
+    owners TEXT,
+    phones1 TEXT,
+    phones2 TEXT,
+    email_addresses TEXT
+);
+
+CREATE INDEX idx_customer_list_summary_customer_id ON customer_list_summary(customer_id);
+
+CREATE INDEX idx_customer_list_summary_dog_name ON customer_list_summary(dog_name, dog_id);
+
+CREATE INDEX idx_customer_list_summary_balance_in_eur ON customer_list_summary(balance_in_eur, dog_id);
+
+INSERT INTO customer_list_summary SELECT * FROM customer_list_summary_source;
+
+CREATE TRIGGER trg_customer_update_list_summary AFTER UPDATE OF address, balance_in_eur ON customer
+BEGIN
+    UPDATE customer_list_summary SET
+        address = NEW.address,
+        balance_in_eur = NEW.balance_in_eur
+    WHERE customer_id = NEW.customer_id;
+END;
+
+CREATE TRIGGER trg_customer_delete_list_summary AFTER DELETE ON customer
+BEGIN
+    DELETE FROM customer_list_summary WHERE customer_id = OLD.customer_id;
+END;
+
+CREATE TRIGGER trg_dog_insert_list_summary AFTER INSERT ON dog
+BEGIN
+    INSERT INTO customer_list_summary SELECT * FROM customer_list_summary_source WHERE dog_id = NEW.dog_id;
+END;
+
+CREATE TRIGGER trg_dog_update_list_summary AFTER UPDATE OF customer_id, name, birth_date, breed, is_male ON dog
+BEGIN
+    DELETE FROM customer_list_summary WHERE dog_id = OLD.dog_id;
+    INSERT INTO customer_list_summary SELECT * FROM customer_list_summary_source WHERE dog_id = NEW.dog_id;
+END;
+
+CREATE TRIGGER trg_dog_delete_list_summary AFTER DELETE ON dog
+BEGIN
+    DELETE FROM customer_list_summary WHERE dog_id = OLD.dog_id;
+END;
+
+CREATE TRIGGER trg_person_insert_list_summary AFTER INSERT ON person
+BEGIN
+    DELETE FROM customer_list_summary WHERE customer_id = NEW.customer_id;
+    INSERT INTO customer_list_summary
+    SELECT * FROM customer_list_summary_source WHERE customer_id = NEW.customer_id;
+END;
+
+CREATE TRIGGER trg_person_update_list_summary AFTER UPDATE OF customer_id, name, phone1, phone2, email_address ON person
+BEGIN
+    DELETE FROM customer_list_summary WHERE customer_id IN (OLD.customer_id, NEW.customer_id);
+    INSERT INTO customer_list_summary
+    SELECT * FROM customer_list_summary_source WHERE customer_id IN (OLD.customer_id, NEW.customer_id);
+END;
+
+CREATE TRIGGER trg_person_delete_list_summary AFTER DELETE ON person
+BEGIN
+    DELETE FROM customer_list_summary WHERE customer_id = OLD.customer_id;
+    INSERT INTO customer_list_summary
+    SELECT * FROM customer_list_summary_source WHERE customer_id = OLD.customer_id;
+END;
@@ -0,0 +1,46 @@
+-- Version of each row, bumped by the triggers below whenever a user-editable column changes. Updates made by the
+-- application check it (optimistic concurrency), and caches compare it to know whether what they hold is fresh.
+ALTER TABLE customer ADD COLUMN row_version INTEGER NOT NULL DEFAULT 1;
+
+ALTER TABLE dog ADD COLUMN row_version INTEGER NOT NULL DEFAULT 1;
+
+ALTER TABLE person ADD COLUMN row_version INTEGER NOT NULL DEFAULT 1;
+
+ALTER TABLE training ADD COLUMN row_version INTEGER NOT NULL DEFAULT 1;
+
+ALTER TABLE subscription ADD COLUMN row_version INTEGER NOT NULL DEFAULT 1;
+
+ALTER TABLE class ADD COLUMN row_version INTEGER NOT NULL DEFAULT 1;
+
+-- row_version itself is not in the column lists, so the triggers do not fire again on their own update
+CREATE TRIGGER trg_customer_row_version AFTER UPDATE OF address, balance_in_eur, notes ON customer
+BEGIN
+    UPDATE customer SET row_version = OLD.row_version + 1 WHERE customer_id = NEW.customer_id;
+END;
+
+CREATE TRIGGER trg_dog_row_version AFTER UPDATE OF customer_id, name, birth_date, breed, is_male, notes ON dog
+BEGIN
+    UPDATE dog SET row_version = OLD.row_version + 1 WHERE dog_id = NEW.dog_id;
+END;
+
+CREATE TRIGGER trg_person_row_version AFTER UPDATE OF customer_id, name, phone1, phone2, email_address ON person
+BEGIN
+    UPDATE person SET row_version = OLD.row_version + 1 WHERE person_id = NEW.person_id;
+END;
+
+CREATE TRIGGER trg_training_row_version
+AFTER UPDATE OF name, price, classes_online, classes_in_person, notes ON training
+BEGIN
+    UPDATE training SET row_version = OLD.row_version + 1 WHERE training_id = NEW.training_id;
+END;
+
+CREATE TRIGGER trg_subscription_row_version AFTER UPDATE OF training_id, dog_id, actual_price, notes ON subscription
+BEGIN
+    UPDATE subscription SET row_version = OLD.row_version + 1 WHERE subscription_id = NEW.subscription_id;
+END;
+
+CREATE TRIGGER trg_class_row_version
+AFTER UPDATE OF subscription_id, dog_id, single_class_price, is_online, class_date, notes ON class
+BEGIN
+    UPDATE class SET row_version = OLD.row_version + 1 WHERE class_id = NEW.class_id;
+END;
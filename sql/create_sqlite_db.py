@@ -1,21 +1,12 @@
-import sqlite3
+import os
+import sys
 
-DB_FILE_NAME = 'lekker_woof.db'
+# Run from the repository root, where the application and its config live
+ROOT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT_DIRECTORY)
+os.chdir(ROOT_DIRECTORY)
 
-SCRIPTS = ['1.0.0.sql']
+from controls import migrations  # noqa: E402
 
-for script_filename in SCRIPTS:
-    with open(script_filename, 'r') as sql_file:
-        sql_script = sql_file.read()
-
-    db = sqlite3.connect(DB_FILE_NAME)
-    cursor = db.cursor()
-    for sql_command in sql_script.split('\n\n'):
-        print('--------------------------------------')
-        print('Running SQL command:')
-        print(sql_command)
-        cursor.executescript(sql_command)
-        print('Done!')
-        print('--------------------------------------')
-    db.commit()
-    db.close()
+if __name__ == '__main__':
+    migrations.main()
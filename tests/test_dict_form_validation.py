@@ -0,0 +1,123 @@
+"""
+Field validation of DictFormAIO: the server-side validator, the clientside one it must agree with, and DataStore.
+
+    python -m unittest discover tests
+"""
+import json
+import shutil
+import subprocess
+import unittest
+
+from components.dict_form import (_email_pattern, _number_pattern, _validate_field_value_js, DataStore, FieldType,
+                                  make_validation_rules, register_fields_config, validate_field_value)
+
+# (value, rules, whether the value is valid)
+VALIDATION_CASES = [
+    (None, {}, True),
+    ('', {}, True),
+    (None, {'required': True}, False),
+    ('', {'required': True}, False),
+    ('x', {'required': True}, True),
+    ('a@b.nl', {'email': True}, True),
+    ('a@b', {'email': True}, False),
+    ('a b@c.nl', {'email': True}, False),
+    ('x a@b.nl', {'email': True}, False),
+    ('a@b.nl x', {'email': True}, False),
+    ('0612345678', {'pattern': r'\d{10}'}, True),
+    ('06123456789', {'pattern': r'\d{10}'}, False),
+    ('x0612345678', {'pattern': r'\d{10}'}, False),
+    ('a', {'pattern': 'a|b'}, True),
+    ('ab', {'pattern': 'a|b'}, False),
+    (5, {'min': 0, 'max': 10}, True),
+    (5.5, {'min': 0, 'max': 10}, True),
+    ('5', {'min': 0}, True),
+    ('-1', {'min': 0}, False),
+    ('11', {'max': 10}, False),
+    ('1e1', {'max': 10}, True),
+    ('.5', {'min': 0}, True),
+    ('5.', {'min': 0}, True),
+    ('+3', {'min': 0}, True),
+    ('  ', {'min': 0}, False),
+    (' 5', {'min': 0}, False),
+    ('0x10', {'min': 0}, False),
+    ('inf', {'min': 0}, False),
+    ('Infinity', {'min': 0}, False),
+    ('nan', {'min': 0}, False),
+    ('1_000', {'min': 0}, False),
+    ('abc', {'min': 0}, False),
+]
+
+
+class ValidateFieldValueTest(unittest.TestCase):
+    def test_cases(self):
+        for value, rules, is_valid in VALIDATION_CASES:
+            with self.subTest(value=value, rules=rules):
+                self.assertEqual(validate_field_value(value, rules) is None, is_valid)
+
+    def test_error_message_overrides_default(self):
+        self.assertEqual(validate_field_value('', {'required': True, 'error_message': 'Needed'}), 'Needed')
+        self.assertEqual(validate_field_value('x', {'min': 0, 'error_message': 'Needed'}), 'Needed')
+
+    def test_email_fields_get_email_rule(self):
+        self.assertEqual(make_validation_rules({'type': FieldType.EMAIL, 'required': True, 'label': 'Email'}),
+                         {'required': True, 'email': True})
+
+
+class ClientsideValidatorTest(unittest.TestCase):
+    def test_patterns_snapshot(self):
+        # Changing these changes what both validators accept: update the cases above along with them
+        self.assertEqual(_email_pattern, r'[^@\s]+@[^@\s]+\.[^@\s]+')
+        self.assertEqual(_number_pattern, r'[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?')
+
+    def test_rules_are_anchored(self):
+        self.assertIn(f'/^(?:{_email_pattern})$/.test(String(value))', _validate_field_value_js)
+        self.assertIn(f'/^(?:{_number_pattern})$/.test(String(value))', _validate_field_value_js)
+        self.assertIn("new RegExp('^(?:' + rules.pattern + ')$').test(String(value))", _validate_field_value_js)
+
+    @unittest.skipUnless(shutil.which('node'), 'needs node')
+    def test_agrees_with_server_side(self):
+        script = f"""
+const validate = {_validate_field_value_js};
+const cases = {json.dumps([[value, rules] for value, rules, _ in VALIDATION_CASES])};
+console.log(JSON.stringify(cases.map(([value, rules]) => validate(value, rules) === null)));
+"""
+        output = subprocess.run(['node', '-e', script], capture_output=True, text=True, check=True).stdout
+        for (value, rules, is_valid), is_valid_js in zip(VALIDATION_CASES, json.loads(output)):
+            with self.subTest(value=value, rules=rules):
+                self.assertEqual(is_valid_js, is_valid)
+
+
+class DataStoreValidationTest(unittest.TestCase):
+    form_id = 'test-validation-form'
+
+    @classmethod
+    def setUpClass(cls):
+        register_fields_config(cls.form_id, {
+            'name': {'required': True},
+            'price': {'type': FieldType.NUMBER, 'min': 0},
+            'code': {'readonly': True, 'required': True, 'pattern': r'\d+'},
+        })
+
+    def make_data_store(self, **data) -> DataStore:
+        return DataStore(form_id=self.form_id, data=data, is_insertion=False)
+
+    def test_valid(self):
+        self.make_data_store(name='Rex', price=10).validate()
+
+    def test_invalid_field(self):
+        with self.assertRaisesRegex(RuntimeError, 'Error on field price'):
+            self.make_data_store(name='Rex', price=-1).validate()
+
+    def test_readonly_fields_are_not_validated(self):
+        data_store = self.make_data_store(name='Rex', code='not a number')
+        self.assertIsNone(data_store.get_field_error('code'))
+        data_store.validate()
+
+    def test_external_validation(self):
+        data_store = DataStore(form_id=self.form_id, data={'name': 'Rex'}, is_insertion=False,
+                               validation_state_by_field={'name': False})
+        self.assertEqual(data_store.get_field_error('name'), 'Invalid value')
+
+
+if __name__ == '__main__':
+    unittest.main()
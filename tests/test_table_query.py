@@ -0,0 +1,202 @@
+"""
+Server-side paging, filtering and sorting of DataTables (controls.table_query), on in-memory databases.
+
+    python -m unittest discover tests
+"""
+import sqlite3
+import unittest
+
+import config
+
+config.database_file = ':memory:'
+
+from controls import query_stats  # noqa: E402
+from controls.data_provider import DataProvider  # noqa: E402
+from controls.table_query import TablePage, TableQuery, TableQueryBuilder, update_page_keys  # noqa: E402
+
+COLUMN_TYPES = {'id': 'numeric', 'name': 'text', 'weight': 'numeric'}
+ROWS = [
+    (1, 'Rex', 12.5),
+    (2, 'luna', None),
+    (3, 'Max', 30.0),
+    (4, None, 12.5),
+    (5, 'Bella', None),
+    (6, 'rex', 8.0),
+    (7, '', 30.0),
+    (8, 'Max', None),
+    (9, 'a%b', 3.0),
+    (10, 'a_b', 4.0),
+    (11, 'axb', 5.0),
+    (12, 'A%B', 6.0),
+]
+
+
+class TableQueryBuilderTest(unittest.TestCase):
+    page_size = 3
+
+    def setUp(self):
+        self.connection = sqlite3.connect(':memory:')
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('CREATE TABLE dog (id INTEGER PRIMARY KEY, name TEXT, weight REAL)')
+        self.connection.executemany('INSERT INTO dog VALUES (?, ?, ?)', ROWS)
+        self.builder = TableQueryBuilder('SELECT id, name, weight FROM dog', 'id', COLUMN_TYPES)
+
+    def tearDown(self):
+        self.connection.close()
+
+    def fetch_ids(self, query: str, params=None) -> list[int]:
+        return [row['id'] for row in self.connection.execute(query, params or {})]
+
+    def fetch_page(self, table_query: TableQuery) -> tuple[TablePage, str]:
+        page_query, params, count_query, count_params = self.builder.build(table_query)
+        records = [dict(row) for row in self.connection.execute(page_query, params)]
+        row_count = self.connection.execute(count_query, count_params).fetchone()[0]
+        last_key = self.builder.get_row_key(records[-1], table_query) if records else None
+        return TablePage(records=records, row_count=row_count, page_size=table_query.page_size, last_key=last_key,
+                         data_versions=[]), page_query
+
+    def fetch_all_pages(self, sort_by: list[dict], filter_query: str = '') -> list[int]:
+        """
+        Pages through the table like the DataTable does, one page after the other.
+        """
+        ids, page_keys, page_current = [], None, 0
+        while True:
+            table_query = TableQuery.from_table_state(page_current, self.page_size, sort_by, filter_query, page_keys)
+            page, page_query = self.fetch_page(table_query)
+            if page_current > 0:
+                # Keyset, not OFFSET
+                self.assertIsNotNone(table_query.after_key)
+                self.assertNotIn('OFFSET', page_query)
+            if not page.records:
+                return ids
+            ids.extend(record['id'] for record in page.records)
+            page_keys = update_page_keys(page_keys, table_query, page)
+            page_current += 1
+
+    def filter_ids(self, filter_query: str) -> list[int]:
+        return self.fetch_all_pages([], filter_query)
+
+    def test_keyset_paging_ascending_with_nulls(self):
+        expected = self.fetch_ids('SELECT id FROM dog ORDER BY weight ASC, id ASC')
+        self.assertEqual(self.fetch_all_pages([{'column_id': 'weight', 'direction': 'asc'}]), expected)
+        # NULLs first, as SQLite sorts them
+        self.assertEqual(expected[:3], [2, 5, 8])
+
+    def test_keyset_paging_descending_with_nulls(self):
+        expected = self.fetch_ids('SELECT id FROM dog ORDER BY weight DESC, id ASC')
+        self.assertEqual(self.fetch_all_pages([{'column_id': 'weight', 'direction': 'desc'}]), expected)
+        self.assertEqual(expected[-3:], [2, 5, 8])
+
+    def test_keyset_paging_on_several_columns(self):
+        sort_by = [{'column_id': 'name', 'direction': 'desc'}, {'column_id': 'weight', 'direction': 'asc'}]
+        expected = self.fetch_ids('SELECT id FROM dog ORDER BY name DESC, weight ASC, id ASC')
+        self.assertEqual(self.fetch_all_pages(sort_by), expected)
+
+    def test_keyset_paging_with_filter(self):
+        expected = self.fetch_ids('SELECT id FROM dog WHERE weight > 4 ORDER BY weight DESC, id ASC')
+        self.assertEqual(self.fetch_all_pages([{'column_id': 'weight', 'direction': 'desc'}], '{weight} > 4'),
+                         expected)
+
+    def test_offset_without_page_keys(self):
+        sort_by = [{'column_id': 'weight', 'direction': 'asc'}]
+        expected = self.fetch_ids('SELECT id FROM dog ORDER BY weight ASC, id ASC')
+        table_query = TableQuery.from_table_state(2, self.page_size, sort_by, '', None)
+        page, page_query = self.fetch_page(table_query)
+        self.assertIsNone(table_query.after_key)
+        self.assertIn('OFFSET', page_query)
+        self.assertEqual([record['id'] for record in page.records], expected[6:9])
+        self.assertEqual(page.row_count, len(ROWS))
+        self.assertEqual(page.page_count, 4)
+
+    def test_offset_when_keys_are_for_another_sort(self):
+        page_keys = None
+        for page_current in range(2):
+            table_query = TableQuery.from_table_state(page_current, self.page_size, [], '', page_keys)
+            page_keys = update_page_keys(page_keys, table_query, self.fetch_page(table_query)[0])
+        sort_by = [{'column_id': 'weight', 'direction': 'desc'}]
+        table_query = TableQuery.from_table_state(2, self.page_size, sort_by, '', page_keys)
+        self.assertIsNone(table_query.after_key)
+        self.assertIsNone(table_query.row_count)
+        expected = self.fetch_ids('SELECT id FROM dog ORDER BY weight DESC, id ASC')
+        self.assertEqual([record['id'] for record in self.fetch_page(table_query)[0].records], expected[6:9])
+
+    def test_unknown_column_or_operator_is_ignored(self):
+        all_ids = [row[0] for row in ROWS]
+        self.assertEqual(self.filter_ids('{owner} contains x'), all_ids)
+        self.assertEqual(self.filter_ids('{name} resembles Rex'), all_ids)
+        self.assertEqual(self.filter_ids('{weight} > heavy'), all_ids)
+        self.assertEqual(self.filter_ids('{owner} contains x && {name} = Max'), [3, 8])
+        self.assertEqual(self.fetch_all_pages([{'column_id': 'owner', 'direction': 'desc'}]), all_ids)
+
+    def test_contains_escapes_like_wildcards(self):
+        self.assertEqual(self.filter_ids('{name} contains %'), [9, 12])
+        self.assertEqual(self.filter_ids('{name} contains _'), [10])
+        self.assertEqual(self.filter_ids('{name} contains "a%b"'), [9, 12])
+        self.assertEqual(self.filter_ids('{name} scontains %'), [9, 12])
+        self.assertEqual(self.filter_ids('{name} scontains a%b'), [9])
+
+    def test_case_prefixes(self):
+        self.assertEqual(self.filter_ids('{name} contains rex'), [1, 6])
+        self.assertEqual(self.filter_ids('{name} icontains REX'), [1, 6])
+        self.assertEqual(self.filter_ids('{name} scontains rex'), [6])
+        self.assertEqual(self.filter_ids('{name} = max'), [3, 8])
+        self.assertEqual(self.filter_ids('{name} s= max'), [])
+        self.assertEqual(self.filter_ids('{name} seq Max'), [3, 8])
+
+    def test_numeric_and_blank_filters(self):
+        self.assertEqual(self.filter_ids('{weight} >= 12.5'), [1, 3, 4, 7])
+        self.assertEqual(self.filter_ids('{weight} < 5 && {name} contains a'), [9, 10])
+        self.assertEqual(self.filter_ids('{weight} is nil'), [2, 5, 8])
+        self.assertEqual(self.filter_ids('{name} is blank'), [4, 7])
+
+
+class CustomersPageTest(unittest.TestCase):
+    column_types = {'dog_id': 'numeric', 'dog_name': 'text'}
+
+    @classmethod
+    def setUpClass(cls):
+        with DataProvider() as data_provider:
+            cls.customer_id = data_provider.insert_customer({'address': 'Kerkstraat 1', 'balance_in_eur': 0,
+                                                             'customer_notes': None})
+            # The customer list only shows dogs of customers with a person
+            data_provider.insert_person({'person_name': 'Anna', 'phone1': '0612345678', 'phone2': None,
+                                         'email_address': 'anna@example.nl'}, customer_id=cls.customer_id)
+            for name in ('Rex', 'Luna', 'Max', 'Bella', 'Rexie'):
+                cls.insert_dog(data_provider, name)
+            data_provider.commit()
+
+    @classmethod
+    def insert_dog(cls, data_provider: DataProvider, name: str) -> int:
+        return data_provider.insert_dog({'dog_name': name, 'birth_date': '2020-01-01', 'breed': 'Poodle',
+                                         'is_male': 1, 'dog_notes': None}, customer_id=cls.customer_id)
+
+    def load_page(self, page_current: int, page_keys, filter_query: str = '') -> tuple[TablePage, int, dict]:
+        """
+        :return: page, statements run, new page keys.
+        """
+        table_query = TableQuery.from_table_state(page_current, 2, [], filter_query, page_keys)
+        query_stats.reset_query_stats()
+        with DataProvider() as data_provider:
+            page = data_provider.get_customers_page(table_query, self.column_types)
+        statements = query_stats.get_query_stats()['get_customers_page'].statements
+        return page, statements, update_page_keys(page_keys, table_query, page)
+
+    def test_row_count_is_kept_until_the_data_changes(self):
+        page, statements, page_keys = self.load_page(0, None, '{dog_name} contains rex')
+        self.assertEqual((page.row_count, statements), (2, 2))
+        page, statements, page_keys = self.load_page(0, page_keys, '{dog_name} contains rex')
+        self.assertEqual((page.row_count, statements), (2, 1))
+
+        with DataProvider() as data_provider:
+            self.insert_dog(data_provider, 'T-Rex')
+            data_provider.commit()
+        page, statements, page_keys = self.load_page(0, page_keys, '{dog_name} contains rex')
+        self.assertEqual((page.row_count, statements), (3, 2))
+
+        page, statements, page_keys = self.load_page(0, page_keys)
+        self.assertEqual(statements, 2)
+        self.assertEqual(page.page_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()